@@ -0,0 +1,55 @@
+#!/usr/bin/env python3
+
+"""Added, changed and removed events between two syncs (events that already happened aren't removed)"""
+
+import arrow
+import time
+from collections.abc import Iterable, Mapping
+from dataclasses import dataclass, field
+from event_store import content_hash
+from meetup_types import Event
+
+# event id -> (content hash, start as epoch seconds)
+Index = Mapping[str, tuple[str, float]]
+
+
+@dataclass(frozen=True)
+class Changes:
+    """Event ids added, changed and removed since the previous sync"""
+
+    added: frozenset[str] = field(default_factory=frozenset)
+    changed: frozenset[str] = field(default_factory=frozenset)
+    removed: frozenset[str] = field(default_factory=frozenset)
+
+    def __bool__(self):
+        return bool(self.added or self.changed or self.removed)
+
+    @property
+    def updated(self) -> frozenset[str]:
+        """Ids worth (re)announcing: added or changed"""
+        return self.added | self.changed
+
+    def counts(self) -> dict:
+        return {"added": len(self.added), "changed": len(self.changed), "removed": len(self.removed)}
+
+
+def index_events(events: Iterable[Event]) -> dict[str, tuple[str, float]]:
+    """Fingerprint events by id (events without an id or start time are skipped)"""
+    return {e.id: (content_hash(e), arrow.get(e.dateTime).timestamp()) for e in events if e.id and e.dateTime}
+
+
+def diff(previous: Index, current: Index, now: float | None = None) -> Changes:
+    """Compare two sync indexes"""
+    now = time.time() if now is None else now
+
+    added, changed = set(), set()
+    for id, (fingerprint, _) in current.items():
+        before = previous.get(id)
+        if before is None:
+            added.add(id)
+        elif before[0] != fingerprint:
+            changed.add(id)
+
+    removed = {id for id, (_, starts_at) in previous.items() if id not in current and starts_at > now}
+
+    return Changes(added=frozenset(added), changed=frozenset(changed), removed=frozenset(removed))
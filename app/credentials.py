@@ -0,0 +1,180 @@
+#!/usr/bin/env python3
+
+"""Scoped, HMAC-signed service tokens and caches for bcrypt verifies and user lookups"""
+
+import base64
+import hashlib
+import hmac
+import msgspec
+import os
+import threading
+import time
+from collections import OrderedDict
+from database import db_pool
+from decouple import config
+
+# env
+SERVICE_TOKEN_KEY = config("SERVICE_TOKEN_KEY", default=config("SECRET_KEY", default=""))
+SERVICE_TOKEN_DAYS = config("SERVICE_TOKEN_DAYS", default=365, cast=int)
+VERIFY_CACHE_TTL = config("VERIFY_CACHE_TTL", default=300, cast=int)  # seconds (0 disables)
+USER_CACHE_TTL = config("USER_CACHE_TTL", default=60, cast=int)  # seconds (0 disables)
+USER_CACHE_SIZE = config("USER_CACHE_SIZE", default=256, cast=int)
+
+# service token prefix and the scopes a token can carry
+prefix = "svc"
+scopes = frozenset({"events:read", "slack:post", "schedule:write"})
+
+
+def b64encode(data: bytes) -> str:
+    return base64.urlsafe_b64encode(data).rstrip(b"=").decode()
+
+
+def b64decode(data: str) -> bytes:
+    return base64.urlsafe_b64decode(data + "=" * (-len(data) % 4))
+
+
+class ServiceClaims(msgspec.Struct, frozen=True):
+    """What a service token grants"""
+
+    sub: str
+    scopes: frozenset[str]
+    exp: int  # epoch seconds
+
+    def allows(self, scope: str) -> bool:
+        return scope in self.scopes
+
+
+class ServiceTokens:
+    """Issue and verify HMAC-signed service tokens"""
+
+    def __init__(self, key: str = SERVICE_TOKEN_KEY):
+        self.key = key.encode()
+
+    def sign(self, payload: str) -> str:
+        return b64encode(hmac.new(self.key, f"{prefix}.{payload}".encode(), hashlib.sha256).digest())
+
+    def issue(self, subject: str, token_scopes, days: int = SERVICE_TOKEN_DAYS) -> str:
+        """New token for `subject` with `token_scopes`, valid for `days`"""
+        unknown = set(token_scopes) - scopes
+        if unknown:
+            raise ValueError(f"Unknown scopes: {', '.join(sorted(unknown))}")
+        claims = ServiceClaims(sub=subject, scopes=frozenset(token_scopes), exp=int(time.time()) + days * 86400)
+        payload = b64encode(msgspec.json.encode(claims))
+        return f"{prefix}.{payload}.{self.sign(payload)}"
+
+    @staticmethod
+    def is_service_token(token: str) -> bool:
+        return token.startswith(f"{prefix}.")
+
+    def verify(self, token: str, now: float | None = None) -> ServiceClaims | None:
+        """Claims of a valid, unexpired token, else None"""
+        try:
+            _, payload, signature = token.split(".")
+        except ValueError:
+            return None
+        if not self.key or not hmac.compare_digest(signature.encode(), self.sign(payload).encode()):
+            return None
+        try:
+            claims = msgspec.json.decode(b64decode(payload), type=ServiceClaims)
+        except (ValueError, msgspec.DecodeError):
+            return None
+        return claims if claims.exp > (time.time() if now is None else now) else None
+
+
+class VerifiedPasswords:
+    """Recent successful password verifies, keyed by a per-process HMAC of (hash, password)"""
+
+    def __init__(self, ttl: int = VERIFY_CACHE_TTL, size: int = 256):
+        self.ttl = ttl
+        self.size = size
+        self._key = os.urandom(32)
+        self._entries: OrderedDict[bytes, float] = OrderedDict()
+        self._lock = threading.Lock()
+
+    def digest(self, hashed_password: str, password: str) -> bytes:
+        return hmac.new(self._key, f"{hashed_password}\0{password}".encode(), hashlib.sha256).digest()
+
+    def check(self, hashed_password: str, password: str) -> bool:
+        """Whether this password was verified against this hash within `ttl` seconds"""
+        if self.ttl <= 0:
+            return False
+        digest = self.digest(hashed_password, password)
+        with self._lock:
+            expires = self._entries.get(digest)
+            if expires is None:
+                return False
+            if expires < time.monotonic():
+                del self._entries[digest]
+                return False
+            return True
+
+    def add(self, hashed_password: str, password: str) -> None:
+        if self.ttl <= 0:
+            return
+        digest = self.digest(hashed_password, password)
+        with self._lock:
+            self._entries[digest] = time.monotonic() + self.ttl
+            self._entries.move_to_end(digest)
+            while len(self._entries) > self.size:
+                self._entries.popitem(last=False)
+
+
+class UserCache:
+    """LRU of user lookups that expire after `ttl` seconds (users that don't exist aren't cached)"""
+
+    def __init__(self, ttl: int = USER_CACHE_TTL, size: int = USER_CACHE_SIZE):
+        self.ttl = ttl
+        self.size = size
+        self._entries: OrderedDict[str, tuple[float, object]] = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = self.misses = 0
+
+    def cached(self, username: str):
+        """The cached user, or None when absent or expired"""
+        with self._lock:
+            entry = self._entries.get(username)
+            if entry is None or entry[0] < time.monotonic():
+                self._entries.pop(username, None)
+                self.misses += 1
+                return None
+            self._entries.move_to_end(username)
+            self.hits += 1
+            return entry[1]
+
+    def put(self, username: str, user) -> None:
+        if self.ttl <= 0 or user is None:
+            return
+        with self._lock:
+            self._entries[username] = (time.monotonic() + self.ttl, user)
+            self._entries.move_to_end(username)
+            while len(self._entries) > self.size:
+                self._entries.popitem(last=False)
+
+    def get(self, username: str, load):
+        """The user from cache, else `load(username)` (cached if found)"""
+        user = self.cached(username)
+        if user is None:
+            user = load(username)
+            self.put(username, user)
+        return user
+
+    async def aget(self, username: str, load):
+        """`get` from async code: a miss runs `load` on the database pool"""
+        user = self.cached(username)
+        if user is None:
+            user = await db_pool.run(load, username)
+            self.put(username, user)
+        return user
+
+    def invalidate(self, username: str | None = None) -> None:
+        """Drop one user (after it changes) or everyone"""
+        with self._lock:
+            if username is None:
+                self._entries.clear()
+            else:
+                self._entries.pop(username, None)
+
+
+service_tokens = ServiceTokens()
+verified_passwords = VerifiedPasswords()
+user_cache = UserCache()
@@ -0,0 +1,87 @@
+#!/usr/bin/env python3
+
+"""The shared Pony database, and `db_pool`, the bounded executor async code runs its queries on"""
+
+import asyncio
+import functools
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from decouple import config
+from pony.orm import Database
+
+# env
+DB_POOL_SIZE = config("DB_POOL_SIZE", default=4, cast=int)  # connections per worker for async callers
+DB_SSLMODE = config("DB_SSLMODE", default="prefer")
+
+# the app's database (entities are defined on it before `connect`)
+db = Database()
+
+
+def connect(create_tables: bool = True) -> Database:
+    """Bind the shared database to Postgres and map every entity defined so far (once)"""
+    if db.provider is None:
+        db.bind(
+            provider="postgres",
+            user=config("DB_USER"),
+            password=config("DB_PASS").strip('"'),
+            host=config("DB_HOST"),
+            database=config("DB_NAME"),
+            port=config("DB_PORT", default=5432, cast=int),
+            sslmode=DB_SSLMODE,
+        )
+    if db.schema is None:
+        db.generate_mapping(create_tables=create_tables)
+    return db
+
+
+class DatabasePool:
+    """Bounded executor for blocking database calls from async code"""
+
+    def __init__(self, size: int = DB_POOL_SIZE):
+        self.size = size
+        self.executor = ThreadPoolExecutor(max_workers=size, thread_name_prefix="db")
+        self._lock = threading.Lock()
+        self.in_use = self.waiting = self.completed = self.errors = 0
+        self.wait_total = self.wait_max = 0.0
+
+    def _call(self, submitted: float, fn, args, kwargs):
+        wait = time.perf_counter() - submitted
+        with self._lock:
+            self.waiting -= 1
+            self.in_use += 1
+            self.wait_total += wait
+            self.wait_max = max(self.wait_max, wait)
+        try:
+            return fn(*args, **kwargs)
+        except Exception:
+            with self._lock:
+                self.errors += 1
+            raise
+        finally:
+            with self._lock:
+                self.in_use -= 1
+                self.completed += 1
+
+    async def run(self, fn, *args, **kwargs):
+        """Await `fn(*args, **kwargs)` on a pool thread"""
+        with self._lock:
+            self.waiting += 1
+        call = functools.partial(self._call, time.perf_counter(), fn, args, kwargs)
+        return await asyncio.get_running_loop().run_in_executor(self.executor, call)
+
+    def stats(self) -> dict:
+        """Pool size, calls in flight and queued, and how long calls waited for a connection"""
+        with self._lock:
+            return {
+                "size": self.size,
+                "in_use": self.in_use,
+                "waiting": self.waiting,
+                "completed": self.completed,
+                "errors": self.errors,
+                "wait_avg_ms": round(1000 * self.wait_total / self.completed, 3) if self.completed else 0.0,
+                "wait_max_ms": round(1000 * self.wait_max, 3),
+            }
+
+
+db_pool = DatabasePool()
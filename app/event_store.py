@@ -0,0 +1,184 @@
+#!/usr/bin/env python3
+
+"""Events from every sync in the `event` table: batched upserts and range reads by date and city"""
+
+import arrow
+import hashlib
+import msgspec
+from colorama import Fore
+from datetime import UTC, datetime
+from decouple import config
+from meetup_query import days, event_page, tz
+from meetup_types import Event, EventEdge, Group
+from pony.orm import PrimaryKey, Required, composite_index, db_session, select
+
+# logging prefixes
+info = "INFO:"
+error = "ERROR:"
+warning = "WARNING:"
+
+# env
+UPSERT_BATCH = config("UPSERT_BATCH", default=500, cast=int)  # rows per statement
+
+# upserted columns (in order)
+store_columns = ("id", "urlname", "name", "date_time", "title", "event_url", "city", "content_hash", "first_seen", "last_seen")
+
+
+def define_entities(db):
+    """Define the `event` table on a Pony database (call before `generate_mapping`)"""
+
+    class StoredEvent(db.Entity):
+        _table_ = "event"
+        id = PrimaryKey(str)
+        urlname = Required(str)
+        name = Required(str)
+        date_time = Required(datetime)
+        title = Required(str)
+        event_url = Required(str)
+        city = Required(str)
+        content_hash = Required(str)
+        first_seen = Required(datetime)
+        last_seen = Required(datetime, index="idx_event_last_seen")
+        composite_index(date_time, city)
+
+    return StoredEvent
+
+
+def utc(value) -> datetime:
+    """Naive UTC datetime (how the table stores timestamps)"""
+    return arrow.get(value).to("UTC").naive
+
+
+def content_hash(event: Event) -> str:
+    """Hash of the fields that make an event "changed" between syncs"""
+    group = event.group
+    fields = (event.title, event.dateTime, event.eventUrl, group.name, group.urlname, group.city)
+    return hashlib.blake2b(msgspec.json.encode(fields), digest_size=16).hexdigest()
+
+
+def event_row(event: Event, seen_at: datetime) -> tuple:
+    """Row tuple ordered as `store_columns`"""
+    group = event.group
+    return (
+        event.id,
+        group.urlname or "",
+        group.name or "",
+        utc(event.dateTime),
+        event.title or "",
+        event.eventUrl or "",
+        group.city or "",
+        content_hash(event),
+        seen_at,
+        seen_at,
+    )
+
+
+def snapshot_events(snapshot) -> list[Event]:
+    """Unique events (by id) from a prefetch snapshot"""
+    return response_events([snapshot.self_response, *(response for _, response in snapshot.groups)])
+
+
+def response_events(responses) -> list[Event]:
+    """Unique events (by id) from `self` and group responses"""
+    events = {}
+    for response in responses:
+        for edge in event_page(response)[0]:
+            node = edge.node
+            if node.id and node.dateTime:
+                events[node.id] = node
+    return list(events.values())
+
+
+class EventStore:
+    """Batched writes to and range reads from the `event` table"""
+
+    def __init__(self, batch: int = UPSERT_BATCH):
+        self.batch = batch
+        self.db = None
+        self.entity = None
+
+    def bind(self, db, entity) -> None:
+        """Use the `StoredEvent` entity returned by `define_entities` on `db`"""
+        self.db = db
+        self.entity = entity
+
+    def __bool__(self):
+        return self.entity is not None
+
+    def upsert_sql(self, rows: int) -> str:
+        """Multi-row upsert for `rows` rows in the driver's paramstyle"""
+        mark = "?" if self.db.provider.paramstyle == "qmark" else "%s"
+        row = "(" + ", ".join([mark] * len(store_columns)) + ")"
+        updates = ", ".join(f"{c} = excluded.{c}" for c in store_columns if c not in ("id", "first_seen"))
+        return (
+            f"INSERT INTO {self.entity._table_} ({', '.join(store_columns)}) VALUES {', '.join([row] * rows)} "
+            f"ON CONFLICT (id) DO UPDATE SET {updates}"
+        )
+
+    def upsert(self, events, seen_at: datetime | None = None) -> int:
+        """Insert or update `events` in batches; returns the number of rows written"""
+        seen_at = seen_at or datetime.now(UTC).replace(tzinfo=None)
+
+        # the provider's own parameter conversion, so raw rows compare equal to ones Pony writes
+        converters = [self.entity._adict_[c].converters[0].py2sql for c in store_columns]
+        rows = [[convert(v) for convert, v in zip(converters, event_row(event, seen_at), strict=True)] for event in events]
+
+        with db_session:
+            cursor = self.db.get_connection().cursor()
+            for i in range(0, len(rows), self.batch):
+                chunk = rows[i : i + self.batch]
+                cursor.execute(self.upsert_sql(len(chunk)), [value for row in chunk for value in row])
+            self.db.commit()
+
+        print(f"{Fore.GREEN}{info:<10}{Fore.RESET}Stored {len(rows)} events")
+        return len(rows)
+
+    def store(self, snapshot) -> int:
+        """Upsert every event in a prefetch snapshot as seen at its fetch time"""
+        seen_at = datetime.fromtimestamp(snapshot.fetched_at, UTC).replace(tzinfo=None)
+        return self.upsert(snapshot_events(snapshot), seen_at)
+
+    @db_session
+    def last_sync(self) -> datetime | None:
+        """`last_seen` of the latest sync by any process (read from the index on every call)"""
+        return select(e.last_seen for e in self.entity).max()
+
+    @db_session
+    def index(self) -> dict[str, tuple[str, float]]:
+        """Change-detection index (id -> (content hash, start epoch)) of the latest sync"""
+        last_seen = self.last_sync()
+        rows = select((e.id, e.content_hash, e.date_time) for e in self.entity if e.last_seen == last_seen)
+        return {id: (fingerprint, starts_at.replace(tzinfo=UTC).timestamp()) for id, fingerprint, starts_at in rows}
+
+    @db_session
+    def between(self, start=None, end=None, city: str | None = None, current: bool = True) -> list[EventEdge]:
+        """
+        Events starting in [start, end] (default: now to now + DAYS), optionally in one city
+
+        With `current`, only events seen in the latest sync are returned (i.e., not removed upstream).
+        """
+        start = utc(start or arrow.now(tz))
+        end = utc(end or arrow.now(tz).shift(days=days))
+
+        query = select(e for e in self.entity if e.date_time >= start and e.date_time <= end)
+        if city is not None:
+            query = query.filter(lambda e: e.city == city)
+        if current:
+            last_seen = self.last_sync()
+            query = query.filter(lambda e: e.last_seen == last_seen)
+
+        return [
+            EventEdge(
+                node=Event(
+                    id=e.id,
+                    title=e.title,
+                    dateTime=arrow.get(e.date_time, tzinfo="UTC").isoformat(),
+                    eventUrl=e.event_url,
+                    group=Group(name=e.name, urlname=e.urlname, city=e.city),
+                )
+            )
+            for e in query.order_by(lambda e: e.date_time)
+        ]
+
+
+event_store = EventStore()
@@ -0,0 +1,197 @@
+#!/usr/bin/env python3
+
+"""Exclusion rules (keyword, regex, urlname) from `exclusions.csv` and the `exclusion` table, compiled into one matcher"""
+
+import csv
+import re
+import threading
+import time
+from colorama import Fore
+from dataclasses import dataclass
+from datetime import datetime
+from decouple import config
+from functools import lru_cache
+from pathlib import Path
+from pony.orm import PrimaryKey, Required, db_session, select
+
+# logging prefixes
+info = "INFO:"
+error = "ERROR:"
+warning = "WARNING:"
+
+# env
+script_dir = Path(__file__).resolve().parents[0]
+EXCLUSIONS_CSV = config("EXCLUSIONS_CSV", default=str(script_dir / "exclusions.csv"))
+EXCLUSIONS_RELOAD = config("EXCLUSIONS_RELOAD", default=60, cast=int)  # seconds
+
+kinds = ("keyword", "regex", "urlname")
+fields = ("name", "title", "description")
+default_fields = ("name", "title")
+
+
+@dataclass(frozen=True)
+class Rule:
+    kind: str
+    pattern: str
+    fields: tuple[str, ...] = default_fields
+
+    @classmethod
+    def parse(cls, kind: str, pattern: str, rule_fields: str = ""):
+        """Build a rule from text columns (`rule_fields` is space separated, e.g. "name title")"""
+        kind = (kind or "keyword").strip().lower()
+        targets = tuple(rule_fields.split()) or default_fields
+        if kind not in kinds:
+            raise ValueError(f"Invalid rule kind: {kind}")
+        if any(f not in fields for f in targets):
+            raise ValueError(f"Invalid rule fields: {rule_fields}")
+        if kind == "regex":
+            re.compile(pattern)
+        return cls(kind=kind, pattern=pattern, fields=targets)
+
+
+class Matcher:
+    """Compiled form of a set of rules"""
+
+    def __init__(self, rules=()):
+        self.rules = tuple(rules)
+        self.urlnames = frozenset(r.pattern.lower() for r in self.rules if r.kind == "urlname")
+
+        alternations = {f: [] for f in fields}
+        for rule in self.rules:
+            if rule.kind == "urlname":
+                continue
+            pattern = re.escape(rule.pattern) if rule.kind == "keyword" else rule.pattern
+            for f in rule.fields:
+                alternations[f].append(f"(?:{pattern})")
+
+        self.patterns = tuple((f, re.compile("|".join(p))) for f, p in alternations.items() if p)
+        self.fields = frozenset(f for f, _ in self.patterns)
+
+    def match(self, event) -> bool:
+        """Check if an `Event` is excluded"""
+        group = event.group
+        if self.urlnames and (group.urlname or "").lower() in self.urlnames:
+            return True
+
+        values = {"name": group.name, "title": event.title, "description": event.description}
+        return any(pattern.search(values[f] or "") for f, pattern in self.patterns)
+
+    def __bool__(self):
+        return bool(self.rules)
+
+    def __repr__(self):
+        return repr([r.pattern for r in self.rules])
+
+
+def keyword_rules(keywords) -> tuple[Rule, ...]:
+    """Keyword rules from a list or a comma separated string (e.g., the `exclusions` query param)"""
+    if isinstance(keywords, str):
+        keywords = keywords.split(",")
+    return tuple(Rule(kind="keyword", pattern=k.strip()) for k in keywords or () if k and k.strip())
+
+
+@lru_cache(maxsize=128)
+def compile_rules(rules: tuple[Rule, ...]) -> Matcher:
+    """Compile rules once per distinct rule set"""
+    return Matcher(rules)
+
+
+def as_matcher(exclusions) -> Matcher:
+    """Coerce a `Matcher`, keyword list or comma separated string to a `Matcher`"""
+    if isinstance(exclusions, Matcher):
+        return exclusions
+    return compile_rules(keyword_rules(exclusions))
+
+
+def load_csv(path) -> tuple[Rule, ...]:
+    """Read rules from a `kind,pattern,fields` csv"""
+    rules = []
+    with open(path, newline="", encoding="utf-8") as f:
+        for row in csv.DictReader(f):
+            try:
+                rules.append(Rule.parse(row.get("kind"), row["pattern"], row.get("fields") or ""))
+            except (KeyError, ValueError, re.error) as e:
+                print(f"{Fore.RED}{error:<10}{Fore.RESET}Skipping exclusion rule {row}: {e}")
+    return tuple(rules)
+
+
+def define_entities(db):
+    """Define the `exclusion` table on a Pony database (call before `generate_mapping`)"""
+
+    class Exclusion(db.Entity):
+        _table_ = "exclusion"
+        id = PrimaryKey(int, auto=True)
+        kind = Required(str, default="keyword")
+        pattern = Required(str)
+        fields = Required(str, default=" ".join(default_fields))
+        enabled = Required(bool, default=True)
+        last_changed = Required(datetime, default=datetime.utcnow)
+
+    return Exclusion
+
+
+class RuleSet:
+    """Hot-reloadable rules from the csv file and (optionally) the database"""
+
+    def __init__(self, path=EXCLUSIONS_CSV, reload: int = EXCLUSIONS_RELOAD):
+        self.path = Path(path)
+        self.reload = reload
+        self.entity = None
+        self.rules: tuple[Rule, ...] = ()
+        self._version = None
+        self._checked = float("-inf")
+        self._lock = threading.Lock()
+
+    def bind(self, entity) -> None:
+        """Also load rules from the `Exclusion` entity returned by `define_entities`"""
+        self.entity = entity
+        self._checked = float("-inf")
+
+    def invalidate(self) -> None:
+        """Force a reload check on next use (e.g., after editing rules)"""
+        self._checked = float("-inf")
+
+    def version(self):
+        """Cheap fingerprint of both sources"""
+        mtime = self.path.stat().st_mtime_ns if self.path.exists() else None
+        if self.entity is None:
+            return mtime, None
+        with db_session:
+            count = self.entity.select(lambda e: e.enabled).count()
+            latest = select(e.last_changed for e in self.entity if e.enabled).max()
+            return mtime, (count, latest)
+
+    def load(self) -> tuple[Rule, ...]:
+        rules = list(load_csv(self.path)) if self.path.exists() else []
+        if self.entity is not None:
+            with db_session:
+                for row in self.entity.select(lambda e: e.enabled):
+                    try:
+                        rules.append(Rule.parse(row.kind, row.pattern, row.fields))
+                    except (ValueError, re.error) as e:
+                        print(f"{Fore.RED}{error:<10}{Fore.RESET}Skipping exclusion rule {row.id}: {e}")
+        return tuple(rules)
+
+    def current(self) -> tuple[Rule, ...]:
+        """Current rules, reloading them if a source changed since the last check"""
+        now = time.monotonic()
+        if now - self._checked < self.reload:
+            return self.rules
+
+        with self._lock:
+            if now - self._checked >= self.reload:
+                version = self.version()
+                if version != self._version:
+                    self.rules = self.load()
+                    self._version = version
+                    print(f"{Fore.GREEN}{info:<10}{Fore.RESET}Loaded {len(self.rules)} exclusion rules")
+                self._checked = now
+
+        return self.rules
+
+    def matcher(self, extra=()) -> Matcher:
+        """Compiled matcher for the current rules plus `extra` keywords"""
+        return compile_rules(self.current() + keyword_rules(extra))
+
+
+rule_set = RuleSet()
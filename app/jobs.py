@@ -0,0 +1,222 @@
+#!/usr/bin/env python3
+
+"""Background jobs (e.g., `POST /api/slack?job=true`) on a bounded queue, polled via `GET /api/jobs/{id}`"""
+
+import threading
+import time
+import uuid
+from collections import OrderedDict
+from colorama import Fore
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import contextmanager, nullcontext
+from dataclasses import asdict, dataclass, field
+from datetime import datetime, timedelta
+from decouple import config
+from pony.orm import Json, Optional, PrimaryKey, Required, db_session, delete
+
+# logging prefixes
+info = "INFO:"
+error = "ERROR:"
+warning = "WARNING:"
+
+# env
+JOB_BACKEND = config("JOB_BACKEND", default="memory")  # memory | database
+JOB_WORKERS = config("JOB_WORKERS", default=1, cast=int)
+JOB_QUEUE_SIZE = config("JOB_QUEUE_SIZE", default=8, cast=int)  # jobs waiting for a worker
+JOB_RETENTION = config("JOB_RETENTION", default=24, cast=int)  # hours a finished job can be polled
+
+# job statuses
+QUEUED = "queued"
+RUNNING = "running"
+SUCCEEDED = "succeeded"
+FAILED = "failed"
+
+
+class QueueFull(Exception):
+    """Every worker is busy and the queue is full"""
+
+
+def define_entities(db):
+    """Define the `job` table on a Pony database (call before `generate_mapping`)"""
+
+    class Job(db.Entity):
+        _table_ = "job"
+        id = PrimaryKey(str)
+        kind = Required(str)
+        status = Required(str)
+        params = Optional(Json, nullable=True)
+        stages = Optional(Json, nullable=True)
+        result = Optional(Json, nullable=True)
+        error = Optional(str, nullable=True)
+        created_at = Required(datetime, default=datetime.utcnow)
+        started_at = Optional(datetime)
+        finished_at = Optional(datetime)
+
+    return Job
+
+
+@dataclass
+class JobState:
+    """A job as it is polled"""
+
+    id: str
+    kind: str
+    params: dict
+    status: str = QUEUED
+    stages: list[dict] = field(default_factory=list)  # {"name", "ms"} in run order (ms is None while running)
+    result: dict | None = None
+    error: str | None = None
+    created_at: datetime = field(default_factory=datetime.utcnow)
+    started_at: datetime | None = None
+    finished_at: datetime | None = None
+
+
+def untimed(name: str):
+    """Stand-in for `JobQueue.stage` outside a job"""
+    return nullcontext()
+
+
+class MemoryJobStore:
+    """Job states for this process"""
+
+    def __init__(self, retention: int = JOB_RETENTION):
+        self.retention = retention
+        self._jobs: OrderedDict[str, dict] = OrderedDict()
+        self._lock = threading.Lock()
+
+    def save(self, job: JobState) -> None:
+        state = asdict(job)
+        cutoff = datetime.utcnow() - timedelta(hours=self.retention)
+        with self._lock:
+            self._jobs[job.id] = state
+            # oldest first; stop at the first job still in its retention window
+            while self._jobs:
+                oldest = next(iter(self._jobs.values()))
+                if oldest["finished_at"] is None or oldest["finished_at"] >= cutoff:
+                    break
+                self._jobs.popitem(last=False)
+
+    def get(self, job_id: str) -> dict | None:
+        with self._lock:
+            return self._jobs.get(job_id)
+
+
+class DatabaseJobStore:
+    """Job states in the `job` table, shared by every worker"""
+
+    def __init__(self, entity, retention: int = JOB_RETENTION):
+        self.entity = entity
+        self.retention = retention
+
+    @db_session
+    def save(self, job: JobState) -> None:
+        values = asdict(job)
+        row = self.entity.get(id=job.id)
+        if row is None:
+            self.entity(**values)
+            cutoff = datetime.utcnow() - timedelta(hours=self.retention)
+            delete(j for j in self.entity if j.finished_at is not None and j.finished_at < cutoff)
+        else:
+            del values["id"]
+            row.set(**values)
+
+    @db_session
+    def get(self, job_id: str) -> dict | None:
+        row = self.entity.get(id=job_id)
+        return None if row is None else row.to_dict()
+
+
+class JobQueue:
+    """Runs submitted jobs on a bounded pool of worker threads"""
+
+    def __init__(self, workers: int = JOB_WORKERS, size: int = JOB_QUEUE_SIZE):
+        self.workers = workers
+        self.size = size
+        self.store = MemoryJobStore()
+        self.executor = ThreadPoolExecutor(max_workers=workers, thread_name_prefix="job")
+        self._slots = threading.BoundedSemaphore(workers + size)
+        self._pending: dict[str, tuple] = {}
+        self._lock = threading.Lock()
+
+    def bind(self, store) -> None:
+        """Keep job states in `store` (e.g., a `DatabaseJobStore`)"""
+        self.store = store
+
+    def save(self, job: JobState) -> None:
+        # a job outlives a failed status write
+        try:
+            self.store.save(job)
+        except Exception as e:
+            print(f"{Fore.RED}{error:<10}{Fore.RESET}Failed to save job {job.id}: {e}")
+
+    def submit(self, kind: str, fn, **params) -> JobState:
+        """Queue `fn(stage=..., **params)`; raises `QueueFull` when `size` jobs are already waiting"""
+        if not self._slots.acquire(blocking=False):
+            raise QueueFull(f"{self.workers + self.size} jobs are already running or queued")
+        job = JobState(id=uuid.uuid4().hex, kind=kind, params=params)
+        with self._lock:
+            self._pending[job.id] = (job, None)
+        try:
+            self.store.save(job)
+            future = self.executor.submit(self.run, job, fn)
+        except Exception:
+            with self._lock:
+                self._pending.pop(job.id, None)
+            self._slots.release()
+            raise
+        with self._lock:
+            # unless it already finished
+            if job.id in self._pending:
+                self._pending[job.id] = (job, future)
+        return job
+
+    @contextmanager
+    def stage(self, job: JobState, name: str):
+        """Time one stage of a running job"""
+        entry = {"name": name, "ms": None}
+        job.stages.append(entry)
+        self.save(job)
+        started = time.perf_counter()
+        try:
+            yield
+        finally:
+            entry["ms"] = round(1000 * (time.perf_counter() - started), 3)
+            self.save(job)
+
+    def run(self, job: JobState, fn) -> None:
+        try:
+            job.started_at = datetime.utcnow()
+            job.status = RUNNING
+            job.stages.append({"name": "queued", "ms": round((job.started_at - job.created_at).total_seconds() * 1000, 3)})
+            self.save(job)
+            job.result = fn(stage=lambda name: self.stage(job, name), **job.params)
+            job.status = SUCCEEDED
+        except Exception as e:
+            job.error = str(e) or type(e).__name__
+            job.status = FAILED
+            print(f"{Fore.RED}{error:<10}{Fore.RESET}Job {job.id} ({job.kind}) failed: {job.error}")
+        finally:
+            job.finished_at = datetime.utcnow()
+            self.save(job)
+            with self._lock:
+                self._pending.pop(job.id, None)
+            self._slots.release()
+
+    def get(self, job_id: str) -> dict | None:
+        """The job's state, or None if unknown (or past retention)"""
+        return self.store.get(job_id)
+
+    def stop(self) -> None:
+        """Drop queued jobs (marked failed) and let running ones finish"""
+        self.executor.shutdown(wait=False, cancel_futures=True)
+        with self._lock:
+            pending = list(self._pending.values())
+        for job, future in pending:
+            if future is not None and future.cancelled():
+                job.status = FAILED
+                job.error = "Cancelled at shutdown"
+                job.finished_at = datetime.utcnow()
+                self.save(job)
+
+
+job_queue = JobQueue()
@@ -0,0 +1,141 @@
+#!/usr/bin/env python3
+
+"""Leader election: the one holder of the `lease` row runs the scheduled sync and Slack posts"""
+
+import asyncio
+import os
+import socket
+import time
+import uuid
+from colorama import Fore
+from database import db_pool
+from datetime import UTC, datetime, timedelta
+from decouple import config
+from pony.orm import PrimaryKey, Required, db_session
+
+# logging prefixes
+info = "INFO:"
+error = "ERROR:"
+warning = "WARNING:"
+
+# env
+LEASE_TTL = config("LEASE_TTL", default=30, cast=int)  # seconds
+
+
+def define_entities(db):
+    """Define the `lease` table on a Pony database (call before `generate_mapping`)"""
+
+    class Lease(db.Entity):
+        _table_ = "lease"
+        name = PrimaryKey(str)
+        holder = Required(str)
+        expires_at = Required(datetime)
+
+    return Lease
+
+
+def now_utc() -> datetime:
+    return datetime.now(UTC).replace(tzinfo=None)
+
+
+class Leader:
+    """Holds (or waits for) the `name` lease"""
+
+    def __init__(self, name: str = "scheduler", ttl: int = LEASE_TTL):
+        self.name = name
+        self.ttl = ttl
+        self.holder = f"{socket.gethostname()}:{os.getpid()}:{uuid.uuid4().hex[:8]}"
+        self.db = None
+        self.entity = None
+        self.held_until = 0.0
+        self._task: asyncio.Task | None = None
+
+    def bind(self, db, entity) -> None:
+        """Use the `Lease` entity returned by `define_entities` on `db`"""
+        self.db = db
+        self.entity = entity
+
+    def __bool__(self):
+        return self.entity is not None
+
+    @property
+    def is_leader(self) -> bool:
+        """Whether this process holds the lease (always, when no lease table is bound)"""
+        return not self or time.monotonic() < self.held_until
+
+    def acquire_sql(self) -> str:
+        mark = "?" if self.db.provider.paramstyle == "qmark" else "%s"
+        table = self.entity._table_
+        return (
+            f"INSERT INTO {table} (name, holder, expires_at) VALUES ({mark}, {mark}, {mark}) "
+            f"ON CONFLICT (name) DO UPDATE SET holder = excluded.holder, expires_at = excluded.expires_at "
+            f"WHERE {table}.holder = excluded.holder OR {table}.expires_at < {mark}"
+        )
+
+    def acquire(self) -> bool:
+        """Take or renew the lease; returns whether this process is now the leader"""
+        started = time.monotonic()
+        now = now_utc()
+        convert = self.entity._adict_["expires_at"].converters[0].py2sql
+        mark = "?" if self.db.provider.paramstyle == "qmark" else "%s"
+
+        was_leader = self.is_leader
+        with db_session:
+            cursor = self.db.get_connection().cursor()
+            cursor.execute(self.acquire_sql(), (self.name, self.holder, convert(now + timedelta(seconds=self.ttl)), convert(now)))
+            cursor.execute(f"SELECT holder FROM {self.entity._table_} WHERE name = {mark}", (self.name,))
+            (holder,) = cursor.fetchone()
+            self.db.commit()
+
+        # counted from before the write, so we stop leading no later than others may take over
+        self.held_until = started + self.ttl if holder == self.holder else 0.0
+        if self.is_leader != was_leader:
+            state = "Acquired" if self.is_leader else "Lost"
+            print(f"{Fore.GREEN}{info:<10}{Fore.RESET}{state} the {self.name} lease ({self.holder})")
+        return self.is_leader
+
+    def release(self) -> None:
+        """Give up the lease so another process takes over at once"""
+        mark = "?" if self.db.provider.paramstyle == "qmark" else "%s"
+        with db_session:
+            cursor = self.db.get_connection().cursor()
+            cursor.execute(f"DELETE FROM {self.entity._table_} WHERE name = {mark} AND holder = {mark}", (self.name, self.holder))
+            self.db.commit()
+        self.held_until = 0.0
+
+    async def run(self) -> None:
+        """Renew (or try to take) the lease every third of the TTL"""
+        while True:
+            await asyncio.sleep(self.ttl / 3)
+            try:
+                await db_pool.run(self.acquire)
+            except Exception as e:
+                print(f"{Fore.RED}{error:<10}{Fore.RESET}Lease heartbeat failed: {e}")
+
+    async def start(self) -> None:
+        """Try for the lease once, then keep heartbeating on the running event loop"""
+        if not self or self._task is not None:
+            return
+        try:
+            await db_pool.run(self.acquire)
+        except Exception as e:
+            print(f"{Fore.RED}{error:<10}{Fore.RESET}Failed to acquire the {self.name} lease: {e}")
+        self._task = asyncio.get_running_loop().create_task(self.run())
+
+    async def stop(self) -> None:
+        """Stop heartbeating and release the lease"""
+        if self._task is None:
+            return
+        self._task.cancel()
+        try:
+            await self._task
+        except asyncio.CancelledError:
+            pass
+        self._task = None
+        try:
+            await db_pool.run(self.release)
+        except Exception as e:
+            print(f"{Fore.RED}{error:<10}{Fore.RESET}Failed to release the {self.name} lease: {e}")
+
+
+leader = Leader()
@@ -1,28 +1,40 @@
 #!/usr/bin/env python3
 
 import arrow
+import asyncio
 import os
 import pandas as pd
 import sys
 import time
 from colorama import Fore
+from credentials import SERVICE_TOKEN_DAYS, service_tokens, user_cache, verified_passwords
+from database import connect, db, db_pool
+from dataclasses import asdict
 from datetime import datetime, timedelta
 from decouple import config
+from event_store import define_entities as define_event_entities, event_store
+from exclusions import define_entities, rule_set
 from fastapi import APIRouter, Depends, FastAPI, Form, HTTPException, Request, status
+from fastapi.encoders import jsonable_encoder
 from fastapi.middleware.cors import CORSMiddleware
-from fastapi.responses import HTMLResponse, RedirectResponse
+from fastapi.responses import HTMLResponse, JSONResponse, RedirectResponse
 from fastapi.security import OAuth2PasswordBearer, OAuth2PasswordRequestForm
 from fastapi.templating import Jinja2Templates
 from icecream import ic
+from jobs import JOB_BACKEND, DatabaseJobStore, QueueFull, define_entities as define_job_entities, job_queue, untimed
 from jose import JWTError, jwt
+from leader import define_entities as define_lease_entities, leader
 from math import ceil
 from meetup_query import *
 from passlib.context import CryptContext
 from pathlib import Path
-from pony.orm import Database, Optional, PrimaryKey, Required, Set, db_session
+from pony.orm import Optional, PrimaryKey, Required, Set, db_session
+from post_ledger import current_period, define_entities as define_post_entities, post_ledger
+from prefetch import prefetcher
 from pydantic import BaseModel
-from schedule import check_and_revert_snooze, get_current_schedule_time, get_schedule, snooze_schedule
-from sign_jwt import main as gen_token
+from schedule import define_entities as define_schedule_entities, get_schedules, schedule_repository, snooze_schedule
+from scheduler import post_scheduler, schedule_engine
+from sign_jwt import get_tokens as gen_token
 from slackbot import *
 from typing import List, Union
 
@@ -43,9 +55,6 @@ tz = config("TZ", default="America/Chicago")
 bypass_schedule = config("OVERRIDE", default=False, cast=bool)
 
 # time
-current_time_local = arrow.now(tz)
-current_time_utc = arrow.utcnow()
-current_day = current_time_local.format("dddd")  # Monday, Tuesday, etc.
 time.tzset()
 
 # pandas don't truncate output
@@ -120,8 +129,7 @@ app.add_middleware(
 Database
 """
 
-# init db
-db = Database()
+# every table is defined on the shared `db`
 
 
 # user model
@@ -131,21 +139,40 @@ class UserInfo(db.Entity):
     email = Optional(str)
 
 
+# posting schedule per day
+Schedule = define_schedule_entities(db)
+
+# exclusion rules (merged with `exclusions.csv`)
+Exclusion = define_entities(db)
+
+# events from every sync
+StoredEvent = define_event_entities(db)
+
+# slack posts per channel and day
+SlackPost = define_post_entities(db)
+
+# scheduled job lease (one leader across workers and replicas)
+Lease = define_lease_entities(db)
+
+# background job states (with `JOB_BACKEND=database`)
+Job = define_job_entities(db)
+
+
 # strip double quotes from string
 DB_PASS = DB_PASS.strip('"')
 
-# postgres db
-db.bind(
-    provider='postgres',
-    user=DB_USER,
-    password=DB_PASS,
-    host=DB_HOST,
-    database=DB_NAME,
-    port=DB_PORT,
-)
+# bind and generate mapping (once, for every entity above)
+connect()
+schedule_repository.bind(Schedule)
+rule_set.bind(Exclusion)
+event_store.bind(db, StoredEvent)
+post_ledger.bind(SlackPost)
+leader.bind(db, Lease)
+if JOB_BACKEND == "database":
+    job_queue.bind(DatabaseJobStore(Job))
 
-# generate mapping
-db.generate_mapping(create_tables=True)
+# fire times precomputed from the `schedule` table
+schedule_engine.bind(schedule_repository.snapshot, schedule_repository.refresh)
 
 
 """
@@ -166,6 +193,7 @@ class User(BaseModel):
     username: str
     email: str | None = None
     disabled: bool | None = None
+    scopes: list[str] | None = None  # service tokens only (people have every scope)
 
 
 class UserInDB(User):
@@ -178,8 +206,13 @@ oauth2_scheme = OAuth2PasswordBearer(tokenUrl="token")
 
 
 def verify_password(plain_password, hashed_password):
-    """Validate plaintext password against hashed password"""
-    return pwd_context.verify(plain_password, hashed_password)
+    """Validate plaintext password against hashed password (bcrypt; skipped if verified recently)"""
+    if verified_passwords.check(hashed_password, plain_password):
+        return True
+    if not pwd_context.verify(plain_password, hashed_password):
+        return False
+    verified_passwords.add(hashed_password, plain_password)
+    return True
 
 
 def get_password_hash(password):
@@ -196,7 +229,7 @@ def get_user(username: str):
 
 def authenticate_user(username: str, password: str):
     """Authenticate user"""
-    user = get_user(username)
+    user = user_cache.get(username, get_user)
     if not user:
         return False
     if not verify_password(password, user.hashed_password):
@@ -226,6 +259,14 @@ async def get_current_user(token: str = Depends(oauth2_scheme)):
         detail="Could not validate credentials",
         headers={"WWW-Authenticate": "Bearer"},
     )
+
+    # machine clients: HMAC check only, no database
+    if service_tokens.is_service_token(token):
+        claims = service_tokens.verify(token)
+        if claims is None:
+            raise credentials_exception
+        return User(username=f"service:{claims.sub}", scopes=sorted(claims.scopes))
+
     try:
         payload = jwt.decode(token, SECRET_KEY, algorithms=[ALGORITHM])
         username: str = payload.get("sub")
@@ -234,7 +275,8 @@ async def get_current_user(token: str = Depends(oauth2_scheme)):
         token_data = TokenData(username=username)
     except JWTError:
         raise credentials_exception
-    user = get_user(username=token_data.username)
+    # cached per process (FastAPI already resolves this dependency once per request)
+    user = await user_cache.aget(token_data.username, get_user)
     if user is None:
         raise credentials_exception
 
@@ -249,6 +291,17 @@ async def get_current_active_user(current_user: User = Depends(get_current_user)
     return current_user
 
 
+def require_scope(scope: str):
+    """Dependency: the active user, if allowed `scope` (people have every scope)"""
+
+    async def dependency(current_user: User = Depends(get_current_active_user)):
+        if current_user.scopes is not None and scope not in current_user.scopes:
+            raise HTTPException(status_code=status.HTTP_403_FORBIDDEN, detail=f"Missing scope: {scope}")
+        return current_user
+
+    return dependency
+
+
 async def ip_whitelist_or_auth(request: Request, current_user: User = Depends(get_current_active_user)):
     if is_ip_allowed(request):
         return {"bypass_auth": True}
@@ -267,10 +320,42 @@ def check_auth(auth: dict | User) -> None:
         raise HTTPException(status_code=401, detail="Unauthorized")
 
 
+@api_router.post("/service-tokens")
+def issue_service_token(
+    name: str,
+    scopes: str = "events:read,slack:post",
+    days: int = SERVICE_TOKEN_DAYS,
+    current_user: User = Depends(get_current_active_user),
+):
+    """
+    Issue a long-lived service token for a machine client (e.g., `scheduler.sh`)
+
+    Service tokens are checked with an HMAC instead of a database lookup and only carry `scopes`.
+
+    Args:
+        name (str): client name (the token's subject)
+        scopes (str): comma separated scopes (events:read, slack:post, schedule:write)
+        days (int): days until the token expires
+    """
+
+    # only people can mint tokens
+    if current_user.scopes is not None:
+        raise HTTPException(status_code=status.HTTP_403_FORBIDDEN, detail="Service tokens cannot issue tokens")
+
+    try:
+        token = service_tokens.issue(name, [scope.strip() for scope in scopes.split(",") if scope.strip()], days=days)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+
+    claims = service_tokens.verify(token)
+    return {"access_token": token, "token_type": "bearer", "scopes": sorted(claims.scopes), "expires": claims.exp}
+
+
 @app.post("/token", response_model=Token)
 async def login_for_oauth_token(form_data: OAuth2PasswordRequestForm = Depends()):
     """Login for oauth access token"""
-    user = authenticate_user(form_data.username, form_data.password)
+    # bcrypt is slow: keep it off the event loop
+    user = await asyncio.to_thread(authenticate_user, form_data.username, form_data.password)
     if not user:
         raise HTTPException(
             status_code=status.HTTP_401_UNAUTHORIZED,
@@ -314,6 +399,50 @@ def startup_event():
         if not UserInfo.exists(username=DB_USER):
             hashed_password = get_password_hash(DB_PASS)
             UserInfo(username=DB_USER, hashed_password=hashed_password)
+    user_cache.invalidate(DB_USER)
+
+
+@app.on_event("startup")
+async def start_leader():
+    """Compete for the scheduled job lease (before the jobs start)"""
+    await leader.start()
+
+
+@app.on_event("startup")
+async def start_prefetch():
+    """Start the background event sync loop"""
+    prefetcher.start()
+
+
+@app.on_event("shutdown")
+async def stop_prefetch():
+    """Stop the background event sync loop"""
+    await prefetcher.stop()
+
+
+@app.on_event("startup")
+async def start_scheduler():
+    """Start the in-process Slack post scheduler (fire times from the `schedule` table)"""
+    post_scheduler.bind(scheduled_post)
+    post_scheduler.start()
+
+
+@app.on_event("shutdown")
+async def stop_scheduler():
+    """Stop the Slack post scheduler"""
+    await post_scheduler.stop()
+
+
+@app.on_event("shutdown")
+async def stop_jobs():
+    """Drop queued background jobs (running ones finish)"""
+    await asyncio.to_thread(job_queue.stop)
+
+
+@app.on_event("shutdown")
+async def stop_leader():
+    """Release the lease so another process takes over at once (after the jobs stop)"""
+    await leader.stop()
 
 
 @app.get("/healthz", status_code=200)
@@ -335,93 +464,134 @@ def login(request: Request, username: str = Form(...), password: str = Form(...)
         return RedirectResponse(url="/docs", status_code=303)
 
 
-# TODO: use refresh token to get new access token
 @api_router.get("/token")
 def generate_token(current_user: User = Depends(get_current_active_user)):
     """
     Get access and refresh tokens
 
+    Tokens are cached per process and renewed with the refresh token shortly before they expire
+
     Args:
-        access_token (str): hard-coded access_token
-        refresh_token (str): hard-coded refresh_token
+        access_token (str): cached access_token
+        refresh_token (str): cached refresh_token
     """
 
     if not current_user:
         raise HTTPException(status_code=401, detail="Unauthorized")
 
-    global access_token, refresh_token
+    # the Meetup OAuth tokens are wider than any scope a service token can carry
+    if current_user.scopes is not None:
+        raise HTTPException(status_code=status.HTTP_403_FORBIDDEN, detail="Service tokens cannot read Meetup tokens")
 
-    # generate access and refresh tokens
+    # get cached (or renewed) access and refresh tokens
     try:
         tokens = gen_token()
         access_token = tokens["access_token"]
         refresh_token = tokens["refresh_token"]
-    except KeyError as e:
+    except (KeyError, TypeError) as e:
         print(f"{Fore.RED}{error:<10}{Fore.RESET}KeyError: {e}")
         raise HTTPException(status_code=500, detail="Internal Server Error")
 
     return access_token, refresh_token
 
 
-# TODO: decouple export from formatted response
+def load_events(location: str = "Oklahoma City", exclusions: str = "Tulsa", refresh: bool = False, descriptions: bool = False):
+    """
+    Run the in-memory event pipeline over the latest sync
+
+    Descriptions are only looked up (for the remaining events) when `descriptions` is set
+    and the sync didn't already select them.
+
+    Returns the event records and the snapshot they came from
+    """
+
+    # stored rules plus comma separated keywords (compiled once per distinct set)
+    matcher = rule_set.matcher(extra=exclusions or "")
+
+    # first-party and third-party responses from the latest sync
+    try:
+        snapshot = prefetcher.get(refresh=refresh)
+    except RuntimeError as e:
+        print(f"{Fore.RED}{error:<10}{Fore.RESET}{e}")
+        raise HTTPException(status_code=502, detail="Could not sync events from Meetup")
+
+    # one indexed query on the event store (unless rules need descriptions, which it doesn't keep)
+    if event_store and "description" not in matcher.fields:
+        events = get_stored_events(event_store.between(city=location), location=location, exclusions=matcher)
+    else:
+        events = get_all_events(snapshot.self_response, snapshot.groups, location=location, exclusions=matcher)
+
+    if descriptions and not snapshot.plan.description:
+        tokens = gen_token()
+        if not tokens:
+            print(f"{Fore.RED}{error:<10}{Fore.RESET}Failed to get access token")
+            raise HTTPException(status_code=502, detail="Could not get a Meetup access token")
+        events = add_descriptions(tokens["access_token"], events)
+
+    return events, snapshot
+
+
 @api_router.get("/events")
 def get_events(
     auth: dict = Depends(ip_whitelist_or_auth),
     location: str = "Oklahoma City",
     exclusions: str = "Tulsa",
-    current_user: User = Depends(get_current_active_user),
+    current_user: User = Depends(require_scope("events:read")),
+    refresh: bool = False,
+    descriptions: bool = False,
 ):
     """
     Query upcoming Meetup events
 
+    Served from the background sync's snapshot; the `Age` header is the snapshot's age in seconds
+
     Args:
         location (str): location to search for events
         exclusions (str): location to exclude from search
+        refresh (bool): sync with Meetup before responding instead of using the current snapshot
+        descriptions (bool): include event descriptions (looked up on demand)
     """
 
     if not current_user:
         raise HTTPException(status_code=401, detail="Unauthorized")
 
-    access_token, refresh_token = generate_token()
+    events, snapshot = load_events(location, exclusions=exclusions, refresh=refresh, descriptions=descriptions)
 
-    # default exclusions
-    exclusion_list = [
-        '36\u00b0N',
-        'Bitcoin',
-        'Nerdy Girls',
-        'Project 3810',
-    ]
+    if not events:
+        return JSONResponse({"message": "No events found", "events": []}, headers=snapshot.headers())
 
-    # if exclusions, add to list of exclusions
-    if exclusions is not None:
-        exclusions = exclusions.split(",")
-        exclusion_list = exclusion_list + exclusions
+    return JSONResponse(jsonable_encoder(events), headers=snapshot.headers())
 
-    response = send_request(access_token, query, vars)
 
-    export_to_file(response, format, exclusions=exclusion_list)
+@api_router.get("/events/changes")
+def get_event_changes(
+    auth: dict = Depends(ip_whitelist_or_auth),
+    location: str = "Oklahoma City",
+    exclusions: str = "Tulsa",
+    current_user: User = Depends(require_scope("events:read")),
+):
+    """
+    Events added, changed and removed by the latest sync
 
-    # third-party query
-    output = []
-    for url in url_vars:
-        response = send_request(access_token, url_query, f'{{"urlname": "{url}"}}')
-        # append to output dict if the response is not empty
-        if len(format_response(response, exclusions=exclusion_list)) > 0:
-            output.append(response)
-        else:
-            print(f"{Fore.GREEN}{info:<10}{Fore.RESET}No upcoming events for {url} found")
-    # loop through output and append to file
-    for i in range(len(output)):
-        export_to_file(output[i], format)
+    Added and changed events are returned as event records (filtered like `/events`); removed events as ids
+    """
 
-    # cleanup output file
-    sort_json(json_fn)
+    if not current_user:
+        raise HTTPException(status_code=401, detail="Unauthorized")
 
-    # check if file exists after sorting
-    if not os.path.exists(json_fn) or os.stat(json_fn).st_size == 0:
-        return {"message": "No events found", "events": []}
+    events, snapshot = load_events(location, exclusions=exclusions)
+    changes = snapshot.changes
 
-    return pd.read_json(json_fn).to_dict('records')
+    return JSONResponse(
+        jsonable_encoder(
+            {
+                "added": [e for e in events if e["id"] in changes.added],
+                "changed": [e for e in events if e["id"] in changes.changed],
+                "removed": sorted(changes.removed),
+            }
+        ),
+        headers=snapshot.headers(),
+    )
 
 
 @api_router.get("/check-schedule")
@@ -430,41 +600,70 @@ def should_post_to_slack(auth: dict = Depends(ip_whitelist_or_auth), request: Re
     Check if it's time to post to Slack based on the schedule
     """
 
-    with db_session:
-        check_and_revert_snooze()  # Check and revert any expired snoozes
-        schedule = get_schedule(current_day)
+    # today's fire instant is precomputed (DST-aware, snoozes applied)
+    now = arrow.utcnow()
+    fire = schedule_engine.today(now)
 
-        if schedule and schedule.enabled:
-            utc_time, local_time = get_current_schedule_time(schedule)
+    # If no schedule found or not enabled
+    if fire is None:
+        return {
+            "should_post": False,
+        }
 
-            # Parse the schedule time
-            schedule_time_local = (
-                arrow.get(schedule.schedule_time, "HH:mm")
-                .replace(year=current_time_local.year, month=current_time_local.month, day=current_time_local.day, tzinfo="UTC")
-                .to(tz)
-            )
+    return {
+        "should_post": schedule_engine.should_post(now),
+        "current_time": now.to(tz).format("dddd HH:mm ZZZ"),
+        "schedule_time": fire.to(tz).format("dddd HH:mm ZZZ"),
+        "time_diff_minutes": ceil(abs((fire - now).total_seconds()) / 60),
+    }
 
-            # Calculate time difference in minutes and round up
-            time_diff = abs((schedule_time_local - current_time_local).total_seconds() / 60)
-            time_diff_rounded = ceil(time_diff)
 
-            # TODO: walk back to 5-10 minutes vs. 90 minutes
-            # Check if current time is within n minutes of scheduled time
-            should_post = time_diff_rounded <= 90
+def post_events(
+    location: str = "Oklahoma City",
+    exclusions: str = "Tulsa",
+    channel_name: str | None = None,
+    changes_only: bool = False,
+    repost: bool = False,
+    stage=untimed,
+) -> dict:
+    """Post the events to Slack (shared by `/api/slack`, its jobs and the scheduler; `stage` times each step)"""
 
-            # TODO: verify if it's actually CST or CDT
-            return {
-                "should_post": should_post,
-                "current_time": current_time_local.format("dddd HH:mm ZZZ"),
-                "schedule_time": schedule_time_local.format("dddd HH:mm ZZZ"),
-                "time_diff_minutes": time_diff_rounded,
-            }
+    # sync (token and Meetup fan-out, when stale), filter and sort
+    with stage("events"):
+        events, snapshot = load_events(location, exclusions=exclusions)
 
-        # If no schedule found or not enabled
-        elif not schedule or not schedule.enabled:
-            return {
-                "should_post": False,
-            }
+    if changes_only:
+        events = [e for e in events if e["id"] in snapshot.changes.updated]
+        if not events:
+            return {"message": "No new or changed events since the last sync"}
+
+    # convert events to list of strings
+    with stage("render"):
+        msg = fmt_events(events)
+        messages = render_messages(events)
+
+    # post to one channel if channel_name is set, else to all channels (concurrently)
+    targets = [chan_dict[channel_name]] if channel_name is not None else list(channels.values())
+
+    # one message per channel and day: skipped when unchanged, edited in place when changed
+    period = current_period() + (" changes" if changes_only else "")
+    with stage("slack"):
+        deliveries = send_messages(messages, targets, ledger=post_ledger, period=period, repost=repost)
+
+    return ic({"message": msg, "deliveries": [asdict(d) for d in deliveries]})
+
+
+async def scheduled_post():
+    """Sync events, then post them (the scheduler's job)"""
+
+    try:
+        await prefetcher.arefresh()
+    except Exception as e:
+        # post the last snapshot rather than nothing
+        print(f"{Fore.YELLOW}{warning:<10}{Fore.RESET}Sync before scheduled post failed: {e}")
+
+    # slack delivery runs its own event loop
+    await asyncio.to_thread(post_events)
 
 
 @api_router.post("/slack")
@@ -473,13 +672,20 @@ def post_slack(
     location: str = "Oklahoma City",
     exclusions: str = "Tulsa",
     channel_name: str = None,
-    current_user: User = Depends(get_current_active_user),
+    current_user: User = Depends(require_scope("slack:post")),
     override: bool = bypass_schedule,
+    changes_only: bool = False,
+    repost: bool = False,
+    job: bool = False,
 ):
     """
     Post to slack
 
-    Calls main function to post formatted message to predefined channel
+    Calls main function to post formatted message to predefined channel.
+    With `changes_only`, only events added or changed by the latest sync are posted.
+    A channel's post for the day is skipped if unchanged and edited in place if changed;
+    `repost` sends a new message instead.
+    With `job`, responds `202 Accepted` with a job id at once; poll `/api/jobs/{id}` for the result.
     """
 
     if not current_user:
@@ -506,29 +712,49 @@ def post_slack(
     # else:
     #     return {"message": "Error checking schedule", "reason": "Unexpected return type from should_post_to_slack"}
 
-    get_events(location, exclusions=exclusions)
+    if job:
+        try:
+            queued = job_queue.submit(
+                "slack",
+                post_events,
+                location=location,
+                exclusions=exclusions,
+                channel_name=channel_name,
+                changes_only=changes_only,
+                repost=repost,
+            )
+        except QueueFull as e:
+            raise HTTPException(status_code=503, detail=str(e), headers={"Retry-After": "30"})
+        return JSONResponse(
+            status_code=status.HTTP_202_ACCEPTED,
+            content={"job_id": queued.id, "status": queued.status, "url": f"/api/jobs/{queued.id}"},
+            headers={"Location": f"/api/jobs/{queued.id}"},
+        )
 
-    # open json file and convert to list of strings
-    msg = fmt_json(json_fn)
+    return post_events(location, exclusions, channel_name, changes_only=changes_only, repost=repost)
 
-    # if channel_name is not None, post to channel as one concatenated string
-    if channel_name is not None:
-        # get channel id chan_dict key value pair
-        channel_id = chan_dict[channel_name]
-        # post to single channel
-        send_message("\n".join(msg), channel_id)
-    else:
-        # post to all channels
-        for name, id in channels.items():
-            send_message("\n".join(msg), id)
 
-    return ic(msg)
+@api_router.get("/jobs/{job_id}")
+def get_job(job_id: str, auth: dict = Depends(ip_whitelist_or_auth), current_user: User = Depends(require_scope("slack:post"))):
+    """
+    Status of a background job: stage timings, then its result or error
+    """
+
+    if not current_user:
+        raise HTTPException(status_code=401, detail="Unauthorized")
+
+    state = job_queue.get(job_id)
+    if state is None:
+        raise HTTPException(status_code=404, detail="Job not found")
+
+    return state
 
 
 @api_router.post("/snooze")
-def snooze_slack_post(
+async def snooze_slack_post(
     duration: str,
     auth: dict = Depends(ip_whitelist_or_auth),
+    current_user: User = Depends(require_scope("schedule:write")),
 ):
     """
     Snooze the Slack post for the specified duration
@@ -541,7 +767,8 @@ def snooze_slack_post(
         raise HTTPException(status_code=401, detail="Unauthorized")
 
     try:
-        snooze_schedule(duration)
+        await db_pool.run(snooze_schedule, duration)
+        post_scheduler.wake()
         return {"message": f"Slack post snoozed for {duration}"}
     except ValueError as e:
         raise HTTPException(status_code=400, detail=str(e))
@@ -549,29 +776,30 @@ def snooze_slack_post(
 
 # TODO: test IP whitelisting
 @api_router.get("/schedule")
-def get_current_schedule(auth: dict | User = Depends(ip_whitelist_or_auth)):
+async def get_current_schedule(auth: dict | User = Depends(ip_whitelist_or_auth)):
     """
     Get the current schedule including any active snoozes
     """
     check_auth(auth)
 
-    with db_session:
-        check_and_revert_snooze()  # Check and revert any expired snoozes
-        schedules = []
-        for day in ["Sunday", "Monday", "Tuesday", "Wednesday", "Thursday", "Friday", "Saturday"]:
-            schedule = get_schedule(day)
-            if schedule:
-                schedules.append(
-                    {
-                        "day": schedule.day,
-                        "schedule_time": schedule.schedule_time,
-                        "enabled": schedule.enabled,
-                        "snooze_until": schedule.snooze_until,
-                        "original_schedule_time": schedule.original_schedule_time,
-                    }
-                )
-
-    return {"schedules": schedules}
+    # one query when the cached rows are stale, otherwise memory only (expired snoozes read as reverted)
+    if schedule_repository.stale:
+        await db_pool.run(schedule_repository.refresh)
+    schedules = get_schedules()
+
+    next_post = post_scheduler.next_fire()
+
+    return {"schedules": schedules, "next_post": next_post.isoformat() if next_post else None}
+
+
+@api_router.get("/db/pool")
+def get_db_pool_stats(auth: dict | User = Depends(ip_whitelist_or_auth)):
+    """
+    Database pool metrics for this worker (size, in use, queued, wait times)
+    """
+    check_auth(auth)
+
+    return db_pool.stats()
 
 
 # routes
@@ -1,22 +1,47 @@
 #!/usr/bin/env python3
 
 import arrow
+import asyncio
+import httpx
 import json
+import logging
+import msgspec
 import os
 import pandas as pd
 import requests
 import requests_cache
 import sys
-from arrow import ParserError
+import threading
+from collections.abc import AsyncIterator, Iterator
 from colorama import Fore
+from dataclasses import dataclass
 from decouple import config
+from exclusions import as_matcher, rule_set
+from functools import cached_property, lru_cache
 from icecream import ic
+from meetup_types import (
+    BatchResponse,
+    Data,
+    Event,
+    EventConnection,
+    EventEdge,
+    GraphQLError,
+    PageInfo,
+    Response,
+    batch_decoder,
+    event_batch_decoder,
+    response_decoder,
+)
 from pathlib import Path
-from sign_jwt import main as gen_token
+from sign_jwt import get_tokens as gen_token
 
 # verbose icecream
 ic.configureOutput(includeContext=True)
 
+# pretty-printed response bodies are logged at debug level
+# logging.basicConfig(level=logging.DEBUG)
+logger = logging.getLogger(__name__)
+
 # logging prefixes
 info = "INFO:"
 error = "ERROR:"
@@ -37,6 +62,9 @@ csv_fn = config('CSV_FN', default='raw/output.csv')
 json_fn = config('JSON_FN', default='raw/output.json')
 days = config('DAYS', default=7, cast=int)
 tz = config('TZ', default='America/Chicago')
+concurrency = config('CONCURRENCY', default=8, cast=int)
+batch_size = config('BATCH_SIZE', default=10, cast=int)
+timeout = config('TIMEOUT', default=30, cast=int)
 
 groups_csv = script_dir / "groups.csv"
 if not groups_csv.exists():
@@ -66,88 +94,127 @@ groups_array = groups['urlname']._values
 # assign to `url_vars` as a list
 url_vars = [group for group in groups_array]
 
-# Techlahoma: search all affiliate groups for upcoming events (node doesn't expose name of affiliate group)
-query = """
-query {
-    self {
-        id
-        name
-        username
-        memberUrl
-        memberEvents(first: 10) {
-            totalCount
-            pageInfo {
-                endCursor
-            }
-            edges {
-                node {
-                    id
-                    title
-                    description
-                    dateTime
-                    eventUrl
-                    group {
-                        id
-                        name
-                        urlname
-                        link
-                        city
-                    }
-                }
-            }
-        }
-    }
-}
-"""
+# fields the pipeline reads from each event (`description` is only selected on demand)
+event_fields = ('id', 'title', 'dateTime', 'eventUrl', 'group { name urlname city }')
+
+
+@dataclass(frozen=True)
+class QueryPlan:
+    """
+    Field projection and page size for the event queries
+
+    Only fields the pipeline reads are selected. Event descriptions are the bulk of each
+    payload, so they are only requested when a consumer needs them (e.g., an exclusion
+    rule on descriptions); otherwise `fetch_descriptions` fills them in for the events
+    that survive filtering.
+    """
+
+    description: bool = False
+    first: int = 10
+
+    def events(self, connection: str, args: str) -> str:
+        """Selection for an event connection (e.g., `memberEvents(first: 10)`)"""
+        fields = ' '.join((*event_fields, 'description') if self.description else event_fields)
+        return f"""
+        {connection}({args}) {{
+            pageInfo {{ endCursor hasNextPage }}
+            edges {{ node {{ {fields} }} }}
+        }}"""
+
+    @cached_property
+    def self_query(self) -> str:
+        """Techlahoma: search all affiliate groups for upcoming events"""
+        events = self.events('memberEvents', f'first: {self.first}, after: $after')
+        return f"query($after: String) {{\n    self {{{events}\n    }}\n}}\n"
+
+    @cached_property
+    def group_fields(self) -> str:
+        """Fields selected for each unaffiliated group (first page)"""
+        return "\n        name urlname city" + self.events('events', f'first: {self.first}') + "\n"
+
+    @cached_property
+    def url_query(self) -> str:
+        """One page of an unaffiliated group's events"""
+        events = self.events('events', f'first: {self.first}, after: $after')
+        return f"query($urlname: String!, $after: String) {{\n    groupByUrlname(urlname: $urlname) {{\n        name urlname city{events}\n    }}\n}}\n"
+
+
+# default plan (no descriptions)
+default_plan = QueryPlan()
+query = default_plan.self_query
+group_fields = default_plan.group_fields
+url_query = default_plan.url_query
+
 # shorthand for proNetwork id (unused in `self` query, but required in headers)
 vars = '{ "id": "364335959210266624" }'
 
-# unaffiliated groups
-url_query = """
-query($urlname: String!) {
-    groupByUrlname(urlname: $urlname) {
-        id
-        description
-        name
-        urlname
-        city
-        link
-        events(first: 10) {
-            totalCount
-            pageInfo {
-                endCursor
-            }
-            edges {
-                node {
-                    id
-                    title
-                    description
-                    dateTime
-                    eventUrl
-                    group {
-                        id
-                        name
-                        urlname
-                        link
-                        city
-                    }
-                }
-            }
-        }
-    }
-}
-"""
-
-
-def send_request(token, query, vars) -> str:
+
+def build_batch_query(urlnames, plan: QueryPlan = default_plan) -> tuple[str, dict]:
+    """
+    Fold several `groupByUrlname` lookups into one document via aliases
+
+    E.g., `g0: groupByUrlname(urlname: $u0)`, `g1: groupByUrlname(urlname: $u1)`, ...
+
+    Returns the query and its variables
+    """
+
+    params = ", ".join(f"$u{i}: String!" for i in range(len(urlnames)))
+    aliases = "".join(
+        f"    g{i}: groupByUrlname(urlname: $u{i}) {{{plan.group_fields}    }}\n" for i in range(len(urlnames))
+    )
+    batch_query = f"query({params}) {{\n{aliases}}}\n"
+    variables = {f"u{i}": url for i, url in enumerate(urlnames)}
+
+    return batch_query, variables
+
+
+def split_batch_response(response: BatchResponse, urlnames) -> list[Response]:
+    """
+    Split an aliased batch response into one `groupByUrlname` response per group
+
+    Each result has the same shape as a `url_query` response so it can be passed to `format_response`.
+    GraphQL errors are routed to the alias in their `path`; errors without a path go to every group.
+    """
+
+    responses = []
+    for i in range(len(urlnames)):
+        alias = f"g{i}"
+        group_errors = [e for e in response.errors if not e.path or e.path[0] == alias]
+        data = None if response.data is None else Data(groupByUrlname=response.data.get(alias))
+        responses.append(Response(data=data, errors=group_errors))
+
+    return responses
+
+
+# graphql endpoint
+endpoint = 'https://api.meetup.com/gql-ext'
+
+
+def decode_response(content: bytes, decoder=response_decoder):
+    """
+    Decode a response body straight into typed structs
+
+    The body is only pretty-printed when debug logging is enabled
+    """
+
+    if logger.isEnabledFor(logging.DEBUG):
+        # skips sorting keys as it rearranges graphql response
+        logger.debug("Response HTTP Response Body:\n%s", json.dumps(json.loads(content), indent=2, sort_keys=False))
+
+    try:
+        return decoder.decode(content)
+    except msgspec.MsgspecError as e:
+        print(f"{Fore.RED}{error:<10}{Fore.RESET}Invalid GraphQL response: {e}")
+        return decoder.type(errors=[GraphQLError(message=str(e))])
+
+
+def send_request(token, query, vars, decoder=response_decoder) -> Response:
     """
     Request
 
     POST https://api.meetup.com/gql-ext
     """
 
-    endpoint = 'https://api.meetup.com/gql-ext'
-
     headers = {'Authorization': f'Bearer {token}', 'Content-Type': 'application/json; charset=utf-8'}
 
     try:
@@ -156,233 +223,529 @@ def send_request(token, query, vars) -> str:
             variables = json.loads(vars)
         else:
             variables = vars
-        
+
         r = requests.post(endpoint, json={'query': query, 'variables': variables}, headers=headers)
         print(f"{Fore.GREEN}{info:<10}{Fore.RESET}Response HTTP Response Body: {r.status_code}")
-
-        # pretty prints json response content but skips sorting keys as it rearranges graphql response
-        pretty_response = json.dumps(r.json(), indent=2, sort_keys=False)
-
-        # formatted response
-        # print('Response HTTP Response Body:\n{content}'.format(content=pretty_response))
     except requests.exceptions.RequestException as e:
         print(f'HTTP Request failed:\n{e}')
         sys.exit(1)
 
-    return pretty_response
+    return decode_response(r.content, decoder)
 
 
-# optional exclusion string parameter
-def format_response(response, location: str = "Oklahoma City", exclusions: str = ""):
+async def send_request_async(client: httpx.AsyncClient, token, query, vars, decoder=response_decoder):
     """
-    Format response for Slack
+    Async request on a shared client
+
+    Same contract as `send_request`, but a failed request is returned as a GraphQL
+    `errors` payload instead of exiting so one bad group doesn't sink the whole fan-out
     """
 
-    # create dataframe columns
-    df = pd.DataFrame(columns=['name', 'date', 'title', 'description', 'city', 'eventUrl'])
+    headers = {'Authorization': f'Bearer {token}', 'Content-Type': 'application/json; charset=utf-8'}
 
-    # convert response to json
-    response_json = json.loads(response)
+    if isinstance(vars, str):
+        variables = json.loads(vars)
+    else:
+        variables = vars
 
-    # TODO: add arg for `self` or `groupByUrlname`
-    # extract data from json
-    data = None
+    try:
+        r = await client.post(endpoint, json={'query': query, 'variables': variables}, headers=headers)
+        print(f"{Fore.GREEN}{info:<10}{Fore.RESET}Response HTTP Response Body: {r.status_code}")
+    except httpx.HTTPError as e:
+        print(f"{Fore.RED}{error:<10}{Fore.RESET}HTTP Request failed: {e}")
+        return decoder.type(errors=[GraphQLError(message=str(e))])
 
-    # Check if response has expected structure
-    if 'data' not in response_json:
-        print(
-            f"{Fore.RED}{error:<10}{Fore.RESET}GraphQL response missing 'data' key. Response: {json.dumps(response_json, indent=2)[:500]}"
+    return decode_response(r.content, decoder)
+
+
+def event_connection(response: Response) -> EventConnection | None:
+    """Return the event connection of a `self` or `groupByUrlname` response"""
+
+    data = response.data
+    if data is None:
+        return None
+    if data.member is not None:
+        return data.member.memberEvents
+    if data.groupByUrlname is not None:
+        return data.groupByUrlname.events
+
+    return None
+
+
+def event_page(response: Response) -> tuple[list[EventEdge], PageInfo]:
+    """Return the event edges and pageInfo of a `self` or `groupByUrlname` response"""
+
+    connection = event_connection(response)
+    if connection is None:
+        return [], PageInfo()
+
+    return connection.edges, connection.pageInfo
+
+
+def past_window(node: Event, until) -> bool:
+    """Check if an event node starts after the end of the time window (one without a start time isn't)"""
+
+    return node.dateTime is not None and arrow.get(node.dateTime) > until
+
+
+def next_cursor(edges, page_info: PageInfo, until) -> str | None:
+    """
+    Cursor of the next page, if any
+
+    Stops once the last event on the page is past `until` (events come back in ascending `dateTime` order)
+    """
+
+    if not edges or not page_info.hasNextPage or not page_info.endCursor:
+        return None
+    if past_window(edges[-1].node, until):
+        return None
+
+    return page_info.endCursor
+
+
+def page_request(urlname: str | None, cursor: str | None, plan: QueryPlan = default_plan) -> tuple[str, dict]:
+    """Query and variables for one page of `self` (urlname is None) or group events"""
+
+    if urlname is None:
+        return plan.self_query, {**json.loads(vars), 'after': cursor}
+
+    return plan.url_query, {'urlname': urlname, 'after': cursor}
+
+
+def iter_events(
+    token, urlname: str | None = None, after: str | None = None, until=None, plan: QueryPlan = default_plan
+) -> Iterator[Event]:
+    """
+    Lazily yield event nodes for `self` (default) or a group, one page at a time
+
+    Follows `pageInfo.endCursor` from `after` until the last page or the first event past `until`
+    (defaults to now + DAYS). Only the current page is held in memory.
+    """
+
+    if until is None:
+        until = arrow.now(tz).shift(days=days)
+
+    cursor = after
+    while True:
+        response = send_request(token, *page_request(urlname, cursor, plan))
+        edges, page_info = event_page(response)
+
+        for edge in edges:
+            if past_window(edge.node, until):
+                return
+            yield edge.node
+
+        cursor = next_cursor(edges, page_info, until)
+        if cursor is None:
+            return
+
+
+async def aiter_events(
+    client: httpx.AsyncClient,
+    token,
+    urlname: str | None = None,
+    after: str | None = None,
+    until=None,
+    plan: QueryPlan = default_plan,
+) -> AsyncIterator[Event]:
+    """Async counterpart of `iter_events` on a shared client"""
+
+    if until is None:
+        until = arrow.now(tz).shift(days=days)
+
+    cursor = after
+    while True:
+        response = await send_request_async(client, token, *page_request(urlname, cursor, plan))
+        edges, page_info = event_page(response)
+
+        for edge in edges:
+            if past_window(edge.node, until):
+                return
+            yield edge.node
+
+        cursor = next_cursor(edges, page_info, until)
+        if cursor is None:
+            return
+
+
+async def fetch_groups(
+    token,
+    urlnames,
+    limit: int = concurrency,
+    size: int = batch_size,
+    client: httpx.AsyncClient | None = None,
+    plan: QueryPlan = default_plan,
+) -> list[Response]:
+    """
+    Query `self` and every group in `urlnames` concurrently
+
+    Groups are folded into aliased batch queries of up to `size` urlnames each, then any
+    group whose first page ends inside the time window is paginated via `aiter_events`.
+    Requests share one HTTP/2 client and at most `limit` are in flight at once.
+    Responses are returned in request order: `self` first, then one per urlname.
+    Fields are selected by `plan`.
+    """
+
+    semaphore = asyncio.Semaphore(limit)
+    batches = [urlnames[i : i + size] for i in range(0, len(urlnames), size)]
+    until = arrow.now(tz).shift(days=days)
+
+    async def fetch(client, query, vars, decoder=response_decoder):
+        async with semaphore:
+            return await send_request_async(client, token, query, vars, decoder)
+
+    async def follow(client, response, urlname):
+        """Append the remaining in-window pages to a first-page response"""
+        edges, page_info = event_page(response)
+        cursor = next_cursor(edges, page_info, until)
+        if cursor is None:
+            return response
+
+        async with semaphore:
+            edges += [EventEdge(node=node) async for node in aiter_events(client, token, urlname, after=cursor, until=until, plan=plan)]
+
+        return response
+
+    async def gather(client):
+        tasks = [fetch(client, *page_request(None, None, plan))]
+        tasks += [fetch(client, *build_batch_query(batch, plan), batch_decoder) for batch in batches]
+        self_response, *batch_responses = await asyncio.gather(*tasks)
+
+        responses = [self_response]
+        for batch, response in zip(batches, batch_responses, strict=True):
+            responses += split_batch_response(response, batch)
+
+        # busy groups: follow cursors past the first page
+        return await asyncio.gather(
+            *(follow(client, response, urlname) for urlname, response in zip([None, *urlnames], responses, strict=True))
         )
-        data = ""
-    else:
-        try:
-            data = response_json['data']['self']['memberEvents']['edges']
-            if data and len(data) > 0 and data[0]['node']['group']['city'] != location:
-                print(f"{Fore.YELLOW}{warning:<10}{Fore.RESET}Skipping event outside of {location}")
-        except KeyError:
-            try:
-                if response_json['data'].get('groupByUrlname') is None:
-                    data = ""
-                    print(f"{Fore.YELLOW}{warning:<10}{Fore.RESET}Skipping group due to empty response")
-                else:
-                    data = response_json['data']['groupByUrlname']['events']['edges']
-                    # TODO: handle no upcoming events to fallback on initial response
-                    if response_json['data']['groupByUrlname']['city'] != location:
-                        print(f"{Fore.RED}{error:<10}{Fore.RESET}No data for {location} found")
-            except KeyError as e:
-                print(f"{Fore.RED}{error:<10}{Fore.RESET}KeyError accessing GraphQL data: {e}")
-                print(f"{Fore.RED}{error:<10}{Fore.RESET}Response structure: {json.dumps(response_json, indent=2)[:500]}")
-                data = ""
-
-    # append data to rows
-    if data:
-        for i in range(len(data)):
-            df.loc[i, 'name'] = data[i]['node']['group']['name']
-            df.loc[i, 'date'] = data[i]['node']['dateTime']
-            df.loc[i, 'title'] = data[i]['node']['title']
-            df.loc[i, 'description'] = data[i]['node']['description']
-            df.loc[i, 'city'] = data[i]['node']['group']['city']
-            df.loc[i, 'eventUrl'] = data[i]['node']['eventUrl']
 
-    # filter rows by city
-    df = df[df['city'] == location]
+    if client is not None:
+        return await gather(client)
 
-    # TODO: control for mislabeled event locations (e.g. 'Techlahoma Foundation')
-    # TODO: exclude by `urlname` instead of `name`
-    # * data[0]['node']['group']['urlname'] == 'nerdygirlsokc'
-    # filtered rows to exclude keywords by regex OR operator
-    if exclusions:
-        print(f"{Fore.GREEN}{info:<10}{Fore.RESET}Excluded keywords: {exclusions}".format(exclusions=exclusions))
-        df = df[~df['name'].str.contains('|'.join(exclusions))]
-        df = df[~df['title'].str.contains('|'.join(exclusions))]
-
-    # TODO: cutoff time by day _and_ hour (currently only day)
-    # filter rows that aren't within the next n days
-    time_span = arrow.now(tz=tz).shift(days=days)
-    df = df[df['date'] <= time_span.isoformat()]
+    limits = httpx.Limits(max_connections=limit, max_keepalive_connections=limit)
+    async with httpx.AsyncClient(http2=True, timeout=timeout, limits=limits) as client:
+        return await gather(client)
 
-    return df
 
+def build_description_query(ids) -> tuple[str, dict]:
+    """Fold several `event` lookups into one document via aliases (e.g., `e0: event(id: $e0)`)"""
 
-# TODO: QA
-def sort_csv(filename) -> None:
+    params = ", ".join(f"$e{i}: ID!" for i in range(len(ids)))
+    aliases = "".join(f"    e{i}: event(id: $e{i}) {{ id description }}\n" for i in range(len(ids)))
+
+    return f"query({params}) {{\n{aliases}}}\n", {f"e{i}": id for i, id in enumerate(ids)}
+
+
+async def fetch_descriptions(
+    token, ids, limit: int = concurrency, size: int = batch_size, client: httpx.AsyncClient | None = None
+) -> dict[str, str]:
     """
-    Sort CSV by date
+    Look up descriptions for event `ids` on demand
+
+    Returns a mapping of event id to description; events that fail to resolve are left out.
     """
 
-    # read csv
-    df = pd.read_csv(filename, header=0)
+    semaphore = asyncio.Semaphore(limit)
+    batches = [ids[i : i + size] for i in range(0, len(ids), size)]
 
-    # drop duplicates by event url
-    df = df.drop_duplicates(subset='eventUrl')
+    async def fetch(client, batch):
+        async with semaphore:
+            response = await send_request_async(client, token, *build_description_query(batch), event_batch_decoder)
+        return [event for event in (response.data or {}).values() if event is not None]
 
-    # sort by date
-    df['date'] = pd.to_datetime(df['date'])
-    df = df.sort_values(by=['date'])
+    async def gather(client):
+        results = await asyncio.gather(*(fetch(client, batch) for batch in batches))
+        return {event.id: event.description for events in results for event in events if event.description is not None}
 
-    # convert date to human readable format (Thu 5/26 at 11:30 am)
-    df['date'] = df['date'].apply(lambda x: arrow.get(x).format('ddd M/D h:mm a'))
+    if client is not None:
+        return await gather(client)
 
-    # write csv
-    df.to_csv(filename, index=False)
+    limits = httpx.Limits(max_connections=limit, max_keepalive_connections=limit)
+    async with httpx.AsyncClient(http2=True, timeout=timeout, limits=limits) as client:
+        return await gather(client)
 
 
-def sort_json(filename) -> None:
+def add_descriptions(token, events: list[dict]) -> list[dict]:
+    """Fill in `description` for event records from a plan that didn't select it"""
+
+    ids = [e['id'] for e in events if e.get('id') and not e.get('description')]
+    if not ids:
+        return events
+
+    descriptions = asyncio.run(fetch_descriptions(token, ids))
+
+    return [{**e, 'description': descriptions.get(e['id'], e.get('description'))} for e in events]
+
+
+def fetch_all(token, urlnames=None, plan: QueryPlan = default_plan) -> tuple[Response, list[tuple[str, Response]]]:
     """
-    Sort JSON keys
+    Run the concurrent fan-out from sync code
+
+    Returns the `self` response and a list of (urlname, response) pairs in `groups.csv` order
     """
-    # Check if file exists and has content
-    if not os.path.exists(filename) or os.stat(filename).st_size == 0:
-        print(f"{Fore.YELLOW}{warning:<10}{Fore.RESET}No events found to sort")
-        return
 
-    # pandas remove duplicate keys by eventUrl key
-    df = pd.read_json(filename, orient='records')
+    if urlnames is None:
+        urlnames = url_vars
+
+    responses = asyncio.run(fetch_groups(token, urlnames, plan=plan))
+
+    return responses[0], list(zip(urlnames, responses[1:], strict=True))
+
+
+# dataframe columns
+columns = ['name', 'date', 'title', 'description', 'city', 'eventUrl', 'id']
+
+# human readable event time (e.g., Thu 5/26 11:30 am), only applied when rendering
+date_format = 'ddd M/D h:mm a'
+
+
+def to_timestamps(dates: pd.Series) -> pd.Series:
+    """
+    Parse ISO 8601 dates into tz-aware timestamps
+
+    Anything else (including already rendered dates) becomes NaT rather than guessing a year.
+    """
+
+    if isinstance(dates.dtype, pd.DatetimeTZDtype):
+        return dates.dt.tz_convert(tz)
+    return pd.to_datetime(dates, utc=True, errors='coerce', format='ISO8601').dt.tz_convert(tz)
+
+
+def isoformat_dates(df: pd.DataFrame) -> pd.DataFrame:
+    """Serialize the timestamp `date` column as ISO 8601 strings (for export)"""
 
-    # Check if DataFrame is empty
+    if 'date' not in df or not isinstance(df['date'].dtype, pd.DatetimeTZDtype):
+        return df
+    return df.assign(date=df['date'].map(pd.Timestamp.isoformat, na_action='ignore'))
+
+
+@lru_cache(maxsize=4096)
+def format_date(date: pd.Timestamp) -> str:
+    """Format a timestamp for display (memoized: events share a small set of start times)"""
+
+    return arrow.get(date).format(date_format)
+
+
+def render_events(events) -> list[dict]:
+    """
+    Event records with human readable dates
+
+    Accepts the dataframe from `sort_events` or records with ISO 8601 dates.
+    """
+
+    df = events if isinstance(events, pd.DataFrame) else pd.DataFrame.from_records(events)
     if df.empty:
-        print(f"{Fore.YELLOW}{warning:<10}{Fore.RESET}No events found to sort")
-        return
+        return []
 
-    df = df.drop_duplicates(subset='eventUrl')
+    return df.assign(date=to_timestamps(df['date']).map(format_date, na_action='ignore')).to_dict('records')
 
-    # replace '1-07-19 17:00:00' with current year '2022-07-19 17:00:00' via regex
-    # * negative lookahead only matches first digit at the beginning of the line (e.g., 1/0001 vs. 2022)
-    # date_regex = r'^1(?![\d])|^0001(?![\d])'
 
-    # TODO: get precise date from event to determine year
-    # choose current year if 7 days from now is before EOY
-    # if arrow.now().year == arrow.now().shift(days=7).year:
-    #     year = str(arrow.now(TZ).year)
-    # else:
-    #     year = str(arrow.now(TZ).shift(days=7).year)
+def edges_to_records(edges) -> list[tuple]:
+    """Flatten event edges into row tuples ordered as `columns`"""
 
-    # convert date column from 'ddd M/D h:mm a' (e.g., Tue 7/19 5:00 pm) to iso8601
-    try:
-        # extract dates from date column into a dictionary
-        # * Timestamp('2023-02-28 16:30:00-0600', tz='pytz.FixedOffset(-360)')
-        dates = df['date'].to_dict()
+    return [
+        (
+            node.group.name,
+            node.dateTime,
+            node.title,
+            node.description,
+            node.group.city,
+            node.eventUrl,
+            node.id,
+        )
+        for node in (edge.node for edge in edges)
+    ]
 
-        # convert dates to iso8601
-        for key, value in dates.items():
-            dates[key] = arrow.get(value, 'ddd M/D h:mm a').format('YYYY-MM-DDTHH:mm:ss')
 
-        # replace dates in dictionary with iso8601
-        df['date'] = df['date'].replace(dates)
-    except ParserError:
-        print(f"{Fore.RED}{error:<10}{Fore.RESET}ParserError: date column is already in correct format")
-        pass
+def format_edges(edges, location: str = "Oklahoma City", exclusions="") -> pd.DataFrame:
+    """
+    Filter event edges by exclusions, city and time window into a dataframe
 
-    # control for timestamp edge case `1-07-21 18:00:00` || `1-01-25 10:00:00` raising OutOfBoundsError
-    df['date'] = pd.to_datetime(df['date'], format='%Y-%m-%dT%H:%M:%S', errors='coerce')
+    Shared by `format_response` and reads from the event store
+    """
 
-    # convert datetimeindex to datetime
-    df['date'] = df['date'].dt.tz_localize(None)
+    # drop excluded events before building rows (one compiled pattern per field)
+    matcher = as_matcher(exclusions)
+    if matcher and edges:
+        print(f"{Fore.GREEN}{info:<10}{Fore.RESET}Excluded keywords: {matcher}")
+        edges = [edge for edge in edges if not matcher.match(edge.node)]
 
-    # replace NaT with epoch time to avoid float TypeError
-    df['date'] = df['date'].apply(lambda x: x.replace(year=1970, month=1, day=1) if pd.isnull(x) else x)
+    # extract rows in one pass, then build the dataframe in a single constructor call
+    df = pd.DataFrame.from_records(edges_to_records(edges), columns=columns)
 
-    # sort by date
-    df = df.sort_values(by=['date'])
+    # filter rows by city
+    df = df[df['city'] == location]
 
-    # drop events by date when they are older than the current time
-    df = df[df['date'] >= arrow.now(tz).format('YYYY-MM-DDTHH:mm:ss')]
-    df = df.reset_index(drop=True)
+    # TODO: control for mislabeled event locations (e.g. 'Techlahoma Foundation')
+
+    # parse dates once; the rest of the pipeline works on tz-aware timestamps
+    df = df.assign(date=to_timestamps(df['date']))
 
-    # convert date to human readable format (Thu 5/26 at 11:30 am)
-    df['date'] = df['date'].apply(lambda x: arrow.get(x).format('ddd M/D h:mm a'))
+    # filter rows that aren't within the next n days (to the minute)
+    time_span = pd.Timestamp(arrow.now(tz=tz).shift(days=days).datetime)
+    df = df[df['date'] <= time_span]
 
-    # export to json (convert escaped unicode to utf-8 encoding first)
-    data = json.loads(df.to_json(orient='records', force_ascii=False))
-    with open(json_fn, 'w', encoding='utf-8') as f:
-        json.dump(data, f, indent=2)
+    return df
 
 
-def export_to_file(response, type: str = 'json', exclusions: str = '') -> None:
+# optional exclusions: a compiled `Matcher`, keyword list or comma separated string
+def format_response(response, location: str = "Oklahoma City", exclusions=""):
     """
-    Export to CSV or JSON
+    Format response for Slack
+
+    Accepts a decoded `Response` or a raw JSON body
     """
-    if exclusions != '':
-        df = format_response(response, exclusions=exclusions)
+
+    # decode raw responses
+    if isinstance(response, str | bytes):
+        response = decode_response(response)
+
+    # TODO: add arg for `self` or `groupByUrlname`
+    # extract data from response
+    data = None
+
+    # Check if response has expected structure
+    if response.data is None:
+        print(
+            f"{Fore.RED}{error:<10}{Fore.RESET}GraphQL response missing 'data' key. Response: {msgspec.json.encode(response)[:500].decode(errors='ignore')}"
+        )
+    elif response.data.member is not None:
+        data = event_page(response)[0]
+        if data and data[0].node.group.city != location:
+            print(f"{Fore.YELLOW}{warning:<10}{Fore.RESET}Skipping event outside of {location}")
+    elif response.data.groupByUrlname is None:
+        print(f"{Fore.YELLOW}{warning:<10}{Fore.RESET}Skipping group due to empty response")
     else:
-        df = format_response(response)
+        data = event_page(response)[0]
+        # TODO: handle no upcoming events to fallback on initial response
+        if response.data.groupByUrlname.city != location:
+            print(f"{Fore.RED}{error:<10}{Fore.RESET}No data for {location} found")
+
+    return format_edges(data or [], location=location, exclusions=exclusions)
+
+
+def collect_events(self_response, group_responses, location: str = "Oklahoma City", exclusions="") -> pd.DataFrame:
+    """
+    Format the `self` response and every group response into one dataframe
+
+    `group_responses` is a list of (urlname, response) pairs as returned by `fetch_all`
+    """
+
+    frames = [format_response(self_response, location=location, exclusions=exclusions)]
+
+    for url, response in group_responses:
+        df = format_response(response, location=location, exclusions=exclusions)
+        if df.empty:
+            print(f'{Fore.GREEN}{info:<10}{Fore.RESET}No upcoming events for {url} found')
+        else:
+            frames.append(df)
+
+    return pd.concat(frames, ignore_index=True)
+
+
+def sort_events(df: pd.DataFrame) -> pd.DataFrame:
+    """
+    Drop duplicate and past events, then sort by date
+
+    Dates stay tz-aware timestamps; use `render_events` to format them for display.
+    """
 
-    # If DataFrame is empty, return early
     if df.empty:
-        return
+        return df
+
+    # remove duplicate events by eventUrl
+    df = df.drop_duplicates(subset='eventUrl')
+
+    # parse iso8601 dates if needed (unparseable dates become NaT and are dropped with past events)
+    df = df.assign(date=to_timestamps(df['date']))
+
+    # drop events by date when they are older than the current time, then sort
+    df = df[df['date'] >= pd.Timestamp(arrow.now(tz).datetime)]
+    return df.sort_values(by=['date'], kind='stable').reset_index(drop=True)
+
+
+def export_to_file(events, type: str = 'json') -> None:
+    """
+    Export events to CSV or JSON
+
+    Optional final sink of the pipeline: writes the file once, overwriting any previous export.
+    Accepts records, a dataframe, or a single raw response. Dates are written as ISO 8601.
+    """
+
+    if isinstance(events, Response | str | bytes):
+        events = format_response(events)
+    if isinstance(events, pd.DataFrame):
+        events = isoformat_dates(events).to_dict('records')
+
+    fn = Path(csv_fn if type == 'csv' else json_fn)
 
     # Create directory if it doesn't exist
-    Path('raw').mkdir(parents=True, exist_ok=True)
+    fn.parent.mkdir(parents=True, exist_ok=True)
+
+    # write to a per-process temp file and swap it in, so concurrent workers never interleave writes
+    tmp = fn.with_name(f'{fn.name}.{os.getpid()}.{threading.get_ident()}.tmp')
 
     if type == 'csv':
-        df.to_csv(Path(csv_fn), mode='a', header=False, index=False)
+        pd.DataFrame.from_records(events, columns=columns).to_csv(tmp, index=False)
     elif type == 'json':
-        # convert escaped unicode to utf-8 encoding
-        data = json.loads(df.to_json(orient='records', force_ascii=False))
-
-        # TODO: don't wipe file with existing entries -- just remove duplicate key/value pairs
-        # * cf."[{ "name": "SheCodesOKC", "date": "Tue 2/28 4:30 pm"," ... }]" -> "[]" (empty list)
-        # ! Only happens locally; doesn't happen on server
-        # ! Could be related to timestamp/ttl and/or removing duplicates logic
-        # write json to file
-        # if file exists, is less than n minutes old, append to file
-        if (
-            Path(json_fn).exists()
-            and (arrow.now() - arrow.get(os.path.getmtime(json_fn))).seconds < ttl
-            and os.stat(json_fn).st_size > 0
-        ):
-            # append to json
-            with open(json_fn) as f:
-                data_json = json.load(f)
-                data_json.extend(data)
-                with open(json_fn, 'w', encoding='utf-8') as f:
-                    json.dump(data_json, f, indent=2)
-        else:
-            # create/overwrite json
-            with open(json_fn, 'w', encoding='utf-8') as f:
-                json.dump(data, f, indent=2)
+        with open(tmp, 'w', encoding='utf-8') as f:
+            json.dump(events, f, indent=2, ensure_ascii=False)
     else:
         print('Invalid export file type')
+        return
+
+    os.replace(tmp, fn)
+
+
+def get_all_events(
+    self_response, group_responses, location: str = "Oklahoma City", exclusions="", export: str | None = None
+) -> list[dict]:
+    """
+    In-memory event pipeline: format, filter, dedupe, sort and render
+
+    Returns a list of event records with rendered dates. Pass `export` ('json' or 'csv') to also
+    write them to file with ISO 8601 dates.
+    """
+
+    df = sort_events(collect_events(self_response, group_responses, location=location, exclusions=exclusions))
+
+    if export is not None:
+        export_to_file(df, export)
+
+    return render_events(df)
+
+
+# TODO: QA
+def get_stored_events(edges, location: str = "Oklahoma City", exclusions="") -> list[dict]:
+    """Event pipeline over edges read from the event store (no Meetup requests)"""
+
+    return render_events(sort_events(format_edges(edges, location=location, exclusions=exclusions)))
+
+
+def sort_csv(filename) -> None:
+    """
+    Sort CSV by date
+    """
+
+    df = sort_events(pd.read_csv(filename, header=0))
+    isoformat_dates(df).to_csv(filename, index=False)
+
+
+def sort_json(filename) -> None:
+    """
+    Sort JSON by date
+    """
+    # Check if file exists and has content
+    if not os.path.exists(filename) or os.stat(filename).st_size == 0:
+        print(f"{Fore.YELLOW}{warning:<10}{Fore.RESET}No events found to sort")
+        return
+
+    with open(filename, encoding='utf-8') as f:
+        df = sort_events(pd.DataFrame.from_records(json.load(f)))
+
+    with open(filename, 'w', encoding='utf-8') as f:
+        json.dump(isoformat_dates(df).to_dict('records'), f, indent=2, ensure_ascii=False)
 
 
 # TODO: disable in prod (use `main.py`)
@@ -397,35 +760,14 @@ def main():
         print(f"{Fore.RED}{error:<10}{Fore.RESET}No access token in response")
         sys.exit(1)
 
-    # exclude keywords in event name and title (will miss events with keyword in description)
-    exclusions = ['36\u00b0N', 'Tulsa', 'Nerdy Girls', 'Bitcoin']
-
-    # TODO: reduce `format_response` calls to 1
-    # first-party query
-    response = send_request(access_token, query, vars)
-    # format_response(response, exclusions=exclusions)                      # don't need if exporting to file
-    export_to_file(response, format, exclusions=exclusions)  # csv/json
-
-    # third-party query
-    output = []
-    for url in url_vars:
-        response = send_request(access_token, url_query, f'{{"urlname": "{url}"}}')
-        # append to output dict if the response is not empty
-        if len(format_response(response, exclusions=exclusions)) > 0:
-            output.append(response)
-        else:
-            print(f'{Fore.GREEN}{info:<10}{Fore.RESET}No upcoming events for {url} found')
-    # loop through output and append to file
-    for i in range(len(output)):
-        export_to_file(output[i], format)
+    # rules from `exclusions.csv` plus local keywords
+    exclusions = rule_set.matcher(['Tulsa'])
 
-    # cleanup output file
-    if format == 'csv':
-        sort_csv(csv_fn)
-    elif format == 'json':
-        sort_json(json_fn)
+    # first-party and third-party queries run concurrently (exports include descriptions)
+    response, group_responses = fetch_all(access_token, url_vars, plan=QueryPlan(description=True))
 
-    return response
+    # format, filter, sort and export to csv/json
+    return get_all_events(response, group_responses, exclusions=exclusions, export=format)
 
 
 if __name__ == '__main__':
@@ -0,0 +1,97 @@
+#!/usr/bin/env python3
+
+import msgspec
+
+"""
+Typed structs for Meetup GraphQL responses.
+
+Responses are decoded once, straight from the HTTP body, into these structs.
+Field names mirror the GraphQL schema; every field is optional so a null or
+missing value in one event doesn't fail the whole response.
+"""
+
+
+class Group(msgspec.Struct):
+    id: str | None = None
+    name: str | None = None
+    urlname: str | None = None
+    link: str | None = None
+    city: str | None = None
+
+
+class Event(msgspec.Struct):
+    id: str | None = None
+    title: str | None = None
+    description: str | None = None
+    dateTime: str | None = None
+    eventUrl: str | None = None
+    group: Group = msgspec.field(default_factory=Group)
+
+
+class EventEdge(msgspec.Struct):
+    node: Event
+
+
+class PageInfo(msgspec.Struct):
+    endCursor: str | None = None
+    hasNextPage: bool = False
+
+
+class EventConnection(msgspec.Struct):
+    totalCount: int | None = None
+    pageInfo: PageInfo = msgspec.field(default_factory=PageInfo)
+    edges: list[EventEdge] = msgspec.field(default_factory=list)
+
+
+class Member(msgspec.Struct):
+    """`self` (the authenticated pro network member)"""
+
+    id: str | None = None
+    name: str | None = None
+    username: str | None = None
+    memberUrl: str | None = None
+    memberEvents: EventConnection | None = None
+
+
+class GroupNode(Group):
+    """`groupByUrlname`"""
+
+    description: str | None = None
+    events: EventConnection | None = None
+
+
+class Data(msgspec.Struct):
+    member: Member | None = msgspec.field(default=None, name="self")
+    groupByUrlname: GroupNode | None = None
+
+
+class GraphQLError(msgspec.Struct):
+    message: str = ""
+    path: list[str | int] | None = None
+
+
+class Response(msgspec.Struct):
+    """`self` or `groupByUrlname` response"""
+
+    data: Data | None = None
+    errors: list[GraphQLError] = msgspec.field(default_factory=list)
+
+
+class BatchResponse(msgspec.Struct):
+    """Aliased `g0: groupByUrlname(...)` batch response"""
+
+    data: dict[str, GroupNode | None] | None = None
+    errors: list[GraphQLError] = msgspec.field(default_factory=list)
+
+
+class EventBatchResponse(msgspec.Struct):
+    """Aliased `e0: event(id: ...)` batch response"""
+
+    data: dict[str, Event | None] | None = None
+    errors: list[GraphQLError] = msgspec.field(default_factory=list)
+
+
+# reusable decoders
+response_decoder = msgspec.json.Decoder(Response)
+batch_decoder = msgspec.json.Decoder(BatchResponse)
+event_batch_decoder = msgspec.json.Decoder(EventBatchResponse)
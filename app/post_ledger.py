@@ -0,0 +1,156 @@
+#!/usr/bin/env python3
+
+"""Idempotent Slack posting: one message per channel and period, edited in place when its content changes"""
+
+import arrow
+import hashlib
+from colorama import Fore
+from database import db_pool
+from datetime import datetime
+from decouple import config
+from pony.orm import PrimaryKey, Required, composite_key, db_session
+from slack_delivery import DELETED, FAILED, POSTED, SKIPPED, UPDATED, Delivery
+from slack_render import Message
+from slack_sdk.errors import SlackApiError
+
+# logging prefixes
+info = "INFO:"
+error = "ERROR:"
+warning = "WARNING:"
+
+# env
+tz = config("TZ", default="America/Chicago")
+
+
+def define_entities(db):
+    """Define the `slack_post` table on a Pony database (call before `generate_mapping`)"""
+
+    class SlackPost(db.Entity):
+        _table_ = "slack_post"
+        id = PrimaryKey(int, auto=True)
+        channel = Required(str)
+        period = Required(str)
+        ts = Required(str)
+        content_hash = Required(str)
+        posted_at = Required(datetime, default=datetime.utcnow)
+        updated_at = Required(datetime, default=datetime.utcnow)
+        composite_key(channel, period)
+
+    return SlackPost
+
+
+def message_hash(text: str) -> str:
+    return hashlib.sha256(text.encode("utf-8")).hexdigest()
+
+
+def current_period() -> str:
+    """Default posting period: today's date in the local timezone"""
+    return arrow.now(tz).format("YYYY-MM-DD")
+
+
+class PostLedger:
+    """Post, update or skip Slack messages based on what was already sent"""
+
+    def __init__(self):
+        self.entity = None
+
+    def bind(self, entity) -> None:
+        """Use the `SlackPost` entity returned by `define_entities`"""
+        self.entity = entity
+
+    def __bool__(self):
+        return self.entity is not None
+
+    @db_session
+    def lookup(self, channel: str, period: str) -> tuple[str, str] | None:
+        """(ts, content hash) of the channel's post for `period`, if any"""
+        entry = self.entity.get(channel=channel, period=period)
+        return None if entry is None else (entry.ts, entry.content_hash)
+
+    @db_session
+    def record(self, channel: str, period: str, ts: str, content_hash: str) -> None:
+        now = datetime.utcnow()
+        entry = self.entity.get(channel=channel, period=period)
+        if entry is None:
+            self.entity(channel=channel, period=period, ts=ts, content_hash=content_hash)
+        elif entry.ts == ts:
+            entry.set(content_hash=content_hash, updated_at=now)
+        else:
+            entry.set(ts=ts, content_hash=content_hash, posted_at=now, updated_at=now)
+
+    @db_session
+    def parts(self, channel: str, period: str) -> list[tuple[int, str]]:
+        """(part, ts) of the channel's extra messages for `period` (parts 1 and up), in order"""
+        prefix = f"{period}#"
+        entries = self.entity.select(lambda e: e.channel == channel and e.period.startswith(prefix))
+        return sorted((int(e.period[len(prefix) :]), e.ts) for e in entries)
+
+    @db_session
+    def forget(self, channel: str, period: str) -> None:
+        entry = self.entity.get(channel=channel, period=period)
+        if entry is not None:
+            entry.delete()
+
+    async def prune(self, sender, channel: str, count: int, period: str | None = None, repost: bool = False) -> list[Delivery]:
+        """
+        Delete the channel's parts of `period` from `count` on (left over from a longer post)
+
+        After a `repost` the old messages stay in Slack, so their parts are only dropped from the ledger.
+        """
+        period = period or current_period()
+        deliveries = []
+        for part, ts in await db_pool.run(self.parts, channel, period):
+            if part < count:
+                continue
+            if not repost:
+                try:
+                    await sender.delete(channel, ts)
+                except SlackApiError as e:
+                    if e.response["error"] != "message_not_found":
+                        print(f"{Fore.YELLOW}{warning:<10}{Fore.RESET}Could not delete {ts} in {channel}: {e.response['error']}")
+                        deliveries.append(Delivery(channel=channel, outcome=FAILED, ts=ts, error=e.response["error"], part=part))
+                        continue
+                print(f"{Fore.GREEN}{info:<10}{Fore.RESET}Deleted leftover post {ts} in {channel} ({period}#{part})")
+                deliveries.append(Delivery(channel=channel, outcome=DELETED, ts=ts, part=part))
+            await db_pool.run(self.forget, channel, f"{period}#{part}")
+        return deliveries
+
+    async def deliver(
+        self, sender, channel: str, message: Message, period: str | None = None, repost: bool = False, part: int = 0
+    ) -> Delivery:
+        """
+        Make `channel` show `message` for `period` with as few Slack calls as possible
+
+        `sender` is a `SlackSender`; `part` is the message's index in a multi-message post.
+        `repost` always posts a new message.
+        """
+        period = period or current_period()
+        if part:
+            period = f"{period}#{part}"
+        content_hash = message_hash(message.text)
+        entry = await db_pool.run(self.lookup, channel, period)
+
+        if entry is not None and not repost:
+            ts, previous_hash = entry
+            if previous_hash == content_hash:
+                print(f"{Fore.GREEN}{info:<10}{Fore.RESET}Skipping unchanged post to {channel} ({period})")
+                return Delivery(channel=channel, outcome=SKIPPED, ts=ts, part=part)
+            try:
+                await sender.update(channel, ts, message)
+            except SlackApiError as e:
+                if e.response.status_code == 429:
+                    raise
+                # e.g., the message was deleted: fall through to a new post
+                print(f"{Fore.YELLOW}{warning:<10}{Fore.RESET}Could not update {ts} in {channel}: {e.response['error']}")
+            else:
+                await db_pool.run(self.record, channel, period, ts, content_hash)
+                print(f"{Fore.GREEN}{info:<10}{Fore.RESET}Updated post {ts} in {channel} ({period})")
+                return Delivery(channel=channel, outcome=UPDATED, ts=ts, part=part)
+
+        ts = await sender.post(channel, message)
+        await db_pool.run(self.record, channel, period, ts, content_hash)
+        print(f"{Fore.GREEN}{info:<10}{Fore.RESET}Posted {ts} to {channel} ({period})")
+        return Delivery(channel=channel, outcome=POSTED, ts=ts, part=part)
+
+
+post_ledger = PostLedger()
@@ -0,0 +1,300 @@
+#!/usr/bin/env python3
+
+"""Background Meetup sync, published as immutable snapshots and shared across workers"""
+
+import asyncio
+import fcntl
+import msgspec
+import os
+import time
+from changes import Changes, Index, diff, index_events
+from collections.abc import Mapping
+from colorama import Fore
+from database import db_pool
+from dataclasses import dataclass, field
+from datetime import UTC
+from decouple import config
+from email.utils import formatdate
+from event_store import event_store, response_events
+from exclusions import rule_set
+from leader import leader
+from meetup_query import QueryPlan, default_plan, fetch_all, fetch_groups, url_vars
+from meetup_types import Data, EventConnection, Member, Response
+from pathlib import Path
+from sign_jwt import get_tokens as gen_token
+
+# logging prefixes
+info = "INFO:"
+error = "ERROR:"
+warning = "WARNING:"
+
+# env
+SYNC_INTERVAL = config("SYNC_INTERVAL", default=900, cast=int)  # seconds (0 disables the loop)
+SYNC_LOCK = config("SYNC_LOCK", default="raw/sync.lock")
+SNAPSHOT_FN = config("SNAPSHOT_FN", default="raw/snapshot.msgpack")
+
+
+@dataclass(frozen=True)
+class Snapshot:
+    """Meetup responses from one sync"""
+
+    self_response: Response
+    groups: tuple[tuple[str, Response], ...]
+    plan: QueryPlan = default_plan
+    index: Mapping = field(default_factory=dict)
+    changes: Changes = field(default_factory=Changes)
+    fetched_at: float = field(default_factory=time.time)
+
+    @property
+    def age(self) -> int:
+        """Seconds since the snapshot was fetched"""
+        return max(0, int(time.time() - self.fetched_at))
+
+    def headers(self) -> dict:
+        """HTTP caching headers describing the snapshot"""
+        return {"Age": str(self.age), "Last-Modified": formatdate(self.fetched_at, usegmt=True)}
+
+
+class FileLock:
+    """Exclusive `flock` on a file: one holder across threads and processes on a host"""
+
+    def __init__(self, path: str = SYNC_LOCK):
+        self.path = Path(path)
+        self._fd: int | None = None
+
+    def acquire(self) -> None:
+        """Block until the lock is held"""
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        fd = os.open(self.path, os.O_RDWR | os.O_CREAT, 0o644)
+        try:
+            fcntl.flock(fd, fcntl.LOCK_EX)
+        except BaseException:
+            os.close(fd)
+            raise
+        self._fd = fd
+
+    def release(self) -> None:
+        fd, self._fd = self._fd, None
+        if fd is not None:
+            fcntl.flock(fd, fcntl.LOCK_UN)
+            os.close(fd)
+
+    def __enter__(self):
+        self.acquire()
+        return self
+
+    def __exit__(self, *exc):
+        self.release()
+
+
+class Prefetcher:
+    """Holds the current snapshot and refreshes it"""
+
+    def __init__(self, interval: int = SYNC_INTERVAL, lock_fn: str = SYNC_LOCK, snapshot_fn: str = SNAPSHOT_FN):
+        self.interval = interval
+        self.lock_fn = lock_fn
+        self.snapshot_fn = Path(snapshot_fn)
+        self.snapshot: Snapshot | None = None
+        self._task: asyncio.Task | None = None
+
+    @staticmethod
+    def plan() -> QueryPlan:
+        """Select descriptions only when an exclusion rule needs them"""
+        return QueryPlan(description="description" in rule_set.matcher().fields)
+
+    def previous_index(self) -> Index:
+        """Index of the last sync: the current snapshot's, else the event store's (e.g., after a restart)"""
+        if self.snapshot is not None:
+            return self.snapshot.index
+        if event_store:
+            try:
+                return event_store.index()
+            except Exception as e:
+                print(f"{Fore.RED}{error:<10}{Fore.RESET}Failed to read the last sync: {e}")
+        return {}
+
+    def publish(self, self_response, groups, plan: QueryPlan = default_plan, previous: Index | None = None) -> Snapshot:
+        """
+        Swap in a new snapshot, diffed against `previous` (default: the current snapshot)
+
+        A failed fetch (the `self` query or every group errored) keeps the current snapshot and returns it.
+        """
+        groups = tuple(groups)
+        if self_response.errors or (groups and all(response.errors for _, response in groups)):
+            errors = (self_response.errors or groups[0][1].errors)[:1]
+            reason = errors[0].message if errors else "no response"
+            if self.snapshot is None:
+                raise RuntimeError(f"Meetup sync failed: {reason}")
+            print(f"{Fore.YELLOW}{warning:<10}{Fore.RESET}Meetup sync failed, keeping the last snapshot: {reason}")
+            return self.snapshot
+
+        if previous is None:
+            previous = self.snapshot.index if self.snapshot is not None else {}
+
+        index = index_events(response_events([self_response, *(response for _, response in groups)]))
+        if any(response.errors for _, response in groups):
+            # events of the groups that errored weren't fetched: carry their entries over, so they're
+            # neither reported as removed now nor as added again after the next full sync
+            index = {**previous, **index}
+        changes = diff(previous, index)
+
+        snapshot = Snapshot(self_response=self_response, groups=groups, plan=plan, index=index, changes=changes)
+        self.snapshot = snapshot
+        print(f"{Fore.GREEN}{info:<10}{Fore.RESET}Published event snapshot ({len(snapshot.groups)} groups, {changes.counts()})")
+        return snapshot
+
+    def persist(self, snapshot: Snapshot) -> None:
+        """Upsert the snapshot's events into the event store, if one is bound"""
+        if not event_store:
+            return
+        try:
+            event_store.store(snapshot)
+        except Exception as e:
+            print(f"{Fore.RED}{error:<10}{Fore.RESET}Failed to store events: {e}")
+
+    def load_shared(self, since: float = 0.0) -> Snapshot | None:
+        """The last snapshot any worker synced, if it was fetched at or after `since`"""
+        try:
+            snapshot = msgspec.msgpack.decode(self.snapshot_fn.read_bytes(), type=Snapshot)
+        except (OSError, msgspec.DecodeError) as e:
+            if not isinstance(e, FileNotFoundError):
+                print(f"{Fore.YELLOW}{warning:<10}{Fore.RESET}Ignoring shared snapshot: {e}")
+            return None
+        return snapshot if snapshot.fetched_at >= since else None
+
+    def save_shared(self, snapshot: Snapshot) -> None:
+        """Leave the snapshot for other workers (atomically replaced)"""
+        try:
+            self.snapshot_fn.parent.mkdir(parents=True, exist_ok=True)
+            tmp = self.snapshot_fn.with_name(f"{self.snapshot_fn.name}.{os.getpid()}.tmp")
+            tmp.write_bytes(msgspec.msgpack.encode(snapshot))
+            os.replace(tmp, self.snapshot_fn)
+        except OSError as e:
+            print(f"{Fore.YELLOW}{warning:<10}{Fore.RESET}Failed to share snapshot: {e}")
+
+    def load_store(self, since: float = 0.0) -> Snapshot | None:
+        """
+        The latest sync by any host, rebuilt from the event store, if it was fetched after `since`
+
+        The store keeps no descriptions, so its events come back as one `self` response.
+        """
+        if not event_store:
+            return None
+        synced = event_store.last_sync()
+        if synced is None or synced.replace(tzinfo=UTC).timestamp() <= since:
+            return None
+        edges = event_store.between()
+        self_response = Response(data=Data(member=Member(memberEvents=EventConnection(totalCount=len(edges), edges=edges))))
+        index = event_store.index()
+        previous = self.snapshot.index if self.snapshot is not None else {}
+        return Snapshot(
+            self_response=self_response,
+            groups=(),
+            index=index,
+            changes=diff(previous, index),
+            fetched_at=synced.replace(tzinfo=UTC).timestamp(),
+        )
+
+    def joined(self, started: float) -> Snapshot | None:
+        """A snapshot synced after `started` (while we waited for the lock), from this or another worker"""
+        if self.snapshot is not None and self.snapshot.fetched_at >= started:
+            return self.snapshot
+        shared = self.load_shared(since=started)
+        if shared is not None:
+            self.snapshot = shared
+            print(f"{Fore.GREEN}{info:<10}{Fore.RESET}Reusing event snapshot from a concurrent sync")
+        return shared
+
+    def refresh(self) -> Snapshot:
+        """Sync from sync code (e.g., a threadpool endpoint), or reuse a sync that finished while waiting"""
+        started = time.time()
+        with FileLock(self.lock_fn):
+            return self.joined(started) or self._refresh()
+
+    def _refresh(self) -> Snapshot:
+        tokens = gen_token()
+        if not tokens:
+            raise RuntimeError("Failed to get access token")
+        plan = self.plan()
+        self_response, groups = fetch_all(tokens["access_token"], url_vars, plan=plan)
+        kept = self.snapshot
+        snapshot = self.publish(self_response, groups, plan, self.previous_index())
+        if snapshot is not kept:
+            self.persist(snapshot)
+            self.save_shared(snapshot)
+        return snapshot
+
+    async def arefresh(self) -> Snapshot:
+        """Sync on the running event loop, or reuse a sync that finished while waiting"""
+        started = time.time()
+        lock = FileLock(self.lock_fn)
+        await asyncio.to_thread(lock.acquire)
+        try:
+            return self.joined(started) or await self._arefresh()
+        finally:
+            lock.release()
+
+    async def _arefresh(self) -> Snapshot:
+        tokens = await asyncio.to_thread(gen_token)
+        if not tokens:
+            raise RuntimeError("Failed to get access token")
+        plan = await db_pool.run(self.plan)
+        self_response, *responses = await fetch_groups(tokens["access_token"], url_vars, plan=plan)
+        previous = await db_pool.run(self.previous_index)
+        kept = self.snapshot
+        snapshot = self.publish(self_response, zip(url_vars, responses, strict=True), plan, previous)
+        if snapshot is not kept:
+            await db_pool.run(self.persist, snapshot)
+            await asyncio.to_thread(self.save_shared, snapshot)
+        return snapshot
+
+    def get(self, refresh: bool = False) -> Snapshot:
+        """Current snapshot; syncs first if there is none yet or `refresh` is set"""
+        if self.snapshot is None and not refresh:
+            # another worker's sync, while it's fresh
+            self.snapshot = self.load_shared(since=time.time() - self.interval)
+        snapshot = self.snapshot
+        if refresh or snapshot is None:
+            snapshot = self.refresh()
+        return snapshot
+
+    async def run(self) -> None:
+        """Refresh forever, every `interval` seconds (on the leader; the rest pick up its sync)"""
+        while True:
+            try:
+                if leader.is_leader:
+                    await self.arefresh()
+                else:
+                    await self.follow()
+            except Exception as e:
+                print(f"{Fore.RED}{error:<10}{Fore.RESET}Event sync failed: {e}")
+            await asyncio.sleep(self.interval)
+
+    async def follow(self) -> Snapshot | None:
+        """Pick up the leader's latest sync: its shared snapshot on this host, else the event store"""
+        since = self.snapshot.fetched_at if self.snapshot is not None else 0.0
+        snapshot = await asyncio.to_thread(self.joined, since + 1e-6)
+        if snapshot is None:
+            snapshot = await db_pool.run(self.load_store, since)
+            if snapshot is not None:
+                self.snapshot = snapshot
+                print(f"{Fore.GREEN}{info:<10}{Fore.RESET}Loaded event snapshot from the event store ({snapshot.changes.counts()})")
+        return snapshot
+
+    def start(self) -> None:
+        """Start the sync loop on the running event loop"""
+        if self.interval > 0 and self._task is None:
+            self._task = asyncio.get_running_loop().create_task(self.run())
+
+    async def stop(self) -> None:
+        """Cancel the sync loop"""
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+
+
+prefetcher = Prefetcher()
@@ -1,19 +1,18 @@
 #!/usr/bin/env python
 
 import arrow
+import functools
+import threading
 import time
+from database import connect, db
 from datetime import datetime, timedelta
 from decouple import config
-from pony.orm import Database, Optional, PrimaryKey, Required, Set, db_session
+from pony.orm import Optional, PrimaryKey, Required, Set, db_session
 
 # env
-DB_NAME = config("DB_NAME")
-DB_USER = config("DB_USER")
-DB_PASS = config("DB_PASS")
-DB_HOST = config("DB_HOST")
-DB_PORT = config("DB_PORT", default=5432, cast=int)
 TZ = config("TZ", default="America/Chicago")  # Set this to local timezone
 LOCAL_TIME = config("LOCAL_TIME", default="09:00")  # Local time for schedule
+SCHEDULE_RECHECK = config("SCHEDULE_RECHECK", default=900, cast=int)  # max seconds before re-reading rows changed elsewhere
 
 # time
 loc_time = arrow.now().to(TZ)
@@ -21,31 +20,117 @@ time.tzset()
 days = ["Sunday", "Monday", "Tuesday", "Wednesday", "Thursday", "Friday", "Saturday"]
 enabled_days = ["Monday", "Wednesday", "Friday"]
 
-# init db
-db = Database()
+
+def define_entities(db):
+    """Define the `schedule` table on a Pony database (call before `generate_mapping`)"""
+
+    class Schedule(db.Entity):
+        _table_ = "schedule"
+        id = PrimaryKey(int, auto=True)
+        day = Required(str, unique=True)
+        schedule_time = Required(str)
+        timezone = Required(str)
+        enabled = Required(bool, default=True)
+        snooze_until = Optional(datetime)
+        original_schedule_time = Optional(str)
+        last_changed = Required(datetime, default=datetime.utcnow)
+
+    return Schedule
+
+
+def as_local(value: datetime | None) -> arrow.Arrow | None:
+    """A stored `snooze_until` as an aware time (naive values are local, as `snooze_schedule` writes them)"""
+    if value is None:
+        return None
+    return arrow.get(value, tzinfo=TZ) if value.tzinfo is None else arrow.get(value)
+
+
+def effective(row: dict, now: arrow.Arrow) -> dict:
+    """The row as it reads at `now`: an expired snooze is reverted in memory, without a write"""
+    until = as_local(row["snooze_until"])
+    if until is None or now < until:
+        return row
+    return {**row, "schedule_time": row["original_schedule_time"] or row["schedule_time"], "snooze_until": None, "original_schedule_time": None}
+
+
+class ScheduleRepository:
+    """
+    Every schedule row in memory, read with one query
+
+    Mutations in this process bump `version` after they commit, so the next read reloads.
+    Rows changed by other processes are picked up after `recheck` seconds.
+    """
+
+    def __init__(self, recheck: int = SCHEDULE_RECHECK):
+        self.entity = None
+        self.recheck = recheck
+        self.version = 0
+        self._rows: tuple[dict, ...] | None = None
+        self._loaded_version = -1
+        self._loaded_at = float("-inf")
+        self._lock = threading.Lock()
+
+    def bind(self, entity) -> None:
+        """Use the `Schedule` entity returned by `define_entities`"""
+        self.entity = entity
+        self.invalidate()
+
+    def invalidate(self) -> None:
+        with self._lock:
+            self.version += 1
+
+    @property
+    def stale(self) -> bool:
+        return self._rows is None or self._loaded_version != self.version or time.monotonic() - self._loaded_at > self.recheck
+
+    @db_session
+    def load(self) -> tuple[dict, ...]:
+        return tuple(
+            {
+                "day": schedule.day,
+                "schedule_time": schedule.schedule_time,
+                "timezone": schedule.timezone,
+                "enabled": schedule.enabled,
+                "snooze_until": schedule.snooze_until,
+                "original_schedule_time": schedule.original_schedule_time or None,  # Pony stores an empty Optional str as ""
+                "last_changed": schedule.last_changed,
+            }
+            for schedule in self.entity.select().order_by(self.entity.id)
+        )
+
+    def refresh(self) -> None:
+        """Reload the rows (a version bump during the query leaves them stale)"""
+        version = self.version
+        rows = self.load()
+        with self._lock:
+            self._rows, self._loaded_version, self._loaded_at = rows, version, time.monotonic()
+
+    def snapshot(self) -> tuple[dict, ...]:
+        """The cached rows as stored (the same object until they change)"""
+        if self.stale:
+            self.refresh()
+        return self._rows
+
+    def rows(self, now: arrow.Arrow | None = None) -> list[dict]:
+        """The rows as they read at `now` (expired snoozes reverted)"""
+        now = now or arrow.now(TZ)
+        return [effective(row, now) for row in self.snapshot()]
 
 
-# schedule model
-class Schedule(db.Entity):
-    _table_ = "schedule"
-    id = PrimaryKey(int, auto=True)
-    day = Required(str, unique=True)
-    schedule_time = Required(str)
-    timezone = Required(str)
-    enabled = Required(bool, default=True)
-    snooze_until = Optional(datetime)
-    original_schedule_time = Optional(str)
-    last_changed = Required(datetime, default=datetime.utcnow)
+schedule_repository = ScheduleRepository()
 
 
-# strip double quotes from string
-DB_PASS = DB_PASS.strip('"')
+def invalidates(fn):
+    """Bump the repository version once `fn` (and its `db_session`) returns"""
 
-# postgres db
-db.bind(provider="postgres", user=DB_USER, password=DB_PASS, host=DB_HOST, database=DB_NAME, port=DB_PORT, sslmode="require")
+    @functools.wraps(fn)
+    def wrapper(*args, **kwargs):
+        try:
+            return fn(*args, **kwargs)
+        finally:
+            schedule_repository.invalidate()
 
-# generate mapping
-db.generate_mapping(create_tables=True)
+    return wrapper
 
 
 def local_to_utc(local_time_str, timezone):
@@ -63,10 +148,11 @@ def get_current_schedule_time(schedule):
     return utc_time, local_time
 
 
+@invalidates
 @db_session
 def update_schedule(day, timezone=None, enabled=None):
     """Update the schedule for a specific day"""
-    schedule = Schedule.get(day=day)
+    schedule = schedule_repository.entity.get(day=day)
     updated = False
 
     if schedule:
@@ -88,7 +174,7 @@ def update_schedule(day, timezone=None, enabled=None):
             print(f"No changes needed for {day}")
     else:
         utc_time = local_to_utc(LOCAL_TIME, timezone or TZ)
-        Schedule(
+        schedule_repository.entity(
             day=day,
             schedule_time=utc_time.format("HH:mm"),
             timezone=timezone or TZ,
@@ -97,6 +183,7 @@ def update_schedule(day, timezone=None, enabled=None):
         print(f"Created schedule for {day}")
 
 
+@invalidates
 @db_session
 def initialize_schedule():
     """Initialize the schedule table with default values"""
@@ -104,6 +191,7 @@ def initialize_schedule():
         update_schedule(day)
 
 
+@invalidates
 @db_session
 def update_all_schedules(new_timezone=None):
     """Update all schedules with new timezone"""
@@ -118,15 +206,24 @@ def update_all_schedules(new_timezone=None):
 @db_session
 def get_schedule(day):
     """Get the schedule for a specific day"""
-    return Schedule.get(day=day)
+    return schedule_repository.entity.get(day=day)
 
 
+def get_schedules():
+    """Get every day's schedule as plain dicts (from memory; expired snoozes read as reverted)"""
+    return schedule_repository.rows()
+
+
+@invalidates
 @db_session
 def snooze_schedule(duration):
     """Snooze the schedule for the specified duration"""
+    # write back an expired snooze first, so it isn't taken as the original time
+    check_and_revert_snooze()
+
     current_time = arrow.now(TZ)
     current_day = current_time.format("dddd")
-    schedule = Schedule.get(day=current_day)
+    schedule = schedule_repository.entity.get(day=current_day)
 
     if schedule:
         schedule_time = arrow.get(schedule.schedule_time, "HH:mm").replace(tzinfo="UTC")
@@ -158,15 +255,16 @@ def snooze_schedule(duration):
         print(f"No schedule found for {current_day}")
 
 
+@invalidates
 @db_session
 def check_and_revert_snooze():
     """Check if any snoozes need to be reverted and revert them if necessary"""
     current_time = arrow.now(TZ)
-    for schedule in Schedule.select(lambda s: s.snooze_until is not None):
-        if current_time.datetime >= schedule.snooze_until:
-            schedule.schedule_time = schedule.original_schedule_time
+    for schedule in schedule_repository.entity.select(lambda s: s.snooze_until is not None):
+        if current_time >= as_local(schedule.snooze_until):
+            schedule.schedule_time = schedule.original_schedule_time or schedule.schedule_time
             schedule.snooze_until = None
-            schedule.original_schedule_time = None
+            schedule.original_schedule_time = ""
             print(f"Reverted snooze for {schedule.day}")
 
 
@@ -177,7 +275,7 @@ def check_and_update_env_changes():
 
     print(f"Current environment: LOCAL_TIME={LOCAL_TIME}, TZ={current_timezone}")
 
-    sample_schedule = Schedule.get(day="Monday")
+    sample_schedule = schedule_repository.entity.get(day="Monday")
     if sample_schedule:
         print(f"Current database values: TZ={sample_schedule.timezone}")
 
@@ -191,6 +289,9 @@ def check_and_update_env_changes():
 
 
 def main():
+    schedule_repository.bind(define_entities(db))
+    connect()
+
     print("Initializing schedule...")
     initialize_schedule()
     print("Schedule initialization complete.")
@@ -1,107 +1,246 @@
 #!/usr/bin/env python3
 
+"""In-process Slack post scheduler: fire times precomputed from the `schedule` rows, posted by the lease holder"""
+
 import arrow
-import atexit
-import os
-import requests
-import sys
-import time
-from apscheduler.schedulers.background import BackgroundScheduler
+import asyncio
+import bisect
+import threading
 from colorama import Fore
+from database import db_pool
+from dataclasses import dataclass
+from datetime import datetime
 from decouple import config
-from distutils.log import warn
-from pathlib import Path
-from urllib.parse import urlencode
+from leader import leader
 
 # logging prefixes
 info = "INFO:"
 error = "ERROR:"
 warning = "WARNING:"
 
-env = Path('.env')
-
-# creds
-if env.exists():
-    HOST = config('HOST')
-    PORT = config('PORT', default=3000, cast=int)
-    DB_USER = config('DB_USER')
-    DB_PASS = config('DB_PASS')
-else:
-    HOST = os.getenv('HOST')
-    PORT = int(os.getenv('PORT', default=3000))
-    DB_USER = os.getenv('DB_USER')
-    DB_PASS = os.getenv('DB_PASS')
-
-# scheduler
-TZ = config('TZ', default='America/Chicago')
-loc_time = arrow.now().to(TZ)
-time.tzset()
-sched = BackgroundScheduler()
-sched.configure(timezone=TZ)
-
-
-@sched.scheduled_job('interval', minutes=30, id='gen_token')
-def get_token():
-    """Get token from db"""
-
-    url = f"http://{HOST}:{PORT}/token"
-
-    payload = f"username={DB_USER}&password={DB_PASS}"
-
-    headers = {'Content-Type': 'application/x-www-form-urlencoded'}
-
-    try:
-        res = requests.request("POST", url, headers=headers, data=payload)
-        print(f"{Fore.GREEN}{info:<10}{Fore.RESET}[{loc_time.format('YYYY-MM-DD HH:mm:ss')}] Generating a new token")
-        raw = res.json()
-        return raw['access_token']
-    except requests.exceptions.RequestException as e:
-        print(f"{Fore.RED}{error:<10}{Fore.RESET}[{loc_time.format('YYYY-MM-DD HH:mm:ss')}] {e}")
-        sys.exit(1)
-
-
-# @sched.scheduled_job(trigger='cron', hour='9,17,20,23', id='post_slack')      # 9am, 5pm, 8pm, 11pm
-@sched.scheduled_job(trigger='cron', hour='*', id='post_slack')  # every hour
-# @sched.scheduled_job(trigger='cron', minute='*/30', id='post_slack')          # every n minutes
-def post_to_slack():
-    """Post to Slack"""
-
-    access_token = get_token()
-
-    url = f"http://{HOST}:{PORT}/api/slack"
-
-    payload = urlencode({'location': 'Oklahoma City', 'exclusions': 'Tulsa'})
-
-    headers = {'Authorization': f'Bearer {access_token}', 'accept': 'application/json'}
-
-    try:
-        res = requests.request("POST", url, headers=headers, data=payload)
-        print(f"{Fore.GREEN}{info:<10}{Fore.RESET}[{loc_time.format('YYYY-MM-DD HH:mm:ss')}] Posting to Slack")
-        return res.json()
-    except requests.exceptions.RequestException as e:
-        print(f"{Fore.RED}{error:<10}{Fore.RESET}[{loc_time.format('YYYY-MM-DD HH:mm:ss')}] {e}")
-        sys.exit(1)
-
-
-def main():
-    """Main function"""
-
-    import uvicorn
-
-    sched.start()
-    atexit.register(lambda: sched.shutdown())
-
-    # port = next_free_port()
-
-    try:
-        uvicorn.run("scheduler:main", host="0.0.0.0", port=3001, log_level="debug", reload=True)
-    except KeyboardInterrupt:
-        print("\nExiting...")
-        sys.exit(0)
-    except Exception as e:
-        print(e)
-        sys.exit(1)
-
-
-if __name__ == '__main__':
-    main()
+# env
+TZ = config("TZ", default="America/Chicago")
+SCHEDULER = config("SCHEDULER", default=True, cast=bool)
+SCHEDULE_RECHECK = config("SCHEDULE_RECHECK", default=900, cast=int)  # max seconds between schedule checks
+POST_WINDOW = config("POST_WINDOW", default=90, cast=int)  # minutes around a fire time that count as "now"
+
+
+def as_utc(value) -> arrow.Arrow:
+    """Stored datetime as UTC (naive values are local, like `snooze_schedule` writes them)"""
+    if isinstance(value, datetime) and value.tzinfo is None:
+        return arrow.get(value, tzinfo=TZ).to("UTC")
+    return arrow.get(value).to("UTC")
+
+
+def wall_time(schedule: dict) -> tuple[int, int]:
+    """
+    The row's local post time as (hour, minute)
+
+    Rows store `HH:mm` UTC as converted on the day they were last changed, so it is read
+    back in the row's timezone on that day (a moved snooze keeps the original time).
+    """
+    utc = arrow.get(schedule.get("original_schedule_time") or schedule["schedule_time"], "HH:mm")
+    changed = arrow.get(schedule["last_changed"], tzinfo="UTC") if schedule.get("last_changed") else arrow.utcnow()
+    local = changed.replace(hour=utc.hour, minute=utc.minute).to(schedule.get("timezone") or TZ)
+    return local.hour, local.minute
+
+
+def day_fire(schedule: dict, date: arrow.Arrow) -> arrow.Arrow | None:
+    """The row's fire instant on a local date, if it posts that day"""
+    if not schedule["enabled"]:
+        return None
+
+    snoozed_until = as_utc(schedule["snooze_until"]) if schedule.get("snooze_until") else None
+    moved = schedule.get("original_schedule_time") not in (None, schedule["schedule_time"])
+    if snoozed_until is not None and moved and snoozed_until.to(TZ).date() == date.date():
+        return snoozed_until
+
+    if date.format("dddd") != schedule["day"]:
+        return None
+    hour, minute = wall_time(schedule)
+    fire = arrow.Arrow(date.year, date.month, date.day, hour, minute, tzinfo=schedule.get("timezone") or TZ).to("UTC")
+    if snoozed_until is not None and fire < snoozed_until:
+        return None
+    return fire
+
+
+@dataclass(frozen=True)
+class Plan:
+    """Fire instants precomputed from the schedule rows on one local date"""
+
+    built_for: str
+    fires: dict[str, arrow.Arrow]  # local date (YYYY-MM-DD) -> fire instant
+    upcoming: tuple[arrow.Arrow, ...]  # every fire instant, ascending
+
+    @classmethod
+    def build(cls, schedules, now: arrow.Arrow, days: int = 8) -> "Plan":
+        today = now.to(TZ).floor("day")
+        fires = {}
+        for offset in range(-1, days):
+            date = today.shift(days=offset)
+            instants = [fire for fire in (day_fire(schedule, date) for schedule in schedules) if fire is not None]
+            if instants:
+                fires[date.format("YYYY-MM-DD")] = min(instants)
+        return cls(built_for=today.format("YYYY-MM-DD"), fires=fires, upcoming=tuple(sorted(fires.values())))
+
+
+class ScheduleEngine:
+    """The plan precomputed from the schedule rows"""
+
+    def __init__(self, window: int = POST_WINDOW):
+        self.window = window
+        self.load = None
+        self.reload = None
+        self.version = 0
+        self._rows = None
+        self._plan: Plan | None = None
+        self._lock = threading.Lock()
+
+    def bind(self, load, reload=None) -> None:
+        """
+        `load()` returns the cached schedule rows (e.g., `schedule_repository.snapshot`)
+        and `reload()` re-reads them from the database (e.g., `schedule_repository.refresh`)
+        """
+        self.load = load
+        self.reload = reload
+        self.invalidate()
+
+    def __bool__(self):
+        return self.load is not None
+
+    def invalidate(self) -> None:
+        """Rebuild the plan on next use"""
+        with self._lock:
+            self._plan = None
+            self.version += 1
+
+    def plan(self, now: arrow.Arrow | None = None) -> Plan:
+        """Current plan (rebuilt when the rows change, on invalidation or on a new day)"""
+        now = now or arrow.utcnow()
+        rows = self.load()
+        with self._lock:
+            if self._plan is None or rows is not self._rows or self._plan.built_for != now.to(TZ).format("YYYY-MM-DD"):
+                self._rows = rows
+                self._plan = Plan.build(rows, now)
+            return self._plan
+
+    def next_fire(self, after: arrow.Arrow | None = None) -> arrow.Arrow | None:
+        """Earliest fire instant strictly after `after` (within the next week)"""
+        after = after or arrow.utcnow()
+        upcoming = self.plan(after).upcoming
+        i = bisect.bisect_right(upcoming, after)
+        return upcoming[i] if i < len(upcoming) else None
+
+    def today(self, now: arrow.Arrow | None = None) -> arrow.Arrow | None:
+        """Today's fire instant, if today posts"""
+        now = now or arrow.utcnow()
+        return self.plan(now).fires.get(now.to(TZ).format("YYYY-MM-DD"))
+
+    def confirm(self, fire_at: arrow.Arrow) -> bool:
+        """Whether `fire_at` is still a fire time once the rows are re-read (e.g., not snoozed by another worker)"""
+        if self.reload is not None:
+            self.reload()
+        return fire_at in self.plan(fire_at).fires.values()
+
+    def should_post(self, now: arrow.Arrow | None = None) -> bool:
+        """Whether `now` is within `window` minutes of today's fire instant"""
+        now = now or arrow.utcnow()
+        fire = self.today(now)
+        return fire is not None and abs((fire - now).total_seconds()) <= self.window * 60
+
+
+schedule_engine = ScheduleEngine()
+
+
+class PostScheduler:
+    """Sleeps until the next scheduled post and runs the job"""
+
+    def __init__(self, engine: ScheduleEngine = schedule_engine, recheck: int = SCHEDULE_RECHECK, enabled: bool = SCHEDULER):
+        self.engine = engine
+        self.recheck = recheck
+        self.enabled = enabled
+        self.job = None
+        self.last_fired: arrow.Arrow | None = None
+        self._task: asyncio.Task | None = None
+        self._loop: asyncio.AbstractEventLoop | None = None
+        self._wake: asyncio.Event | None = None
+
+    def bind(self, job) -> None:
+        """`job()` is awaited at each fire time"""
+        self.job = job
+
+    def next_fire(self, now: arrow.Arrow | None = None) -> arrow.Arrow | None:
+        """Next fire time after `now` and the last run"""
+        after = now or arrow.utcnow()
+        if self.last_fired is not None:
+            after = max(after, self.last_fired)
+        return self.engine.next_fire(after)
+
+    async def fire(self, fire_at: arrow.Arrow) -> None:
+        self.last_fired = fire_at
+        if not leader.is_leader:
+            print(f"{Fore.GREEN}{info:<10}{Fore.RESET}Skipping scheduled post: another process holds the lease")
+            return
+        try:
+            confirmed = await db_pool.run(self.engine.confirm, fire_at)
+        except Exception as e:
+            print(f"{Fore.RED}{error:<10}{Fore.RESET}Failed to re-read the schedule: {e}")
+            confirmed = True
+        if not confirmed:
+            print(f"{Fore.GREEN}{info:<10}{Fore.RESET}Skipping scheduled post: the schedule changed since it was planned")
+            return
+        print(f"{Fore.GREEN}{info:<10}{Fore.RESET}Running scheduled post for {fire_at.to(TZ).format('dddd HH:mm ZZZ')}")
+        try:
+            await self.job()
+        except Exception as e:
+            print(f"{Fore.RED}{error:<10}{Fore.RESET}Scheduled post failed: {e}")
+
+    async def run(self) -> None:
+        """Sleep until each fire time (waking at least every `recheck` seconds)"""
+        while True:
+            try:
+                fire_at = await db_pool.run(self.next_fire)
+            except Exception as e:
+                print(f"{Fore.RED}{error:<10}{Fore.RESET}Failed to read the schedule: {e}")
+                fire_at = None
+
+            delay = self.recheck
+            if fire_at is not None:
+                delay = min(delay, max(0.0, (fire_at - arrow.utcnow()).total_seconds()))
+
+            try:
+                await asyncio.wait_for(self._wake.wait(), delay)
+                self._wake.clear()
+                continue
+            except TimeoutError:
+                pass
+
+            if fire_at is not None and fire_at <= arrow.utcnow():
+                await self.fire(fire_at)
+
+    def wake(self) -> None:
+        """Re-read the schedule and recompute the next fire time now (e.g., after a snooze); safe from any thread"""
+        self.engine.invalidate()
+        if self._loop is not None:
+            self._loop.call_soon_threadsafe(self._wake.set)
+
+    def start(self) -> None:
+        """Start the scheduler on the running event loop"""
+        if self.enabled and self.engine and self.job is not None and self._task is None:
+            self._loop = asyncio.get_running_loop()
+            self._wake = asyncio.Event()
+            self._task = self._loop.create_task(self.run())
+
+    async def stop(self) -> None:
+        """Cancel the scheduler"""
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+            self._loop = None
+
+
+post_scheduler = PostScheduler()
@@ -33,6 +33,12 @@ smoke_test() {
 
 # generate_token sh equivalent
 gen_token() {
+	# long-lived service token (POST /api/service-tokens): no login or bcrypt per call
+	if [ -n "${SERVICE_TOKEN}" ]; then
+		access_token="${SERVICE_TOKEN}"
+		return
+	fi
+
 	raw=$(exec_curl POST "${URL}/token" \
 		--data-urlencode "username=${DB_USER}" \
 		--data-urlencode "password=${DB_PASS}")
@@ -65,7 +71,8 @@ send_request() {
 			;;
 		slack)
 			gen_token
-			exec_curl POST "${URL}/api/slack" \
+			# SLACK_JOB=true: respond 202 with a job id instead of waiting for the post (poll /api/jobs/{id})
+			exec_curl POST "${URL}/api/slack?job=${SLACK_JOB:-false}" \
 				--header "accept: application/json" \
 				--header "Authorization: Bearer ${access_token}" \
 				--data-urlencode "override=${OVERRIDE:-false}" \
@@ -5,8 +5,10 @@ import jwt
 import pathlib
 import requests
 import sys
+import threading
 import time
 from colorama import Fore
+from concurrent.futures import Future
 from cryptography.hazmat.backends import default_backend
 from cryptography.hazmat.primitives import serialization
 from decouple import config
@@ -38,6 +40,7 @@ SIGNING_SECRET = config('SIGNING_SECRET')
 TOKEN_URL = config('TOKEN_URL')
 REDIRECT_URI = config('REDIRECT_URI')
 JWT_LIFE_SPAN = config('JWT_LIFE_SPAN', default=120, cast=int)
+TOKEN_REFRESH_MARGIN = config('TOKEN_REFRESH_MARGIN', default=300, cast=int)
 
 # load private key
 if isinstance(priv_key, pathlib.PosixPath) and priv_key.exists():
@@ -105,19 +108,14 @@ def verify_token(token):
         sys.exit(1)
 
 
-def get_access_token(token):
-    """Post token to auth server to get access token"""
+def request_tokens(payload):
+    """Post a grant to the auth server and return the token response"""
 
     # Headers for the token request
     request_headers = {"Content-Type": "application/x-www-form-urlencoded"}
 
-    # Payload exactly as specified in docs
-    # https://www.meetup.com/api/authentication/#p04-jwt-flow-section
-    payload = {"grant_type": "urn:ietf:params:oauth:grant-type:jwt-bearer", "assertion": token}
-    payload = urlencode(payload)
-
     try:
-        response = requests.request("POST", TOKEN_URL, headers=request_headers, data=payload)
+        response = requests.request("POST", TOKEN_URL, headers=request_headers, data=urlencode(payload))
         response.raise_for_status()
         return response.json()
     except requests.exceptions.HTTPError as e:
@@ -129,6 +127,120 @@ def get_access_token(token):
         return None
 
 
+def get_access_token(token):
+    """Post token to auth server to get access token"""
+
+    # Payload exactly as specified in docs
+    # https://www.meetup.com/api/authentication/#p04-jwt-flow-section
+    payload = {"grant_type": "urn:ietf:params:oauth:grant-type:jwt-bearer", "assertion": token}
+
+    return request_tokens(payload)
+
+
+def refresh_access_token(refresh_token):
+    """Exchange a refresh token for new access and refresh tokens"""
+
+    payload = {
+        "grant_type": "refresh_token",
+        "refresh_token": refresh_token,
+        "client_id": CLIENT_ID,
+        "client_secret": CLIENT_SECRET,
+    }
+
+    return request_tokens(payload)
+
+
+class TokenManager:
+    """
+    Per-process cache of Meetup access tokens
+
+    Tokens are reused until `expires_in` is within `margin` seconds. Inside the margin the
+    current token is still returned while a background thread renews it; once it has expired
+    callers block on the renewal. Either way only one renewal is in flight at a time.
+
+    Renewal uses the refresh token first and falls back to a fresh JWT grant.
+    """
+
+    def __init__(self, margin: int = TOKEN_REFRESH_MARGIN):
+        self.margin = margin
+        self.tokens = None
+        self.expires_at = 0.0
+        self._lock = threading.Lock()
+        self._renewal: Future | None = None
+
+    def get(self):
+        """Return cached tokens, renewing them if they're expired or about to be"""
+
+        now = time.monotonic()
+        with self._lock:
+            tokens, expires_at = self.tokens, self.expires_at
+
+        if tokens and now < expires_at - self.margin:
+            return tokens
+
+        renewal = self.renew()
+        if tokens and now < expires_at:
+            return tokens
+
+        return renewal.result()
+
+    def renew(self) -> Future:
+        """Start a background renewal, or return the one already in flight"""
+
+        with self._lock:
+            if self._renewal is None:
+                self._renewal = Future()
+                threading.Thread(target=self._run, args=(self._renewal,), daemon=True).start()
+            return self._renewal
+
+    def invalidate(self) -> None:
+        """Drop the cached access token (e.g., after a 401)"""
+
+        with self._lock:
+            self.expires_at = 0.0
+
+    def _run(self, renewal: Future) -> None:
+        try:
+            renewal.set_result(self._fetch())
+        except Exception as e:
+            renewal.set_exception(e)
+        finally:
+            with self._lock:
+                self._renewal = None
+
+    def _fetch(self):
+        tokens = None
+        refresh_token = (self.tokens or {}).get("refresh_token")
+
+        if refresh_token:
+            tokens = refresh_access_token(refresh_token)
+            if not tokens or "access_token" not in tokens:
+                print(f"{Fore.YELLOW}{warning:<10}{Fore.RESET}Refresh token grant failed, falling back to JWT grant")
+                tokens = None
+
+        if tokens is None:
+            tokens = get_access_token(sign_token())
+
+        if not tokens or "access_token" not in tokens:
+            print(f"{Fore.RED}{error:<10}{Fore.RESET}Failed to get access token")
+            return self.tokens if time.monotonic() < self.expires_at else None
+
+        with self._lock:
+            self.tokens = tokens
+            self.expires_at = time.monotonic() + int(tokens.get("expires_in", 3600))
+
+        return tokens
+
+
+token_manager = TokenManager()
+
+
+def get_tokens():
+    """Get access and refresh tokens from the per-process token cache"""
+
+    return token_manager.get()
+
+
 def main():
     """Generate signed JWT, verify, and get access token"""
 
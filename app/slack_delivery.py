@@ -0,0 +1,175 @@
+#!/usr/bin/env python3
+
+"""Concurrent Slack delivery with a per-workspace rate limit and retries with backoff"""
+
+import asyncio
+import random
+import threading
+import time
+from aiohttp import ClientError
+from colorama import Fore
+from dataclasses import dataclass
+from decouple import config
+from slack_render import Message
+from slack_sdk.errors import SlackApiError
+from slack_sdk.web.async_client import AsyncWebClient
+
+# logging prefixes
+info = "INFO:"
+error = "ERROR:"
+warning = "WARNING:"
+
+# env
+SLACK_RATE = config("SLACK_RATE", default=1.0, cast=float)  # requests per second per workspace
+SLACK_BURST = config("SLACK_BURST", default=3, cast=int)
+SLACK_RETRIES = config("SLACK_RETRIES", default=3, cast=int)
+
+# delivery outcomes
+POSTED = "posted"
+UPDATED = "updated"
+SKIPPED = "skipped"
+DELETED = "deleted"
+FAILED = "failed"
+
+
+@dataclass(frozen=True)
+class Delivery:
+    """Result of delivering one message (`part` of a multi-message post) to one channel"""
+
+    channel: str
+    outcome: str
+    ts: str | None = None
+    error: str | None = None
+    part: int = 0
+
+    @property
+    def ok(self) -> bool:
+        return self.outcome != FAILED
+
+
+class TokenBucket:
+    """
+    Token bucket shared by every Slack call in the process
+
+    Reservations are made under a thread lock without awaiting, so one bucket
+    can be used from several event loops (e.g., one `asyncio.run` per request thread).
+    """
+
+    def __init__(self, rate: float = SLACK_RATE, capacity: int = SLACK_BURST):
+        self.rate = rate
+        self.capacity = capacity
+        self.tokens = float(capacity)
+        self.updated = time.monotonic()
+        self.paused_until = 0.0
+        self._lock = threading.Lock()
+
+    def reserve(self) -> float:
+        """Take a token; returns how long to wait before using it"""
+        with self._lock:
+            now = time.monotonic()
+            self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+            self.updated = now
+            self.tokens -= 1
+            wait = -self.tokens / self.rate if self.tokens < 0 else 0.0
+            return max(wait, self.paused_until - now)
+
+    def pause(self, seconds: float) -> None:
+        """Hold every caller for `seconds` (a 429's `Retry-After`)"""
+        with self._lock:
+            self.paused_until = max(self.paused_until, time.monotonic() + seconds)
+
+    async def acquire(self) -> None:
+        wait = self.reserve()
+        if wait > 0:
+            await asyncio.sleep(wait)
+
+
+class SlackSender:
+    """Rate-limited, retrying `chat.postMessage` / `chat.update`"""
+
+    def __init__(self, client: AsyncWebClient, bucket: TokenBucket | None = None, retries: int = SLACK_RETRIES):
+        self.client = client
+        self.bucket = bucket or TokenBucket()
+        self.retries = retries
+
+    def backoff(self, attempt: int) -> float:
+        return min(2**attempt, 30) * (0.5 + random.random() / 2)
+
+    async def call(self, method: str, **kwargs):
+        """Call a Web API method, retrying 429s, 5xx and network errors"""
+        for attempt in range(self.retries + 1):
+            await self.bucket.acquire()
+            try:
+                return await getattr(self.client, method)(**kwargs)
+            except SlackApiError as e:
+                status = e.response.status_code
+                if status == 429:
+                    delay = float(e.response.headers.get("Retry-After", 1))
+                    self.bucket.pause(delay)
+                    print(f"{Fore.YELLOW}{warning:<10}{Fore.RESET}Slack rate limited {method}; retrying in {delay}s")
+                    if attempt < self.retries:
+                        continue
+                elif status >= 500 and attempt < self.retries:
+                    await asyncio.sleep(self.backoff(attempt))
+                    continue
+                raise
+            except (ClientError, TimeoutError) as e:
+                if attempt == self.retries:
+                    raise
+                print(f"{Fore.YELLOW}{warning:<10}{Fore.RESET}Slack {method} failed ({e!r}); retrying")
+                await asyncio.sleep(self.backoff(attempt))
+
+    async def post(self, channel: str, message: Message) -> str:
+        """Post a new message; returns its ts"""
+        response = await self.call("chat_postMessage", channel=channel, text="", blocks=message.blocks)
+        return response["ts"]
+
+    async def update(self, channel: str, ts: str, message: Message) -> None:
+        """Edit a message in place"""
+        await self.call("chat_update", channel=channel, ts=ts, text="", blocks=message.blocks)
+
+    async def delete(self, channel: str, ts: str) -> None:
+        """Delete a message"""
+        await self.call("chat_delete", channel=channel, ts=ts)
+
+
+def describe(e: Exception) -> str:
+    if isinstance(e, SlackApiError):
+        return e.response.get("error") or str(e)
+    return repr(e)
+
+
+async def deliver(sender: SlackSender, messages, channels, ledger=None, period: str | None = None, repost: bool = False):
+    """
+    Deliver `messages` (in order) to every channel, channels concurrently
+
+    With a `PostLedger`, each message is skipped, updated or posted as the ledger decides,
+    and parts left over from a longer earlier post are deleted; without one, every channel
+    gets new messages. Returns one `Delivery` per channel and message (plus any deleted
+    parts), grouped by channel in order.
+    """
+
+    async def one(channel, part, message):
+        try:
+            if ledger:
+                return await ledger.deliver(sender, channel, message, period=period, repost=repost, part=part)
+            return Delivery(channel=channel, outcome=POSTED, ts=await sender.post(channel, message), part=part)
+        except Exception as e:
+            print(f"{Fore.RED}{error:<10}{Fore.RESET}Failed to deliver to {channel}: {describe(e)}")
+            return Delivery(channel=channel, outcome=FAILED, error=describe(e), part=part)
+
+    async def leftovers(channel, count):
+        try:
+            return await ledger.prune(sender, channel, count, period=period, repost=repost)
+        except Exception as e:
+            print(f"{Fore.RED}{error:<10}{Fore.RESET}Failed to remove leftover posts in {channel}: {describe(e)}")
+            return [Delivery(channel=channel, outcome=FAILED, error=describe(e), part=count)]
+
+    async def channel_messages(channel):
+        deliveries = [await one(channel, part, message) for part, message in enumerate(messages)]
+        if ledger:
+            deliveries += await leftovers(channel, len(deliveries))
+        return deliveries
+
+    results = await asyncio.gather(*(channel_messages(channel) for channel in channels))
+    return [delivery for deliveries in results for delivery in deliveries]
@@ -0,0 +1,117 @@
+#!/usr/bin/env python3
+
+"""Slack message rendering: events packed into size-limited blocks and messages, cached by content"""
+
+import hashlib
+import msgspec
+import threading
+from collections import OrderedDict
+from dataclasses import dataclass
+
+# block kit limits
+SECTION_LIMIT = 3000
+MAX_BLOCKS = 50
+
+# one line per event
+default_template = '• {date} *{name}* <{eventUrl}|{title}> '
+
+# rendered messages kept
+CACHE_SIZE = 64
+
+
+@dataclass(frozen=True)
+class Message:
+    """One Slack message: its section blocks and their text"""
+
+    sections: tuple[str, ...]
+
+    @property
+    def text(self) -> str:
+        return "\n".join(self.sections)
+
+    @property
+    def blocks(self) -> list[dict]:
+        return [{"type": "section", "text": {"type": "mrkdwn", "text": section}} for section in self.sections]
+
+
+def format_lines(events, template: str = default_template):
+    """Format event records with `template` (lazily)"""
+    return (template.format_map(event) for event in events)
+
+
+def chunk_lines(lines, limit: int = SECTION_LIMIT, max_blocks: int = MAX_BLOCKS) -> tuple[Message, ...]:
+    """
+    Pack lines into sections of at most `limit` characters and sections into messages
+
+    A single line longer than `limit` is truncated (with an ellipsis) rather than dropped.
+    """
+
+    messages, sections, lines_in_section, size = [], [], [], 0
+
+    def close_section():
+        nonlocal lines_in_section, size
+        if lines_in_section:
+            sections.append("\n".join(lines_in_section))
+            if len(sections) == max_blocks:
+                messages.append(Message(sections=tuple(sections)))
+                sections.clear()
+        lines_in_section, size = [], 0
+
+    for line in lines:
+        if len(line) > limit:
+            line = line[: limit - 1] + "…"
+        # +1 for the newline joining it to the previous line
+        if lines_in_section and size + 1 + len(line) > limit:
+            close_section()
+        size += len(line) + (1 if lines_in_section else 0)
+        lines_in_section.append(line)
+
+    close_section()
+    if sections:
+        messages.append(Message(sections=tuple(sections)))
+
+    return tuple(messages)
+
+
+def event_set_hash(events) -> str:
+    """Stable hash of event records (order matters: it's the display order)"""
+    return hashlib.blake2b(msgspec.json.encode(list(events)), digest_size=16).hexdigest()
+
+
+class RenderCache:
+    """LRU of rendered messages keyed by (event-set hash, template)"""
+
+    def __init__(self, size: int = CACHE_SIZE):
+        self.size = size
+        self._cache: OrderedDict[tuple[str, str], tuple[Message, ...]] = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = self.misses = 0
+
+    def render(self, events, template: str = default_template) -> tuple[Message, ...]:
+        """Rendered messages for `events`, from cache when the same events were rendered before"""
+        key = (event_set_hash(events), template)
+
+        with self._lock:
+            if key in self._cache:
+                self._cache.move_to_end(key)
+                self.hits += 1
+                return self._cache[key]
+
+        messages = chunk_lines(format_lines(events, template))
+
+        with self._lock:
+            self.misses += 1
+            self._cache[key] = messages
+            self._cache.move_to_end(key)
+            while len(self._cache) > self.size:
+                self._cache.popitem(last=False)
+
+        return messages
+
+    def clear(self) -> None:
+        with self._lock:
+            self._cache.clear()
+            self.hits = self.misses = 0
+
+
+render_cache = RenderCache()
@@ -1,14 +1,18 @@
 #!/usr/bin/env python3
 
 import arrow
+import asyncio
 import json
 import pandas as pd
 import time
 from decouple import config
 from icecream import ic
+from meetup_query import render_events
 from pathlib import Path
+from slack_delivery import SlackSender, deliver
+from slack_render import Message, chunk_lines, default_template, format_lines, render_cache
 from slack_sdk import WebClient
-from slack_sdk.errors import SlackApiError
+from slack_sdk.web.async_client import AsyncWebClient
 
 # logging.basicConfig(level=logging.DEBUG)
 
@@ -68,42 +72,51 @@ else:
 # python sdk
 client = WebClient(token=BOT_USER_TOKEN)
 
+# concurrent, rate-limited delivery (one token bucket per workspace)
+sender = SlackSender(AsyncWebClient(token=BOT_USER_TOKEN))
 
-def fmt_json(filename):
-    # read json file
-    data = json.load(open(filename))
 
-    # create dataframe
-    df = pd.DataFrame(data)
+def fmt_events(events, template=default_template):
+    """Format event records as a list of Slack mrkdwn lines"""
 
-    # handle empty dataframe case
-    if df.empty:
-        return []
+    # date, name, title, eventUrl (one string per event avoids alignment shenanigans)
+    return list(format_lines(events, template))
 
-    # add column: 'message' with date, name, title, eventUrl
-    df['message'] = df.apply(lambda x: f'• {x["date"]} *{x["name"]}* <{x["eventUrl"]}|{x["title"]}> ', axis=1)
 
-    # convert message column to list of strings (avoids alignment shenanigans)
-    msg = df['message'].tolist()
+def render_messages(events, template=default_template) -> tuple[Message, ...]:
+    """Slack messages for event records, split at Block Kit limits (cached per event set and template)"""
 
-    return msg
+    return render_cache.render(events, template)
 
 
-def send_message(message, channel_id):
+def fmt_json(filename):
+    """Format events exported to a json file"""
+
+    # read json file (ISO 8601 dates)
+    with open(filename, encoding='utf-8') as f:
+        data = json.load(f)
+
+    return fmt_events(render_events(data))
+
+
+def send_messages(messages, channel_ids, ledger=None, period=None, repost=False):
     """
-    Send formatted Slack messages to a channel.
+    Send rendered Slack messages to several channels concurrently (from sync code)
 
-    NOTE: This function won't work with DMs or private channels.
+    `messages` are `Message`s or one mrkdwn string (split at Block Kit limits).
+    Returns one `Delivery` per channel and message. NOTE: This won't work with DMs or private channels.
     """
-    try:
-        response = client.chat_postMessage(
-            channel=channel_id, text="", blocks=[{"type": "section", "text": {"type": "mrkdwn", "text": message}}]
-        )
-        return response
-    except SlackApiError as e:
-        assert e.response["ok"] is False
-        assert e.response["error"]
-        print(f"Got an error: {e.response['error']}")
+
+    if isinstance(messages, str):
+        messages = chunk_lines(messages.split('\n'))
+
+    return asyncio.run(deliver(sender, messages, channel_ids, ledger=ledger, period=period, repost=repost))
+
+
+def send_message(message, channel_id):
+    """Send a formatted Slack message to one channel (one `Delivery` per message part)"""
+
+    return send_messages(message, [channel_id])
 
 
 # TODO: transform json response vs. file
@@ -111,9 +124,8 @@ def main():
     # open json file and convert to list of strings
     msg = fmt_json(json_fn)
 
-    # send message as one concatenated string
-    for channel_name, channel_id in channels.items():
-        send_message('\n'.join(msg), channel_id)
+    # send as many messages as the block limits need
+    send_messages(chunk_lines(msg), list(channels.values()))
 
     return ic(msg)
 
@@ -0,0 +1,95 @@
+#!/usr/bin/env python3
+
+"""
+Benchmark `format_response` row construction.
+
+Compares the previous cell-by-cell `df.loc[i, col] = ...` fill against the
+single-pass record build at 10, 1k and 100k edges.
+
+The legacy path is skipped above 10k edges by default: at 100k it runs for more than 20 minutes.
+
+Usage (needs the same env as `app/meetup_query.py`):
+    python benchmarks/format_response.py [--legacy-max N]
+"""
+
+import argparse
+import json
+import pandas as pd
+import sys
+import time
+from pathlib import Path
+
+# Add the app directory to the sys.path
+sys.path.insert(0, str(Path(__file__).resolve().parents[1] / "app"))
+
+import msgspec  # noqa: E402
+from meetup_query import columns, edges_to_records  # noqa: E402
+from meetup_types import EventEdge  # noqa: E402
+
+sizes = [10, 1_000, 100_000]
+
+
+def gen_edges(n):
+    """Synthetic `groupByUrlname.events.edges`"""
+    return [
+        {
+            "node": {
+                "id": str(i),
+                "title": f"Event {i}",
+                "description": "x" * 200,
+                "dateTime": "2024-09-20T18:00:00-05:00",
+                "eventUrl": f"https://www.meetup.com/test-group/events/{i}/",
+                "group": {"name": "Test Group", "urlname": "test-group", "city": "Oklahoma City"},
+            }
+        }
+        for i in range(n)
+    ]
+
+
+def legacy(data):
+    """Row construction as it was before (cell-by-cell)"""
+    df = pd.DataFrame(columns=columns)
+    for i in range(len(data)):
+        df.loc[i, 'name'] = data[i]['node']['group']['name']
+        df.loc[i, 'date'] = data[i]['node']['dateTime']
+        df.loc[i, 'title'] = data[i]['node']['title']
+        df.loc[i, 'description'] = data[i]['node']['description']
+        df.loc[i, 'city'] = data[i]['node']['group']['city']
+        df.loc[i, 'eventUrl'] = data[i]['node']['eventUrl']
+    return df
+
+
+def records(edges):
+    """Row construction as it is now (one pass over decoded edges, one constructor call)"""
+    return pd.DataFrame.from_records(edges_to_records(edges), columns=columns)
+
+
+def timeit(fn, data, repeat):
+    best = float("inf")
+    for _ in range(repeat):
+        start = time.perf_counter()
+        fn(data)
+        best = min(best, time.perf_counter() - start)
+    return best
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--legacy-max", type=int, default=10_000, help="skip the legacy path above this many edges")
+    args = parser.parse_args()
+
+    print(f"{'edges':>8} {'legacy (s)':>12} {'records (s)':>12} {'speedup':>9}")
+    for n in sizes:
+        data = json.loads(json.dumps(gen_edges(n)))
+        edges = msgspec.convert(data, list[EventEdge])
+        repeat = 5 if n <= 1_000 else 1
+        new = timeit(records, edges, repeat)
+        if n <= args.legacy_max:
+            old = timeit(legacy, data, repeat)
+            print(f"{n:>8} {old:>12.4f} {new:>12.4f} {old / new:>8.0f}x")
+        else:
+            print(f"{n:>8} {'skipped':>12} {new:>12.4f} {'-':>9}")
+
+
+if __name__ == "__main__":
+    main()
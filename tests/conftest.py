@@ -1,6 +1,7 @@
 import pytest
 import sys
 from pathlib import Path
+from pony.orm import Database
 
 # Get the path to the root directory of the project
 root_path = Path(__file__).resolve().parents[1]
@@ -21,3 +22,21 @@ def pytest_configure(config):
 @pytest.fixture
 def groups_csv_fixture():
     return str(groups_csv_path)
+
+
+@pytest.fixture
+def database(tmp_path):
+    """Bind a private sqlite file: `database(define_entities)` returns `(db, entity)` for that module's factory"""
+    bound = []
+
+    def bind(define_entities):
+        db = Database()
+        entity = define_entities(db)
+        db.bind(provider="sqlite", filename=str(tmp_path / f"db{len(bound)}.sqlite"), create_db=True)
+        db.generate_mapping(create_tables=True)
+        bound.append(db)
+        return db, entity
+
+    yield bind
+    for db in bound:
+        db.disconnect()
@@ -0,0 +1,26 @@
+from changes import Changes, diff, index_events
+from meetup_types import Event, Group
+
+
+def event(id, title="Monthly Meetup", date="2099-01-01T18:00:00-06:00"):
+    return Event(id=id, title=title, dateTime=date, eventUrl=f"url{id}", group=Group(name="Test Group", city="Oklahoma City"))
+
+
+def test_diff_reports_added_changed_and_removed():
+    previous = index_events([event("1"), event("2"), event("3"), event("past", date="2000-01-01T18:00:00-06:00")])
+    current = index_events([event("1"), event("2", title="Renamed"), event("4"), Event(id="no-date")])
+
+    changes = diff(previous, current)
+
+    assert changes.added == {"4"}
+    assert changes.changed == {"2"}
+    assert changes.removed == {"3"}  # "past" already happened, so it wasn't cancelled
+    assert changes.updated == {"2", "4"}
+    assert changes.counts() == {"added": 1, "changed": 1, "removed": 1}
+
+
+def test_diff_without_changes():
+    index = index_events([event("1"), event("2")])
+
+    assert not diff(index, dict(index))
+    assert diff({}, index) == Changes(added=frozenset({"1", "2"}))
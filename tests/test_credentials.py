@@ -0,0 +1,89 @@
+import asyncio
+import pytest
+import time
+from credentials import ServiceTokens, UserCache, VerifiedPasswords
+from unittest.mock import MagicMock
+
+
+@pytest.fixture
+def tokens():
+    return ServiceTokens(key="test-key")
+
+
+def test_issue_and_verify(tokens):
+    token = tokens.issue("scheduler", ["slack:post"])
+
+    claims = tokens.verify(token)
+
+    assert tokens.is_service_token(token)
+    assert claims.sub == "scheduler"
+    assert claims.allows("slack:post") and not claims.allows("schedule:write")
+
+
+def test_tampered_token_is_rejected(tokens):
+    prefix, payload, signature = tokens.issue("scheduler", ["events:read"]).split(".")
+    forged = tokens.issue("admin", ["events:read", "slack:post", "schedule:write"]).split(".")[1]
+
+    assert tokens.verify(f"{prefix}.{forged}.{signature}") is None
+    assert tokens.verify(f"{prefix}.{payload}.{signature}x") is None
+    assert tokens.verify("svc.garbage") is None
+    assert tokens.verify("svc.payload.ünïcode") is None
+
+
+def test_other_key_and_expiry(tokens):
+    token = tokens.issue("scheduler", ["events:read"], days=1)
+
+    assert ServiceTokens(key="rotated").verify(token) is None
+    assert tokens.verify(token, now=time.time() + 2 * 86400) is None
+
+
+def test_unknown_scope(tokens):
+    with pytest.raises(ValueError, match="admin"):
+        tokens.issue("scheduler", ["admin"])
+
+
+def test_verified_passwords_expire():
+    verified = VerifiedPasswords(ttl=60)
+
+    verified.add("$2b$hash", "secret")
+
+    assert verified.check("$2b$hash", "secret")
+    assert not verified.check("$2b$hash", "wrong")
+    assert not verified.check("$2b$other", "secret")
+    assert not VerifiedPasswords(ttl=0).check("$2b$hash", "secret")
+
+
+def test_user_cache_loads_once_until_invalidated():
+    load = MagicMock(side_effect=lambda username: {"username": username})
+    cache = UserCache(ttl=60)
+
+    assert cache.get("alice", load) == {"username": "alice"}
+    assert asyncio.run(cache.aget("alice", load)) == {"username": "alice"}
+    assert load.call_count == 1
+
+    cache.invalidate("alice")
+    cache.get("alice", load)
+
+    assert load.call_count == 2 and (cache.hits, cache.misses) == (1, 2)
+
+
+def test_user_cache_expires_and_skips_missing_users():
+    load = MagicMock(return_value=None)
+    cache = UserCache(ttl=60)
+
+    assert cache.get("nobody", load) is None
+    assert cache.get("nobody", load) is None
+    assert load.call_count == 2
+
+    expired = UserCache(ttl=-1)
+    expired.put("alice", {"username": "alice"})
+    assert expired.cached("alice") is None
+
+
+def test_user_cache_is_bounded():
+    cache = UserCache(ttl=60, size=2)
+
+    for name in ("a", "b", "c"):
+        cache.put(name, name)
+
+    assert cache.cached("a") is None and cache.cached("c") == "c"
@@ -0,0 +1,45 @@
+import asyncio
+import pytest
+import threading
+import time
+from database import DatabasePool
+
+
+def test_run_returns_result_on_pool_thread():
+    pool = DatabasePool(size=2)
+
+    name = asyncio.run(pool.run(lambda: threading.current_thread().name))
+
+    assert name.startswith("db")
+    assert pool.stats()["completed"] == 1
+
+
+def test_pool_is_bounded_and_measured():
+    pool = DatabasePool(size=2)
+    peak = []
+
+    def query():
+        peak.append(pool.stats()["in_use"])
+        time.sleep(0.05)
+
+    async def run():
+        await asyncio.gather(*(pool.run(query) for _ in range(4)))
+
+    asyncio.run(run())
+    stats = pool.stats()
+
+    assert max(peak) == 2
+    assert stats["completed"] == 4 and stats["in_use"] == 0 and stats["waiting"] == 0
+    assert stats["wait_max_ms"] >= 40  # the last two queued behind the first two
+
+
+def test_errors_are_counted_and_raised():
+    pool = DatabasePool(size=1)
+
+    def fail():
+        raise RuntimeError("boom")
+
+    with pytest.raises(RuntimeError):
+        asyncio.run(pool.run(fail))
+
+    assert pool.stats()["errors"] == 1
@@ -0,0 +1,94 @@
+import arrow
+import pytest
+from datetime import datetime
+from event_store import EventStore, content_hash, define_entities, snapshot_events
+from meetup_types import Data, Event, EventConnection, EventEdge, Group, GroupNode, Response
+from pony.orm import db_session
+from prefetch import Snapshot
+
+
+@pytest.fixture
+def store(database):
+    db, entity = database(define_entities)
+    store = EventStore(batch=2)
+    store.bind(db, entity)
+    return store
+
+
+def event(id, date, title="Monthly Meetup", city="Oklahoma City"):
+    return Event(
+        id=id,
+        title=title,
+        dateTime=date,
+        eventUrl=f"https://www.meetup.com/test-group/events/{id}/",
+        group=Group(name="Test Group", urlname="test-group", city=city),
+    )
+
+
+def window(store, **kwargs):
+    return store.between(arrow.get("2099-01-01T00:00:00-06:00"), arrow.get("2099-01-31T00:00:00-06:00"), **kwargs)
+
+
+def test_upsert_inserts_in_batches_and_reads_by_range(store):
+    events = [
+        event("3", "2099-01-03T18:00:00-06:00"),
+        event("1", "2099-01-01T18:00:00-06:00"),
+        event("2", "2099-01-02T18:00:00-06:00", city="Tulsa"),
+        event("4", "2099-02-01T18:00:00-06:00"),
+    ]
+
+    assert store.upsert(events) == 4
+
+    assert [edge.node.id for edge in window(store)] == ["1", "2", "3"]
+    assert [edge.node.id for edge in window(store, city="Oklahoma City")] == ["1", "3"]
+    node = window(store)[0].node
+    assert arrow.get(node.dateTime) == arrow.get("2099-01-01T18:00:00-06:00")
+    assert (node.title, node.group.urlname) == ("Monthly Meetup", "test-group")
+
+
+def test_upsert_updates_and_keeps_first_seen(store):
+    first, second = datetime(2099, 1, 1), datetime(2099, 1, 2)
+    store.upsert([event("1", "2099-01-10T18:00:00-06:00"), event("2", "2099-01-11T18:00:00-06:00")], seen_at=first)
+    store.upsert([event("1", "2099-01-10T18:00:00-06:00", title="Renamed")], seen_at=second)
+
+    with db_session:
+        row = store.entity["1"]
+        assert (row.title, row.first_seen, row.last_seen) == ("Renamed", first, second)
+        assert row.content_hash == content_hash(event("1", "2099-01-10T18:00:00-06:00", title="Renamed"))
+
+    # event 2 wasn't seen in the latest sync
+    assert [edge.node.id for edge in window(store)] == ["1"]
+    assert [edge.node.id for edge in window(store, current=False)] == ["1", "2"]
+
+
+def test_snapshot_events_are_unique_by_id():
+    connection = EventConnection(edges=[EventEdge(node=event("1", "2099-01-01T18:00:00-06:00")), EventEdge(node=Event())])
+    group_response = Response(data=Data(groupByUrlname=GroupNode(events=connection)))
+    snapshot = Snapshot(self_response=group_response, groups=(("test-group", group_response),))
+
+    assert [e.id for e in snapshot_events(snapshot)] == ["1"]
+
+
+def test_index_of_latest_sync(store):
+    store.upsert([event("1", "2099-01-10T18:00:00-06:00")], seen_at=datetime(2099, 1, 1))
+    store.upsert([event("2", "2099-01-11T18:00:00-06:00")], seen_at=datetime(2099, 1, 2))
+
+    index = store.index()
+
+    assert list(index) == ["2"]
+    assert index["2"] == (content_hash(event("2", "2099-01-11T18:00:00-06:00")), arrow.get("2099-01-11T18:00:00-06:00").timestamp())
+
+
+def test_followers_read_the_leaders_latest_sync(store):
+    follower = EventStore()
+    follower.bind(store.db, store.entity)
+    both = [event("1", "2099-01-10T18:00:00-06:00"), event("2", "2099-01-11T18:00:00-06:00")]
+    follower.upsert(both, seen_at=datetime(2099, 1, 1))
+    assert [edge.node.id for edge in window(follower)] == ["1", "2"]
+
+    # the leader syncs again without event 2 (cancelled); an empty upsert doesn't count as a sync
+    store.upsert([event("1", "2099-01-10T18:00:00-06:00")], seen_at=datetime(2099, 1, 2))
+    follower.upsert([], seen_at=datetime(2099, 1, 3))
+
+    assert [edge.node.id for edge in window(store)] == ["1"]
+    assert [edge.node.id for edge in window(follower)] == ["1"]
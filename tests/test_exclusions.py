@@ -0,0 +1,113 @@
+import os
+import pytest
+from exclusions import Matcher, Rule, RuleSet, as_matcher, compile_rules, define_entities, keyword_rules
+from meetup_types import Event, Group
+from pony.orm import db_session
+
+
+def event(title="Monthly Meetup", description="", name="Python OKC", urlname="pythonokc"):
+    return Event(title=title, description=description, group=Group(name=name, urlname=urlname))
+
+
+def write_rules(path, *rows):
+    path.write_text("kind,pattern,fields\n" + "".join(f"{row}\n" for row in rows), encoding="utf-8")
+
+
+def test_keyword_rules_match_name_and_title():
+    matcher = as_matcher(["Bitcoin", "36°N"])
+
+    assert matcher.match(event(title="Bitcoin Brunch"))
+    assert matcher.match(event(name="36°N Coworking"))
+    assert not matcher.match(event(description="Bitcoin talk"))
+    assert not matcher.match(event())
+
+
+def test_keyword_rules_are_literal():
+    assert not as_matcher(["C++"]).match(event(title="C Programming"))
+    assert as_matcher(["C++"]).match(event(title="Modern C++"))
+
+
+def test_exclusions_string_is_split_on_commas():
+    """A comma separated string is split into keywords, not characters"""
+    matcher = as_matcher("Tulsa, Bitcoin")
+
+    assert [r.pattern for r in matcher.rules] == ["Tulsa", "Bitcoin"]
+    assert not matcher.match(event(title="Data Science"))
+    assert not as_matcher("")
+
+
+def test_regex_urlname_and_description_rules():
+    matcher = Matcher(
+        [
+            Rule.parse("regex", r"^Intro to \w+$", "title"),
+            Rule.parse("urlname", "NerdyGirlsOKC"),
+            Rule.parse("keyword", "crypto", "description"),
+        ]
+    )
+
+    assert matcher.match(event(title="Intro to Rust"))
+    assert not matcher.match(event(title="Intro to Rust and Go!"))
+    assert matcher.match(event(urlname="nerdygirlsokc"))
+    assert matcher.match(event(description="All about crypto"))
+    assert not matcher.match(event())
+
+
+@pytest.mark.parametrize("kind, pattern, fields", [("glob", "*", ""), ("keyword", "x", "location"), ("regex", "(", "")])
+def test_invalid_rules(kind, pattern, fields):
+    with pytest.raises(Exception):
+        Rule.parse(kind, pattern, fields)
+
+
+def test_compiled_once_per_rule_set():
+    assert compile_rules(keyword_rules("a,b")) is compile_rules(keyword_rules(["a", "b"]))
+    assert compile_rules(keyword_rules("a,b")) is not compile_rules(keyword_rules("a,c"))
+
+
+def test_rule_set_reloads_changed_csv(tmp_path):
+    path = tmp_path / "exclusions.csv"
+    write_rules(path, "keyword,Bitcoin,name title", "regex,oops(,title")
+    rules = RuleSet(path, reload=0)
+
+    assert [r.pattern for r in rules.current()] == ["Bitcoin"]
+    assert rules.matcher() is rules.matcher()
+    assert rules.matcher("Tulsa").match(event(title="Tulsa Tech Fest"))
+
+    write_rules(path, "keyword,Blockchain,name title")
+    os.utime(path, ns=(0, path.stat().st_mtime_ns + 1_000_000))
+
+    assert [r.pattern for r in rules.current()] == ["Blockchain"]
+    assert not rules.matcher().match(event(title="Bitcoin Brunch"))
+
+
+def test_rule_set_throttles_reload_checks(tmp_path):
+    path = tmp_path / "exclusions.csv"
+    write_rules(path, "keyword,Bitcoin,")
+    rules = RuleSet(path, reload=3600)
+    rules.current()
+
+    write_rules(path, "keyword,Blockchain,")
+    os.utime(path, ns=(0, path.stat().st_mtime_ns + 1_000_000))
+    assert [r.pattern for r in rules.current()] == ["Bitcoin"]
+
+    rules.invalidate()
+    assert [r.pattern for r in rules.current()] == ["Blockchain"]
+
+
+def test_rule_set_merges_database_rules(database, tmp_path):
+    _, Exclusion = database(define_entities)
+
+    path = tmp_path / "exclusions.csv"
+    write_rules(path, "keyword,Bitcoin,")
+    rules = RuleSet(path, reload=0)
+    rules.bind(Exclusion)
+
+    with db_session:
+        Exclusion(kind="urlname", pattern="nerdygirlsokc")
+        Exclusion(kind="keyword", pattern="Disabled", enabled=False)
+
+    assert [r.pattern for r in rules.current()] == ["Bitcoin", "nerdygirlsokc"]
+
+    with db_session:
+        Exclusion(kind="keyword", pattern="Blockchain", fields="description")
+
+    assert rules.matcher().match(event(description="Blockchain 101"))
@@ -0,0 +1,79 @@
+import pytest
+import threading
+import time
+from jobs import FAILED, QUEUED, SUCCEEDED, DatabaseJobStore, JobQueue, QueueFull, define_entities
+
+
+def wait(queue, job_id, timeout=2.0):
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        state = queue.get(job_id)
+        if state["status"] in (SUCCEEDED, FAILED):
+            return state
+        time.sleep(0.01)
+    raise AssertionError(f"job {job_id} did not finish")
+
+
+def post(stage, channel):
+    with stage("events"):
+        time.sleep(0.02)
+    with stage("slack"):
+        pass
+    return {"channel": channel}
+
+
+def test_job_runs_in_the_background_with_stage_timings():
+    queue = JobQueue(workers=1, size=1)
+
+    job = queue.submit("slack", post, channel="events")
+    state = wait(queue, job.id)
+
+    assert state["status"] == SUCCEEDED and state["result"] == {"channel": "events"}
+    assert [s["name"] for s in state["stages"]] == ["queued", "events", "slack"]
+    assert state["stages"][1]["ms"] >= 15
+    assert state["started_at"] >= state["created_at"] and state["finished_at"] >= state["started_at"]
+
+
+def test_failure_is_recorded():
+    queue = JobQueue(workers=1, size=1)
+
+    def fail(stage):
+        raise RuntimeError("Could not sync events from Meetup")
+
+    state = wait(queue, queue.submit("slack", fail).id)
+
+    assert state["status"] == FAILED and state["error"] == "Could not sync events from Meetup"
+
+
+def test_queue_is_bounded():
+    queue = JobQueue(workers=1, size=1)
+    release = threading.Event()
+
+    def block(stage):
+        release.wait(2)
+
+    running, queued = queue.submit("slack", block), queue.submit("slack", block)
+    with pytest.raises(QueueFull):
+        queue.submit("slack", block)
+    assert queue.get(queued.id)["status"] == QUEUED
+
+    release.set()
+    wait(queue, running.id), wait(queue, queued.id)
+    wait(queue, queue.submit("slack", post, channel="events").id)  # room again
+
+
+def test_unknown_job():
+    assert JobQueue().get("missing") is None
+
+
+def test_database_store(database):
+    _, entity = database(define_entities)
+    queue = JobQueue(workers=1, size=1)
+    queue.bind(DatabaseJobStore(entity))
+
+    job = queue.submit("slack", post, channel="events")
+    state = wait(queue, job.id)
+
+    assert state["status"] == SUCCEEDED and state["result"] == {"channel": "events"}
+    assert [s["name"] for s in state["stages"]] == ["queued", "events", "slack"]
+    assert DatabaseJobStore(entity).get(job.id)["id"] == job.id  # visible to any worker
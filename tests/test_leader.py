@@ -0,0 +1,57 @@
+import pytest
+from datetime import datetime
+from leader import Leader, define_entities
+from pony.orm import db_session
+
+
+@pytest.fixture
+def lease(database):
+    db, entity = database(define_entities)
+
+    def make(ttl=30):
+        leader = Leader(ttl=ttl)
+        leader.bind(db, entity)
+        return leader
+
+    return make
+
+
+def test_one_holder_at_a_time(lease):
+    first, second = lease(), lease()
+
+    assert first.acquire()
+    assert not second.acquire()
+    assert first.acquire()  # renewal
+    assert first.is_leader and not second.is_leader
+
+
+def test_release_hands_over(lease):
+    first, second = lease(), lease()
+    first.acquire()
+
+    first.release()
+
+    assert not first.is_leader
+    assert second.acquire()
+
+
+def test_expired_lease_is_taken_over(lease):
+    first, second = lease(), lease()
+    first.acquire()
+    with db_session:
+        first.entity[first.name].expires_at = datetime(2000, 1, 1)
+
+    assert second.acquire()
+    assert not first.acquire()
+
+
+def test_leadership_lapses_without_renewal(lease):
+    leader = lease(ttl=0)
+
+    leader.acquire()
+
+    assert not leader.is_leader
+
+
+def test_unbound_is_always_leader():
+    assert Leader().is_leader
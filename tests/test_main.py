@@ -76,6 +76,20 @@ def test_get_token(test_client, auth_headers):
         assert "test_access_token" in response.json()
 
 
+def test_get_token_rejects_service_tokens(test_client, auth_headers):
+    async def service_user():
+        return User(username="scheduler", scopes=["events:read"])
+
+    app.dependency_overrides[get_current_user] = service_user
+    try:
+        with patch('app.main.gen_token') as mock_gen_token:
+            response = test_client.get("/api/token", headers=auth_headers)
+        assert response.status_code == 403
+        mock_gen_token.assert_not_called()
+    finally:
+        app.dependency_overrides[get_current_user] = override_get_current_user
+
+
 def test_get_events(test_client, auth_headers):
     mock_events = [
         {
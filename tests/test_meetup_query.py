@@ -1,8 +1,27 @@
 import arrow
+import asyncio
+import httpx
 import json
 import pandas as pd
 import pytest
-from meetup_query import export_to_file, format_response, main, send_request, sort_csv, sort_json
+from meetup_query import (
+    QueryPlan,
+    add_descriptions,
+    build_batch_query,
+    export_to_file,
+    fetch_groups,
+    format_date,
+    format_response,
+    get_all_events,
+    iter_events,
+    main,
+    render_events,
+    send_request,
+    sort_csv,
+    sort_json,
+    split_batch_response,
+)
+from meetup_types import batch_decoder, response_decoder
 from pathlib import Path
 from unittest.mock import mock_open, patch
 
@@ -13,10 +32,11 @@ def mock_response():
         {
             "data": {
                 "self": {
-                    "upcomingEvents": {
+                    "memberEvents": {
                         "edges": [
                             {
                                 "node": {
+                                    "id": "123456789",
                                     "dateTime": "2024-09-20T18:00:00-05:00",
                                     "title": "Test Event",
                                     "description": "This is a test event",
@@ -37,11 +57,12 @@ def mock_df():
     return pd.DataFrame(
         {
             "name": ["Test Group"],
-            "date": ["2024-09-20T18:00:00-05:00"],
+            "date": pd.to_datetime(["2024-09-20T18:00:00-05:00"]).tz_convert("America/Chicago"),
             "title": ["Test Event"],
             "description": ["This is a test event"],
             "city": ["Oklahoma City"],
             "eventUrl": ["https://www.meetup.com/test-group/events/123456789/"],
+            "id": ["123456789"],
         }
     )
 
@@ -49,11 +70,13 @@ def mock_df():
 def test_send_request(mock_response):
     with patch("requests.post") as mock_post:
         mock_post.return_value.status_code = 200
-        mock_post.return_value.json.return_value = json.loads(mock_response)
+        mock_post.return_value.content = mock_response.encode()
 
-        response = send_request("fake_token", "fake_query", "fake_vars")
+        response = send_request("fake_token", "fake_query", {"urlname": "fake"})
 
-        assert json.loads(response) == json.loads(mock_response)
+        node = response.data.member.memberEvents.edges[0].node
+        assert node.title == "Test Event"
+        assert node.group.urlname == "test-group"
         mock_post.assert_called_once()
 
 
@@ -63,20 +86,34 @@ def test_format_response(mock_response, mock_df):
         pd.testing.assert_frame_equal(df, mock_df)
 
 
+def test_format_response_without_events():
+    df = format_response(json.dumps({"data": {"groupByUrlname": None}}))
+
+    assert df.empty
+    assert df.columns.tolist() == ["name", "date", "title", "description", "city", "eventUrl", "id"]
+
+
 def test_sort_csv(tmp_path):
     test_csv = tmp_path / "test.csv"
-    df = pd.DataFrame({"date": ["2024-09-21T10:00:00", "2024-09-20T18:00:00"], "eventUrl": ["url1", "url2"]})
+    df = pd.DataFrame(
+        {"date": ["2024-09-21T10:00:00-05:00", "2024-09-20T18:00:00-05:00", "2024-09-17T18:00:00-05:00"], "eventUrl": ["url1", "url2", "url3"]}
+    )
     df.to_csv(test_csv, index=False)
 
-    sort_csv(test_csv)
+    with patch("arrow.now", return_value=arrow.get("2024-09-18")):
+        sort_csv(test_csv)
 
     sorted_df = pd.read_csv(test_csv)
-    assert sorted_df["date"].tolist() == ["Fri 9/20 6:00 pm", "Sat 9/21 10:00 am"]
+    assert sorted_df["date"].tolist() == ["2024-09-20T18:00:00-05:00", "2024-09-21T10:00:00-05:00"]
 
 
 def test_sort_json(tmp_path):
     test_json = tmp_path / "test.json"
-    data = [{"date": "2024-09-21T10:00:00", "eventUrl": "url1"}, {"date": "2024-09-20T18:00:00", "eventUrl": "url2"}]
+    data = [
+        {"date": "2024-09-21T10:00:00-05:00", "eventUrl": "url1"},
+        {"date": "2024-09-20T18:00:00-05:00", "eventUrl": "url2"},
+        {"date": "2024-09-20T18:00:00-05:00", "eventUrl": "url2"},
+    ]
     with open(test_json, "w") as f:
         json.dump(data, f)
 
@@ -86,11 +123,53 @@ def test_sort_json(tmp_path):
     with open(test_json) as f:
         sorted_data = json.load(f)
 
-    assert sorted_data == data, "Data should remain unchanged if not sorted"
+    assert sorted_data == [
+        {"date": "2024-09-20T18:00:00-05:00", "eventUrl": "url2"},
+        {"date": "2024-09-21T10:00:00-05:00", "eventUrl": "url1"},
+    ]
+
+    # sorting again keeps the full date instead of re-parsing a rendered one
+    with patch("arrow.now", return_value=arrow.get("2024-09-18")):
+        sort_json(test_json)
+
+    with open(test_json) as f:
+        assert json.load(f) == sorted_data
+
+
+def test_render_events():
+    events = [
+        {"date": "2024-09-20T23:00:00Z", "eventUrl": "url1"},
+        {"date": "Fri 9/20 6:00 pm", "eventUrl": "url2"},
+    ]
+    format_date.cache_clear()
+
+    rendered = render_events(events)
+
+    assert rendered[0]["date"] == "Fri 9/20 6:00 pm"
+    assert pd.isna(rendered[1]["date"])
+    assert render_events(events)[0]["date"] == "Fri 9/20 6:00 pm"
+    assert format_date.cache_info().hits == 1
+    assert render_events([]) == []
+
+
+def test_get_all_events(mock_response):
+    group_response = json.loads(mock_response)["data"]["self"]["memberEvents"]
+    earlier = json.loads(json.dumps(group_response))
+    earlier["edges"][0]["node"].update(
+        {"dateTime": "2024-09-19T18:00:00-05:00", "eventUrl": "https://www.meetup.com/other-group/events/1/"}
+    )
+    group_responses = [
+        ("test-group", json.dumps({"data": {"groupByUrlname": {"city": "Oklahoma City", "events": group_response}}})),
+        ("other-group", json.dumps({"data": {"groupByUrlname": {"city": "Oklahoma City", "events": earlier}}})),
+        ("empty-group", json.dumps({"data": {"groupByUrlname": None}})),
+    ]
 
-    print("Warning: sort_json function is not sorting the data as expected")
+    with patch("arrow.now", return_value=arrow.get("2024-09-18")):
+        events = get_all_events(mock_response, group_responses)
 
-    print("Sorted data:", json.dumps(sorted_data, indent=2))
+    # self and test-group return the same event: deduped by eventUrl, sorted by date
+    assert [e["date"] for e in events] == ["Thu 9/19 6:00 pm", "Fri 9/20 6:00 pm"]
+    assert events[1]["title"] == "Test Event"
 
 
 def test_export_to_file(mock_response, tmp_path):
@@ -104,22 +183,182 @@ def test_export_to_file(mock_response, tmp_path):
 
     assert len(exported_data) == 1
     assert exported_data[0]["title"] == "Test Event"
+    assert exported_data[0]["date"] == "2024-09-20T18:00:00-05:00"
+
+
+def test_build_batch_query():
+    batch_query, variables = build_batch_query(["group-a", "group-b"])
+
+    assert batch_query.startswith("query($u0: String!, $u1: String!) {")
+    assert "g0: groupByUrlname(urlname: $u0)" in batch_query
+    assert "g1: groupByUrlname(urlname: $u1)" in batch_query
+    assert variables == {"u0": "group-a", "u1": "group-b"}
+
+
+def test_query_plan_projects_fields():
+    default, full = QueryPlan(), QueryPlan(description=True)
+
+    assert "description" not in default.self_query + default.url_query + build_batch_query(["group-a"], default)[0]
+    assert "description" in full.self_query
+    assert "description" in full.url_query
+    assert "description" in build_batch_query(["group-a"], full)[0]
+    assert "first: 25, after: $after" in QueryPlan(first=25).url_query
+
+
+def test_add_descriptions():
+    def handler(request):
+        variables = json.loads(request.content)["variables"]
+        assert variables == {"e0": "1", "e1": "2"}
+        return httpx.Response(200, json={"data": {"e0": {"id": "1", "description": "About 1"}, "e1": None}})
+
+    transport = httpx.MockTransport(handler)
+    client = httpx.AsyncClient
+    events = [{"id": "1", "description": None}, {"id": "2", "description": None}, {"id": "3", "description": "Cached"}]
+
+    with patch("meetup_query.httpx.AsyncClient", lambda **kwargs: client(transport=transport)):
+        events = add_descriptions("fake_token", events)
+
+    assert [e["description"] for e in events] == ["About 1", None, "Cached"]
+
+
+def test_split_batch_response(mock_response):
+    node = json.loads(mock_response)["data"]["self"]["memberEvents"]["edges"][0]["node"]
+    group = {"city": "Oklahoma City", "events": {"edges": [{"node": node}]}}
+    batch_response = batch_decoder.decode(
+        json.dumps(
+            {
+                "data": {"g0": group, "g1": None},
+                "errors": [{"message": "group not found", "path": ["g1"]}],
+            }
+        )
+    )
+
+    first, second = split_batch_response(batch_response, ["test-group", "missing-group"])
+
+    assert first.data.groupByUrlname.events.edges[0].node.title == "Test Event"
+    assert first.errors == []
+    assert second.data.groupByUrlname is None
+    assert second.errors[0].path == ["g1"]
+
+    with patch("arrow.now", return_value=arrow.get("2024-09-18")):
+        assert format_response(first)["title"].tolist() == ["Test Event"]
+        assert format_response(second).empty
+
+
+def test_fetch_groups_preserves_order():
+    async def handler(request):
+        variables = json.loads(request.content)["variables"]
+        urlnames = list(variables.values()) if "u0" in variables else ["self"]
+        # earlier requests answer last so completion order differs from request order
+        await asyncio.sleep({"self": 0.03, "group-a": 0.02, "group-c": 0.01}[urlnames[0]])
+        if urlnames == ["self"]:
+            return httpx.Response(200, json={"data": {"self": None}})
+        return httpx.Response(200, json={"data": {f"g{i}": {"urlname": url} for i, url in enumerate(urlnames)}})
+
+    async def run():
+        async with httpx.AsyncClient(transport=httpx.MockTransport(handler)) as client:
+            return await fetch_groups("fake_token", ["group-a", "group-b", "group-c"], limit=3, size=2, client=client)
+
+    self_response, *group_responses = asyncio.run(run())
+
+    assert self_response.data.member is None
+    assert [r.data.groupByUrlname.urlname for r in group_responses] == ["group-a", "group-b", "group-c"]
+
+
+def event_response(dates, cursor=None):
+    edges = [
+        {"node": {"dateTime": date, "title": f"Event {i}", "group": {"city": "Oklahoma City"}}} for i, date in enumerate(dates)
+    ]
+    page_info = {"endCursor": cursor, "hasNextPage": cursor is not None}
+    return json.dumps({"data": {"groupByUrlname": {"events": {"pageInfo": page_info, "edges": edges}}}})
+
+
+def test_iter_events_follows_cursor_until_window():
+    pages = {
+        None: event_response(["2024-09-19T18:00:00-05:00", "2024-09-20T18:00:00-05:00"], cursor="page-2"),
+        "page-2": event_response(["2024-09-21T18:00:00-05:00", "2024-09-30T18:00:00-05:00"], cursor="page-3"),
+    }
+
+    def fake_send(token, query, vars):
+        return response_decoder.decode(pages[vars["after"]])
+
+    with patch("meetup_query.send_request", side_effect=fake_send) as mock_send:
+        events = iter_events("fake_token", "test-group", until=arrow.get("2024-09-25T00:00:00-05:00"))
+        assert next(events).dateTime == "2024-09-19T18:00:00-05:00"
+        assert mock_send.call_count == 1  # lazy: second page not requested yet
+        remaining = list(events)
+
+    assert [node.dateTime for node in remaining] == ["2024-09-20T18:00:00-05:00", "2024-09-21T18:00:00-05:00"]
+    assert mock_send.call_count == 2  # stops before requesting page-3
+
+
+def test_iter_events_keeps_events_without_a_start_time():
+    pages = {
+        None: event_response(["2024-09-19T18:00:00-05:00", None], cursor="page-2"),
+        "page-2": event_response(["2024-09-30T18:00:00-05:00"]),
+    }
+
+    def fake_send(token, query, vars):
+        return response_decoder.decode(pages[vars["after"]])
+
+    with patch("meetup_query.send_request", side_effect=fake_send) as mock_send:
+        events = list(iter_events("fake_token", "test-group", until=arrow.get("2024-09-25T00:00:00-05:00")))
+
+    assert [node.dateTime for node in events] == ["2024-09-19T18:00:00-05:00", None]
+    assert mock_send.call_count == 2  # a null start doesn't end the window
+
+
+def test_fetch_groups_paginates_busy_groups():
+    def handler(request):
+        variables = json.loads(request.content)["variables"]
+        if "u0" in variables:
+            first_page = json.loads(event_response(["2099-01-01T18:00:00-06:00"], cursor="page-2"))
+            return httpx.Response(200, json={"data": {"g0": first_page["data"]["groupByUrlname"]}})
+        if variables.get("urlname") == "group-a":
+            return httpx.Response(200, content=event_response(["2099-01-02T18:00:00-06:00"]))
+        return httpx.Response(200, json={"data": {"self": None}})
+
+    async def run():
+        async with httpx.AsyncClient(transport=httpx.MockTransport(handler)) as client:
+            return await fetch_groups("fake_token", ["group-a"], client=client)
+
+    with patch("arrow.now", return_value=arrow.get("2098-12-31T00:00:00-06:00")):
+        _, group_response = asyncio.run(run())
+
+    edges = group_response.data.groupByUrlname.events.edges
+    assert [edge.node.dateTime for edge in edges] == ["2099-01-01T18:00:00-06:00", "2099-01-02T18:00:00-06:00"]
+
+
+def test_fetch_groups_reports_failed_request():
+    def handler(request):
+        raise httpx.ConnectError("boom", request=request)
+
+    async def run():
+        async with httpx.AsyncClient(transport=httpx.MockTransport(handler)) as client:
+            return await fetch_groups("fake_token", ["group-a"], client=client)
+
+    responses = asyncio.run(run())
+
+    assert len(responses) == 2
+    assert all(r.data is None and r.errors for r in responses)
 
 
 @patch("meetup_query.gen_token")
-@patch("meetup_query.send_request")
+@patch("meetup_query.fetch_all")
 @patch("meetup_query.export_to_file")
-@patch("meetup_query.sort_json")
-def test_main(mock_sort_json, mock_export, mock_send, mock_gen_token, mock_response):
+def test_main(mock_export, mock_fetch_all, mock_gen_token, mock_response):
     mock_gen_token.return_value = {"access_token": "fake_token"}
-    mock_send.return_value = mock_response
+    mock_fetch_all.return_value = (mock_response, [("test-group", mock_response)])
 
-    with patch("meetup_query.url_vars", ["test-group"]):
-        main()
+    with patch("meetup_query.url_vars", ["test-group"]), patch("arrow.now", return_value=arrow.get("2024-09-18")):
+        events = main()
 
-    assert mock_send.call_count == 2
-    assert mock_export.call_count == 2
-    mock_sort_json.assert_called_once()
+    mock_fetch_all.assert_called_once_with("fake_token", ["test-group"], plan=QueryPlan(description=True))
+    mock_export.assert_called_once()
+    exported, export_type = mock_export.call_args.args
+    assert export_type == "json"
+    assert exported["eventUrl"].tolist() == [e["eventUrl"] for e in events]
+    assert events[0]["date"] == "Fri 9/20 6:00 pm"
 
 
 if __name__ == "__main__":
@@ -0,0 +1,96 @@
+import asyncio
+import pytest
+from pony.orm import db_session
+from post_ledger import PostLedger, define_entities
+from slack_delivery import DELETED, POSTED, SKIPPED, UPDATED, deliver as deliver_all
+from slack_render import Message
+from slack_sdk.errors import SlackApiError
+from unittest.mock import AsyncMock, MagicMock
+
+
+@pytest.fixture
+def ledger(database):
+    _, entity = database(define_entities)
+    ledger = PostLedger()
+    ledger.bind(entity)
+    return ledger
+
+
+@pytest.fixture
+def sender():
+    sender = MagicMock()
+    sender.post = AsyncMock(side_effect=["1.0", "2.0", "3.0"])
+    sender.update = AsyncMock()
+    sender.delete = AsyncMock()
+    return sender
+
+
+def deliver(ledger, sender, channel, text, **kwargs):
+    return asyncio.run(ledger.deliver(sender, channel, Message(sections=(text,)), **kwargs)).outcome
+
+
+def test_skip_unchanged_update_changed_post_new_period(ledger, sender):
+    assert deliver(ledger, sender, "C1", "• event", period="2099-01-01") == POSTED
+    assert deliver(ledger, sender, "C1", "• event", period="2099-01-01") == SKIPPED
+    assert deliver(ledger, sender, "C1", "• event\n• another", period="2099-01-01") == UPDATED
+    assert deliver(ledger, sender, "C1", "• event\n• another", period="2099-01-02") == POSTED
+
+    assert sender.post.await_count == 2
+    sender.update.assert_awaited_once_with("C1", "1.0", Message(sections=("• event\n• another",)))
+
+
+def test_channels_are_independent(ledger, sender):
+    assert deliver(ledger, sender, "C1", "• event", period="2099-01-01") == POSTED
+    assert deliver(ledger, sender, "C2", "• event", period="2099-01-01") == POSTED
+
+
+def test_failed_update_posts_a_new_message(ledger, sender):
+    deliver(ledger, sender, "C1", "• event", period="2099-01-01")
+    response = MagicMock(status_code=200)
+    response.__getitem__.return_value = "message_not_found"
+    sender.update.side_effect = SlackApiError("gone", response)
+
+    assert deliver(ledger, sender, "C1", "• changed", period="2099-01-01") == POSTED
+
+    with db_session:
+        entry = ledger.entity.get(channel="C1", period="2099-01-01")
+        assert entry.ts == "2.0"
+
+
+def test_repost(ledger, sender):
+    deliver(ledger, sender, "C1", "• event", period="2099-01-01")
+
+    assert deliver(ledger, sender, "C1", "• event", period="2099-01-01", repost=True) == POSTED
+    sender.update.assert_not_awaited()
+
+
+def test_parts_are_tracked_separately(ledger, sender):
+    assert deliver(ledger, sender, "C1", "• first", period="2099-01-01") == POSTED
+    assert deliver(ledger, sender, "C1", "• second", period="2099-01-01", part=1) == POSTED
+    assert deliver(ledger, sender, "C1", "• second", period="2099-01-01", part=1) == SKIPPED
+
+    with db_session:
+        assert ledger.entity.get(channel="C1", period="2099-01-01#1").ts == "2.0"
+
+
+def test_shorter_post_deletes_leftover_parts(ledger, sender):
+    three = [Message(sections=(text,)) for text in ("• first", "• second", "• third")]
+    asyncio.run(deliver_all(sender, three, ["C1"], ledger=ledger, period="2099-01-01"))
+
+    deliveries = asyncio.run(deliver_all(sender, three[:1], ["C1"], ledger=ledger, period="2099-01-01"))
+
+    assert [(d.outcome, d.part) for d in deliveries] == [(SKIPPED, 0), (DELETED, 1), (DELETED, 2)]
+    assert [call.args for call in sender.delete.await_args_list] == [("C1", "2.0"), ("C1", "3.0")]
+    with db_session:
+        assert [e.period for e in ledger.entity.select()] == ["2099-01-01"]
+
+
+def test_repost_forgets_leftover_parts_without_deleting(ledger, sender):
+    two = [Message(sections=(text,)) for text in ("• first", "• second")]
+    asyncio.run(deliver_all(sender, two, ["C1"], ledger=ledger, period="2099-01-01"))
+
+    asyncio.run(deliver_all(sender, two[:1], ["C1"], ledger=ledger, period="2099-01-01", repost=True))
+
+    sender.delete.assert_not_awaited()
+    with db_session:
+        assert [(e.period, e.ts) for e in ledger.entity.select()] == [("2099-01-01", "3.0")]
@@ -0,0 +1,195 @@
+import arrow
+import asyncio
+import pytest
+import threading
+import time
+from datetime import datetime
+from event_store import EventStore, define_entities
+from exclusions import Rule, compile_rules
+from meetup_query import QueryPlan, get_all_events
+from meetup_types import Data, Event, EventConnection, EventEdge, GraphQLError, Group, GroupNode, Response
+from prefetch import Prefetcher
+from unittest.mock import AsyncMock, patch
+
+
+@pytest.fixture
+def tokens():
+    return {"access_token": "fake_token"}
+
+
+def test_get_syncs_once_then_serves_snapshot(tokens):
+    prefetcher = Prefetcher(interval=0)
+    fetched = (Response(), [("test-group", Response())])
+
+    with patch("prefetch.gen_token", return_value=tokens), patch("prefetch.fetch_all", return_value=fetched) as mock_fetch:
+        first = prefetcher.get()
+        second = prefetcher.get()
+
+    mock_fetch.assert_called_once()
+    assert first is second
+    assert first.groups == (("test-group", Response()),)
+
+
+def test_refresh_swaps_snapshot(tokens):
+    prefetcher = Prefetcher(interval=0)
+
+    with patch("prefetch.gen_token", return_value=tokens), patch("prefetch.fetch_all", return_value=(Response(), [])):
+        first = prefetcher.get()
+        second = prefetcher.get(refresh=True)
+
+    assert first is not second
+    assert prefetcher.snapshot is second
+
+
+def test_snapshot_headers():
+    prefetcher = Prefetcher(interval=0)
+    snapshot = prefetcher.publish(Response(), [])
+    object.__setattr__(snapshot, "fetched_at", time.time() - 42)
+
+    assert snapshot.age == 42
+    assert snapshot.headers()["Age"] == "42"
+    assert snapshot.headers()["Last-Modified"].endswith("GMT")
+
+
+def test_run_loop_publishes_in_background(tokens):
+    prefetcher = Prefetcher(interval=3600)
+
+    async def run():
+        prefetcher.start()
+        for _ in range(100):
+            if prefetcher.snapshot is not None:
+                break
+            await asyncio.sleep(0.01)
+        await prefetcher.stop()
+
+    with (
+        patch("prefetch.gen_token", return_value=tokens),
+        patch("prefetch.url_vars", ["test-group"]),
+        patch("prefetch.fetch_groups", AsyncMock(return_value=[Response(), Response()])),
+    ):
+        asyncio.run(run())
+
+    assert prefetcher.snapshot.groups == (("test-group", Response()),)
+
+
+def test_plan_selects_descriptions_for_description_rules(tokens):
+    prefetcher = Prefetcher(interval=0)
+    description_rule = compile_rules((Rule.parse("keyword", "crypto", "description"),))
+
+    with patch("prefetch.gen_token", return_value=tokens), patch("prefetch.fetch_all", return_value=(Response(), [])) as mock_fetch:
+        with patch("prefetch.rule_set.matcher", return_value=compile_rules(())):
+            assert prefetcher.refresh().plan == QueryPlan()
+        with patch("prefetch.rule_set.matcher", return_value=description_rule):
+            assert prefetcher.refresh().plan == QueryPlan(description=True)
+
+    assert mock_fetch.call_args.kwargs["plan"] == QueryPlan(description=True)
+
+
+def response(*titles):
+    edges = [
+        EventEdge(node=Event(id=str(i), title=title, dateTime="2099-01-01T18:00:00-06:00")) for i, title in enumerate(titles)
+    ]
+    return Response(data=Data(groupByUrlname=GroupNode(events=EventConnection(edges=edges))))
+
+
+def failed():
+    return Response(errors=[GraphQLError(message="HTTP Request failed: 503")])
+
+
+def test_publish_diffs_consecutive_syncs():
+    prefetcher = Prefetcher(interval=0)
+
+    first = prefetcher.publish(response("a", "b"), [])
+    second = prefetcher.publish(response("a", "B"), [("test-group", response("a"))])
+
+    assert first.changes.added == {"0", "1"}
+    assert second.changes.changed == {"1"} and not second.changes.added and not second.changes.removed
+
+
+def slow_fetch(*args, **kwargs):
+    time.sleep(0.2)
+    return Response(), []
+
+
+def test_concurrent_refreshes_share_one_sync(tokens, tmp_path):
+    workers = [Prefetcher(interval=0, lock_fn=tmp_path / "sync.lock", snapshot_fn=tmp_path / "snapshot") for _ in range(2)]
+    results = []
+
+    with patch("prefetch.gen_token", return_value=tokens), patch("prefetch.fetch_all", side_effect=slow_fetch) as mock_fetch:
+        threads = [threading.Thread(target=lambda w=w: results.append(w.refresh())) for w in workers * 2]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+
+    mock_fetch.assert_called_once()
+    assert len({r.fetched_at for r in results}) == 1
+
+
+def test_new_worker_starts_from_fresh_shared_snapshot(tokens, tmp_path):
+    files = {"lock_fn": tmp_path / "sync.lock", "snapshot_fn": tmp_path / "snapshot"}
+
+    with patch("prefetch.gen_token", return_value=tokens), patch("prefetch.fetch_all", return_value=(Response(), [])) as mock_fetch:
+        synced = Prefetcher(interval=900, **files).get()
+        reused = Prefetcher(interval=900, **files).get()
+
+    mock_fetch.assert_called_once()
+    assert reused.fetched_at == synced.fetched_at
+
+
+def test_failed_sync_keeps_the_last_snapshot(tokens, tmp_path):
+    prefetcher = Prefetcher(interval=0, lock_fn=tmp_path / "sync.lock", snapshot_fn=tmp_path / "snapshot")
+
+    fetched = (response("a"), [("test-group", response("a"))])
+    with patch("prefetch.gen_token", return_value=tokens), patch("prefetch.fetch_all", return_value=fetched):
+        good = prefetcher.refresh()
+    shared = (tmp_path / "snapshot").read_bytes()
+
+    outage = (failed(), [("test-group", failed())])
+    with (
+        patch("prefetch.gen_token", return_value=tokens),
+        patch("prefetch.fetch_all", return_value=outage),
+        patch.object(prefetcher, "persist") as persist,
+    ):
+        assert prefetcher.refresh() is good
+
+    persist.assert_not_called()
+    assert prefetcher.snapshot is good and (tmp_path / "snapshot").read_bytes() == shared
+
+    # with nothing to fall back on, the failure is raised
+    with patch("prefetch.gen_token", return_value=tokens), patch("prefetch.fetch_all", return_value=outage):
+        with pytest.raises(RuntimeError, match="Meetup sync failed"):
+            Prefetcher(interval=0, lock_fn=tmp_path / "sync.lock", snapshot_fn=tmp_path / "other").refresh()
+
+
+def test_partial_sync_reports_nothing_removed():
+    prefetcher = Prefetcher(interval=0)
+    edges = [EventEdge(node=Event(id="9", title="Game Night", dateTime="2099-01-02T18:00:00-06:00"))]
+    other = Response(data=Data(groupByUrlname=GroupNode(events=EventConnection(edges=edges))))
+    prefetcher.publish(response("a"), [("test-group", response("a")), ("other-group", other)])
+
+    partial = prefetcher.publish(response("a"), [("test-group", response("a")), ("other-group", failed())])
+    full = prefetcher.publish(response("a"), [("test-group", response("a")), ("other-group", other)])
+
+    assert partial.changes.counts() == {"added": 0, "changed": 0, "removed": 0}
+    assert not full.changes  # event 9 isn't announced again
+
+
+def test_follower_on_another_host_rebuilds_from_the_event_store(database, tmp_path):
+    db, entity = database(define_entities)
+    store = EventStore()
+    store.bind(db, entity)
+    starts = arrow.now("America/Chicago").shift(days=1).replace(hour=18, minute=0, second=0, microsecond=0).isoformat()
+    group = Group(name="Test Group", urlname="test-group", city="Oklahoma City")
+    url = "https://www.meetup.com/test-group/events/1/"
+    store.upsert([Event(id="1", title="Monthly Meetup", dateTime=starts, eventUrl=url, group=group)], seen_at=datetime(2099, 1, 1))
+    follower = Prefetcher(interval=0, lock_fn=tmp_path / "sync.lock", snapshot_fn=tmp_path / "snapshot")  # no shared file
+
+    with patch("prefetch.event_store", store):
+        snapshot = asyncio.run(follower.follow())
+        again = asyncio.run(follower.follow())
+
+    assert follower.snapshot is snapshot and again is None
+    assert snapshot.fetched_at == arrow.get("2099-01-01T00:00:00+00:00").timestamp()  # the leader's sync, not now
+    assert snapshot.changes.added == {"1"}
+    assert [event["eventUrl"] for event in get_all_events(snapshot.self_response, snapshot.groups)] == [url]
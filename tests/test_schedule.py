@@ -0,0 +1,71 @@
+import arrow
+import pytest
+from pony.orm import db_session
+from schedule import (
+    TZ,
+    ScheduleRepository,
+    check_and_revert_snooze,
+    define_entities,
+    effective,
+    initialize_schedule,
+    schedule_repository,
+    update_schedule,
+)
+from unittest.mock import patch
+
+
+@pytest.fixture(autouse=True)
+def entity(database):
+    _, entity = database(define_entities)
+    previous = schedule_repository.entity
+    schedule_repository.bind(entity)
+    initialize_schedule()
+    yield entity
+    schedule_repository.bind(previous)
+
+
+def test_rows_are_read_once_and_cached(entity):
+    repository = ScheduleRepository()
+    repository.bind(entity)
+
+    with patch.object(repository, "load", wraps=repository.load) as load:
+        first = repository.snapshot()
+        second = repository.snapshot()
+
+        assert load.call_count == 1
+    assert first is second
+    assert [row["day"] for row in first][:2] == ["Sunday", "Monday"] and len(first) == 7
+
+
+def test_expired_snooze_reads_as_reverted_without_a_write(entity):
+    now = arrow.now(TZ)
+    with db_session:
+        monday = entity.get(day="Monday")
+        monday.snooze_until = now.shift(minutes=-1).naive
+        monday.original_schedule_time = monday.schedule_time
+        monday.schedule_time = "23:59"
+    schedule_repository.invalidate()
+
+    row = next(row for row in schedule_repository.rows(now) if row["day"] == "Monday")
+
+    assert row["schedule_time"] != "23:59" and row["snooze_until"] is None and row["original_schedule_time"] is None
+    with db_session:
+        assert entity.get(day="Monday").snooze_until is not None
+
+
+def test_active_snooze_is_kept():
+    now = arrow.now(TZ)
+    row = {"schedule_time": "14:05", "snooze_until": now.shift(minutes=5).naive, "original_schedule_time": "15:00"}
+
+    assert effective(row, now) is row
+
+
+def test_mutations_invalidate():
+    schedule_repository.snapshot()
+    version = schedule_repository.version
+
+    check_and_revert_snooze()
+    assert schedule_repository.stale and schedule_repository.version == version + 1
+
+    update_schedule("Monday", timezone="America/New_York")
+    assert next(row for row in schedule_repository.rows() if row["day"] == "Monday")["timezone"] == "America/New_York"
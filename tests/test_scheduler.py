@@ -0,0 +1,189 @@
+import arrow
+import asyncio
+import pytest
+from datetime import datetime
+from scheduler import Plan, PostScheduler, ScheduleEngine
+from unittest.mock import AsyncMock, MagicMock, patch
+
+
+def row(day, enabled=True, snooze_until=None, schedule_time="15:00", original_schedule_time=None, last_changed=datetime(2099, 1, 1)):
+    return {
+        "day": day,
+        "schedule_time": schedule_time,
+        "timezone": "America/Chicago",
+        "enabled": enabled,
+        "snooze_until": snooze_until,
+        "original_schedule_time": original_schedule_time,
+        "last_changed": last_changed,
+    }
+
+
+# a Monday at noon in Oklahoma City (CST)
+monday = arrow.get("2099-01-05T18:00:00+00:00")
+
+
+@pytest.fixture(autouse=True)
+def local_tz():
+    with patch("scheduler.TZ", "America/Chicago"):
+        yield
+
+
+def engine(*rows):
+    engine = ScheduleEngine()
+    rows = list(rows)
+    engine.bind(lambda: rows)
+    return engine
+
+
+def test_next_enabled_day():
+    schedules = engine(row("Monday"), row("Tuesday", enabled=False), row("Wednesday"))
+
+    assert schedules.next_fire(monday) == arrow.get("2099-01-07T15:00:00+00:00")
+
+
+def test_same_day_next_week():
+    assert engine(row("Monday")).next_fire(monday) == arrow.get("2099-01-12T15:00:00+00:00")
+
+
+def test_wall_time_follows_dst():
+    # DST starts Sunday 2035-03-11: 09:00 is 15:00 UTC before and 14:00 UTC after
+    schedules = engine(row("Friday"))
+
+    assert schedules.next_fire(arrow.get("2035-03-05T00:00:00+00:00")) == arrow.get("2035-03-09T15:00:00+00:00")
+    assert schedules.next_fire(arrow.get("2035-03-12T00:00:00+00:00")) == arrow.get("2035-03-16T14:00:00+00:00")
+
+
+def test_wall_time_comes_from_the_row():
+    # 14:00 UTC written in July is 09:00 CDT, so it posts at 15:00 UTC in January
+    summer = row("Wednesday", schedule_time="14:00", last_changed=datetime(2035, 7, 1))
+    late = row("Friday", schedule_time="16:30")
+
+    assert engine(summer).next_fire(monday) == arrow.get("2099-01-07T15:00:00+00:00")
+    assert engine(late).next_fire(monday) == arrow.get("2099-01-09T16:30:00+00:00")
+
+
+def test_snooze_holds_back_earlier_fires():
+    schedules = engine(row("Wednesday", snooze_until=datetime(2099, 1, 10)), row("Friday"))
+
+    assert schedules.next_fire(monday) == arrow.get("2099-01-09T15:00:00+00:00")
+    assert engine(row("Wednesday", snooze_until=datetime(2099, 1, 10))).next_fire(monday) is None
+
+
+def test_moved_snooze_fires_once_at_snooze_time():
+    snoozed = row("Monday", snooze_until=datetime(2099, 1, 5, 12, 5), schedule_time="18:05", original_schedule_time="15:00")
+
+    assert engine(snoozed).next_fire(monday) == arrow.get("2099-01-05T18:05:00+00:00")
+
+
+def test_should_post_is_a_lookup_until_the_rows_change():
+    rows = [row("Monday")]
+    load = MagicMock(return_value=rows)
+    schedules = ScheduleEngine(window=90)
+    schedules.bind(load)
+
+    assert schedules.should_post(arrow.get("2099-01-05T16:00:00+00:00"))
+    assert not schedules.should_post(monday)
+    assert schedules.today(monday) == arrow.get("2099-01-05T15:00:00+00:00")
+    plan = schedules.plan(monday)
+    assert schedules.plan(monday) is plan
+
+    version = schedules.version
+    schedules.invalidate()
+    assert schedules.plan(monday) is not plan and schedules.version == version + 1
+
+    plan = schedules.plan(monday)
+    load.return_value = [row("Tuesday")]
+    assert schedules.plan(monday) is not plan
+    assert schedules.today(monday) is None
+
+
+def test_nothing_enabled():
+    assert engine(row("Monday", enabled=False)).next_fire(monday) is None
+
+
+def test_plan_rebuilt_on_a_new_day():
+    schedules = engine(row("Monday"))
+
+    first = schedules.plan(monday)
+
+    assert schedules.plan(monday.shift(hours=1)) is first
+    assert schedules.plan(monday.shift(days=1)).built_for == "2099-01-06"
+    assert isinstance(first, Plan) and first.built_for == "2099-01-05"
+
+
+def test_runs_job_at_fire_time_once():
+    job = AsyncMock()
+    scheduler = PostScheduler(engine=engine(), recheck=3600, enabled=True)
+    scheduler.bind(job)
+    fire_at = arrow.utcnow().shift(seconds=0.05)
+    scheduler.next_fire = lambda: fire_at if scheduler.last_fired is None else None
+    scheduler.engine.confirm = lambda fire_at: True
+
+    async def run():
+        scheduler.start()
+        await asyncio.sleep(0.2)
+        await scheduler.stop()
+
+    asyncio.run(run())
+
+    job.assert_awaited_once()
+    assert scheduler.last_fired == fire_at
+
+
+def test_fire_skips_a_post_snoozed_by_another_worker():
+    stored = {"rows": [row("Monday")]}
+    job = AsyncMock()
+    schedules = ScheduleEngine()
+    schedules.bind(lambda: stored["rows"], reload=lambda: stored.update(rows=[row("Monday", snooze_until=datetime(2099, 1, 10))]))
+    scheduler = PostScheduler(engine=schedules, enabled=True)
+    scheduler.bind(job)
+    fire_at = schedules.next_fire(monday.shift(hours=-6))
+
+    asyncio.run(scheduler.fire(fire_at))
+
+    job.assert_not_awaited()
+    assert scheduler.last_fired == fire_at
+
+
+def test_fire_posts_when_the_schedule_is_unchanged():
+    rows = [row("Monday")]
+    job = AsyncMock()
+    schedules = ScheduleEngine()
+    schedules.bind(lambda: rows, reload=MagicMock())
+    scheduler = PostScheduler(engine=schedules, enabled=True)
+    scheduler.bind(job)
+
+    asyncio.run(scheduler.fire(arrow.get("2099-01-05T15:00:00+00:00")))
+
+    job.assert_awaited_once()
+    schedules.reload.assert_called_once()
+
+
+def test_wake_rereads_the_schedule():
+    reads = []
+    schedules = ScheduleEngine()
+    schedules.bind(lambda: reads.append(1) or [])
+    scheduler = PostScheduler(engine=schedules, recheck=3600, enabled=True)
+    scheduler.bind(AsyncMock())
+
+    async def run():
+        scheduler.start()
+        await asyncio.sleep(0.05)
+        scheduler.wake()
+        await asyncio.sleep(0.05)
+        await scheduler.stop()
+
+    asyncio.run(run())
+
+    assert len(reads) == 2 and schedules.version == 2  # bound, then woken
+
+
+def test_disabled_does_not_start():
+    scheduler = PostScheduler(engine=engine(), enabled=False)
+    scheduler.bind(AsyncMock())
+
+    async def run():
+        scheduler.start()
+        return scheduler._task
+
+    assert asyncio.run(run()) is None
@@ -0,0 +1,85 @@
+import pytest
+import threading
+import time
+from sign_jwt import TokenManager
+from unittest.mock import patch
+
+
+@pytest.fixture
+def tokens():
+    return {"access_token": "access", "refresh_token": "refresh", "expires_in": 3600}
+
+
+def test_token_manager_caches_tokens(tokens):
+    manager = TokenManager(margin=300)
+
+    with patch("sign_jwt.get_access_token", return_value=tokens) as mock_grant, patch("sign_jwt.sign_token"):
+        assert manager.get() == tokens
+        assert manager.get() == tokens
+
+    mock_grant.assert_called_once()
+
+
+def test_token_manager_renews_with_refresh_token(tokens):
+    manager = TokenManager(margin=300)
+    renewed = {**tokens, "access_token": "renewed"}
+    release = threading.Event()
+
+    def refresh(token):
+        release.wait(5)
+        return renewed
+
+    with (
+        patch("sign_jwt.get_access_token", return_value=tokens) as mock_grant,
+        patch("sign_jwt.refresh_access_token", side_effect=refresh) as mock_refresh,
+        patch("sign_jwt.sign_token"),
+    ):
+        manager.get()
+        manager.expires_at = time.monotonic() + 60  # inside the refresh margin
+
+        # still valid: served from cache while the refresh runs in the background
+        assert manager.get() == tokens
+        renewal = manager.renew()  # the one in flight
+        release.set()
+        renewal.result(timeout=5)
+
+        assert manager.get() == renewed
+
+    mock_grant.assert_called_once()
+    mock_refresh.assert_called_once_with("refresh")
+
+
+def test_token_manager_falls_back_to_jwt_grant(tokens):
+    manager = TokenManager(margin=300)
+    manager.tokens = tokens
+    fresh = {**tokens, "access_token": "fresh"}
+
+    with (
+        patch("sign_jwt.refresh_access_token", return_value=None),
+        patch("sign_jwt.get_access_token", return_value=fresh) as mock_grant,
+        patch("sign_jwt.sign_token"),
+    ):
+        assert manager.get() == fresh
+
+    mock_grant.assert_called_once()
+
+
+def test_token_manager_single_flight(tokens):
+    manager = TokenManager(margin=300)
+    release = threading.Event()
+
+    def slow_grant(token):
+        release.wait(timeout=5)
+        return tokens
+
+    with patch("sign_jwt.get_access_token", side_effect=slow_grant) as mock_grant, patch("sign_jwt.sign_token"):
+        results = []
+        threads = [threading.Thread(target=lambda: results.append(manager.get())) for _ in range(5)]
+        for thread in threads:
+            thread.start()
+        release.set()
+        for thread in threads:
+            thread.join(timeout=5)
+
+    assert results == [tokens] * 5
+    mock_grant.assert_called_once()
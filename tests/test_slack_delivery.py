@@ -0,0 +1,94 @@
+import asyncio
+import pytest
+import time
+from slack_delivery import FAILED, POSTED, SlackSender, TokenBucket, deliver
+from slack_render import Message
+from slack_sdk.errors import SlackApiError
+from slack_sdk.web.async_slack_response import AsyncSlackResponse
+from unittest.mock import MagicMock
+
+
+def slack_error(status, error, headers=None):
+    response = AsyncSlackResponse(
+        client=None, http_verb="POST", api_url="", req_args={}, data={"ok": False, "error": error}, headers=headers or {}, status_code=status
+    )
+    return SlackApiError(error, response)
+
+
+class FakeClient:
+    """Posts to every channel take `delay` seconds; `errors` are raised first, in order"""
+
+    def __init__(self, delay=0.0, errors=()):
+        self.delay = delay
+        self.errors = list(errors)
+        self.calls = []
+        self.posted = []
+
+    async def chat_postMessage(self, channel, **kwargs):
+        self.calls.append(channel)
+        await asyncio.sleep(self.delay)
+        if self.errors:
+            raise self.errors.pop(0)
+        if channel == "missing":
+            raise slack_error(200, "channel_not_found")
+        self.posted.append((channel, kwargs["blocks"][0]["text"]["text"]))
+        return {"ts": f"{channel}.ts"}
+
+
+event = (Message(sections=("• event",)),)
+
+
+def test_delivers_to_channels_concurrently():
+    sender = SlackSender(FakeClient(delay=0.2), TokenBucket(rate=100, capacity=10))
+
+    start = time.monotonic()
+    deliveries = asyncio.run(deliver(sender, event, ["C1", "C2", "C3", "missing"]))
+    elapsed = time.monotonic() - start
+
+    assert elapsed < 0.5  # slowest channel, not the sum
+    assert [d.outcome for d in deliveries] == [POSTED, POSTED, POSTED, FAILED]
+    assert deliveries[0].ts == "C1.ts"
+    assert deliveries[3].error == "channel_not_found" and not deliveries[3].ok
+
+
+def test_retries_after_rate_limit():
+    client = FakeClient(errors=[slack_error(429, "ratelimited", {"Retry-After": "0.1"}), slack_error(503, "service_unavailable")])
+    sender = SlackSender(client, TokenBucket(rate=100, capacity=10))
+    sender.backoff = MagicMock(return_value=0)
+
+    start = time.monotonic()
+    (delivery,) = asyncio.run(deliver(sender, event, ["C1"]))
+
+    assert delivery.outcome == POSTED
+    assert len(client.calls) == 3
+    assert time.monotonic() - start >= 0.1
+
+
+def test_gives_up_after_retries():
+    client = FakeClient(errors=[slack_error(429, "ratelimited", {"Retry-After": "0"})] * 3)
+    sender = SlackSender(client, TokenBucket(rate=100, capacity=10), retries=2)
+
+    (delivery,) = asyncio.run(deliver(sender, event, ["C1"]))
+
+    assert delivery.outcome == FAILED and delivery.error == "ratelimited"
+    assert len(client.calls) == 3
+
+
+def test_parts_are_delivered_in_order_per_channel():
+    client = FakeClient()
+    sender = SlackSender(client, TokenBucket(rate=100, capacity=10))
+    messages = (Message(sections=("• one",)), Message(sections=("• two",)))
+
+    deliveries = asyncio.run(deliver(sender, messages, ["C1", "C2"]))
+
+    assert [(d.channel, d.part) for d in deliveries] == [("C1", 0), ("C1", 1), ("C2", 0), ("C2", 1)]
+    assert [text for channel, text in client.posted if channel == "C1"] == ["• one", "• two"]
+
+
+@pytest.mark.parametrize("calls, expected", [(3, 0.0), (5, 0.2)])
+def test_token_bucket_paces_bursts(calls, expected):
+    bucket = TokenBucket(rate=10, capacity=3)
+
+    waits = [bucket.reserve() for _ in range(calls)]
+
+    assert waits[-1] == pytest.approx(expected, abs=0.02)
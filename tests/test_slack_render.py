@@ -0,0 +1,71 @@
+import pytest
+from slack_render import MAX_BLOCKS, SECTION_LIMIT, Message, RenderCache, chunk_lines, event_set_hash
+
+
+@pytest.fixture
+def events():
+    return [
+        {"date": "Mon 1/1 6:00 pm", "name": "Python", "eventUrl": "https://meetup.com/e/1", "title": "Talks"},
+        {"date": "Tue 1/2 6:00 pm", "name": "Rust", "eventUrl": "https://meetup.com/e/2", "title": "Hack night"},
+    ]
+
+
+def test_sections_stay_under_the_limit_without_splitting_lines():
+    lines = [f"• line {i} " + "x" * 90 for i in range(100)]
+
+    (message,) = chunk_lines(lines)
+
+    assert all(len(section) <= SECTION_LIMIT for section in message.sections)
+    assert message.text.split("\n") == lines
+    assert len(message.sections) > 1
+
+
+def test_messages_split_at_the_block_limit():
+    lines = ["x" * SECTION_LIMIT] * (MAX_BLOCKS + 1)
+
+    messages = chunk_lines(lines)
+
+    assert [len(m.sections) for m in messages] == [MAX_BLOCKS, 1]
+
+
+def test_oversize_line_is_truncated():
+    (message,) = chunk_lines(["x" * (SECTION_LIMIT + 10)])
+
+    assert len(message.sections[0]) == SECTION_LIMIT
+    assert message.sections[0].endswith("…")
+
+
+def test_blocks():
+    message = Message(sections=("a", "b"))
+
+    assert message.blocks[1] == {"type": "section", "text": {"type": "mrkdwn", "text": "b"}}
+    assert message.text == "a\nb"
+
+
+def test_no_events_no_messages():
+    assert chunk_lines([]) == ()
+
+
+def test_cache_hits_on_same_events_and_template(events):
+    cache = RenderCache()
+
+    first = cache.render(events)
+    assert cache.render([dict(e) for e in events]) is first
+    assert "*Python*" in first[0].text
+    cache.render(events, template="{title}")
+
+    assert (cache.hits, cache.misses) == (1, 2)
+
+
+def test_cache_evicts_least_recently_used(events):
+    cache = RenderCache(size=1)
+
+    cache.render(events)
+    cache.render(events[:1])
+    cache.render(events)
+
+    assert cache.misses == 3
+
+
+def test_event_order_matters(events):
+    assert event_set_hash(events) != event_set_hash(events[::-1])